@@ -2,23 +2,33 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 import os
+from .routing import RoutingSession
 
 
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
-    app.config['SECRET_KEY'] = 'placement-portal-secret-key-2024'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///placement.db'
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'placement-portal-secret-key-2024')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///placement.db')
+    app.config['REPLICA_DATABASE_URI'] = os.environ.get('DATABASE_REPLICA_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.from_prefixed_env('PORTAL')
+    if config:
+        app.config.update(config)
     
+    from . import engine
+    engine.configure(app)
     db.init_app(app)
+    with app.app_context():
+        for bind in db.engines.values():
+            engine.init_app(app, bind)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message_category = 'warning'
@@ -29,4 +39,25 @@ def create_app():
     app.register_blueprint(company_bp)
     app.register_blueprint(student_bp)
     
+    from . import (analytics, api, archive, audit, conditional, counters, events, identity, importer, jobs,
+                   metrics, migrations, passwords, queries, query_plans, routing, search, sweeper, transfer)
+    analytics.init_app(app)
+    api.init_app(app)
+    archive.init_app(app)
+    audit.init_app(app)
+    conditional.init_app(app)
+    counters.init_app(app)
+    events.init_app(app)
+    importer.init_app(app)
+    jobs.init_app(app)
+    metrics.init_app(app)
+    migrations.init_app(app)
+    passwords.init_app(app)
+    queries.init_app(app)
+    query_plans.init_app(app)
+    routing.init_app(app, db)
+    search.init_app(app)
+    sweeper.init_app(app)
+    transfer.init_app(app)
+    
     return app
@@ -0,0 +1,421 @@
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, inspect, select, union_all
+from sqlalchemy.orm import Session, object_session
+from datetime import datetime
+import click
+import multiprocessing
+import os
+import threading
+import time
+from . import db, sweeper
+from .models import (AnalyticsMark, DriveStats, StudentStats, CompanyProfile, StudentProfile, PlacementDrive,
+                     Application, ArchivedDrive, ArchivedApplication)
+
+
+
+
+# Reports read two rollups instead of `applications`: drive_stats, one row per drive with applicants, and
+# student_stats, one row per student who applied. Every write that changes applications leaves a mark naming
+# the drives and students it touched, in the same transaction; the refresher recomputes just those rows.
+# The rollups count archived applications too, so archiving a season leaves every report as it was.
+LEASE = 'analytics_refresh:lease'
+BATCH_SIZE = 500
+REPORTS = ('summary', 'companies', 'drives', 'students', 'decisions')
+
+_reports = {}
+_lock = threading.Lock()
+
+
+
+
+def epoch_file():
+    return current_app.config.get('ANALYTICS_EPOCH_FILE') or os.path.join(current_app.instance_path,
+                                                                          'analytics.epoch')
+
+
+
+
+def current_epoch():
+    try:
+        return os.stat(epoch_file()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+
+
+def invalidate():
+    path = epoch_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(str(time.time_ns()))
+
+
+
+
+def mark(conn, drive_ids=(), student_ids=()):
+    rows = [{'kind': 'drive', 'key': id} for id in sorted(set(drive_ids))]
+    rows += [{'kind': 'student', 'key': id} for id in sorted(set(student_ids))]
+    if rows:
+        conn.execute(insert(AnalyticsMark), rows)
+
+
+
+
+def decision_values(status):
+    # for Core UPDATEs: the first move out of 'applied' is when the application was decided
+    return {'decided_at': func.coalesce(Application.decided_at, datetime.utcnow())} if status != 'applied' else {}
+
+
+
+
+def application_deciding(mapper, connection, target):
+    if target.decided_at is None and target.status != 'applied' \
+            and inspect(target).attrs.status.history.has_changes():
+        target.decided_at = datetime.utcnow()
+
+
+
+
+def application_changed(mapper, connection, target):
+    drives, students = object_session(target).info.setdefault('analytics_marks', (set(), set()))
+    drives.add(target.drive_id)
+    students.add(target.student_id)
+
+
+
+
+event.listen(Application, 'before_update', application_deciding)
+for change in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Application, change, application_changed)
+# archived rows are only ever deleted, along with their student or company
+event.listen(ArchivedApplication, 'after_delete', application_changed)
+
+
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_marks(session, flush_context):
+    marks = session.info.pop('analytics_marks', None)
+    if marks:
+        mark(session.connection(), *marks)
+
+
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_marks(session, previous_transaction):
+    session.info.pop('analytics_marks', None)
+
+
+
+
+def all_applications(*names):
+    # live and archived applications as one subquery; 'company_id' comes from each application's drive
+    selects = []
+    for drive, application in ((PlacementDrive, Application), (ArchivedDrive, ArchivedApplication)):
+        statement = select(*[drive.company_id if name == 'company_id' else getattr(application, name)
+                             for name in names]).select_from(application)
+        if 'company_id' in names:
+            statement = statement.join(drive, drive.id == application.drive_id)
+        selects.append(statement)
+    return union_all(*selects).subquery('all_applications')
+
+
+
+
+def decision_seconds(dialect, rows):
+    if dialect == 'postgresql':
+        return func.extract('epoch', rows.c.decided_at - rows.c.applied_date)
+    return (func.julianday(rows.c.decided_at) - func.julianday(rows.c.applied_date)) * 86400
+
+
+
+
+def drive_rollup(conn):
+    rows = all_applications('drive_id', 'company_id', 'status', 'applied_date', 'decided_at')
+    counted = func.count()
+    return (select(rows.c.drive_id, rows.c.company_id, counted,
+                   counted.filter(rows.c.status == 'shortlisted'),
+                   counted.filter(rows.c.status == 'selected'),
+                   counted.filter(rows.c.status == 'rejected'),
+                   func.count(rows.c.decided_at),
+                   func.coalesce(func.sum(decision_seconds(conn.dialect.name, rows)), 0))
+            .group_by(rows.c.drive_id, rows.c.company_id)), rows
+
+
+
+
+def student_rollup():
+    rows = all_applications('student_id', 'status')
+    counted = func.count()
+    return (select(rows.c.student_id, counted,
+                   counted.filter(rows.c.status == 'shortlisted'),
+                   counted.filter(rows.c.status == 'selected'))
+            .group_by(rows.c.student_id)), rows
+
+
+
+
+DRIVE_COLUMNS = ['drive_id', 'company_id', 'applications', 'shortlisted', 'selected', 'rejected', 'decided',
+                 'decision_seconds']
+STUDENT_COLUMNS = ['student_id', 'applications', 'shortlisted', 'selected']
+
+
+
+
+def recompute(conn, drive_ids, student_ids):
+    # a drive or student with no applications left simply has no row
+    if drive_ids:
+        ids = sorted(drive_ids)
+        rollup, rows = drive_rollup(conn)
+        conn.execute(delete(DriveStats).where(DriveStats.drive_id.in_(ids)))
+        conn.execute(insert(DriveStats).from_select(DRIVE_COLUMNS, rollup.where(rows.c.drive_id.in_(ids))))
+    if student_ids:
+        ids = sorted(student_ids)
+        rollup, rows = student_rollup()
+        conn.execute(delete(StudentStats).where(StudentStats.student_id.in_(ids)))
+        conn.execute(insert(StudentStats).from_select(STUDENT_COLUMNS, rollup.where(rows.c.student_id.in_(ids))))
+
+
+
+
+def rebuild(conn):
+    conn.execute(delete(AnalyticsMark))
+    conn.execute(delete(DriveStats))
+    conn.execute(delete(StudentStats))
+    conn.execute(insert(DriveStats).from_select(DRIVE_COLUMNS, drive_rollup(conn)[0]))
+    conn.execute(insert(StudentStats).from_select(STUDENT_COLUMNS, student_rollup()[0]))
+
+
+
+
+def refresh(batch_size=BATCH_SIZE):
+    # returns how many drives and students were recomputed, or None when another process holds the lease
+    with db.engine.begin() as conn:
+        if not sweeper.acquire(conn, LEASE):
+            return None
+    drives = students = 0
+    try:
+        while True:
+            # marks are deleted by id, so one left by a write that committed during this batch stays for the next
+            with db.engine.begin() as conn:
+                marks = conn.execute(select(AnalyticsMark.id, AnalyticsMark.kind, AnalyticsMark.key)
+                                     .order_by(AnalyticsMark.id).limit(batch_size)).all()
+                if not marks:
+                    break
+                drive_ids = {key for id, kind, key in marks if kind == 'drive'}
+                student_ids = {key for id, kind, key in marks if kind == 'student'}
+                recompute(conn, drive_ids, student_ids)
+                conn.execute(delete(AnalyticsMark).where(AnalyticsMark.id.in_([id for id, kind, key in marks])))
+            drives += len(drive_ids)
+            students += len(student_ids)
+            if len(marks) < batch_size:
+                break
+    finally:
+        with db.engine.begin() as conn:
+            sweeper.release(conn, LEASE)
+    if drives or students:
+        invalidate()
+    return drives, students
+
+
+
+
+def refresh_periodically(app, interval):
+    with app.app_context():
+        while True:
+            try:
+                refresh()
+            except Exception:
+                app.logger.exception('Analytics refresh failed')
+            time.sleep(interval)
+
+
+
+
+def rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+
+
+def days(seconds, count):
+    return round(seconds / count / 86400, 2) if count else None
+
+
+
+
+def summary():
+    row = db.session.execute(select(
+        func.count(DriveStats.drive_id), func.coalesce(func.sum(DriveStats.applications), 0),
+        func.coalesce(func.sum(DriveStats.shortlisted), 0), func.coalesce(func.sum(DriveStats.selected), 0),
+        func.coalesce(func.sum(DriveStats.rejected), 0), func.coalesce(func.sum(DriveStats.decided), 0),
+        func.coalesce(func.sum(DriveStats.decision_seconds), 0),
+    )).one()
+    drives, applications, shortlisted, selected, rejected, decided, seconds = row
+    counted = func.count(StudentStats.student_id)
+    students, placed = db.session.execute(select(counted, counted.filter(StudentStats.selected > 0))).one()
+    return {
+        'drives_with_applicants': drives,
+        'applications': applications,
+        'shortlisted': shortlisted,
+        'selected': selected,
+        'rejected': rejected,
+        # a selected student was shortlisted on the way, so both count towards the shortlist rate
+        'shortlist_rate': rate(shortlisted + selected, applications),
+        'selection_rate': rate(selected, applications),
+        'students_applied': students,
+        'students_placed': placed,
+        'placement_rate': rate(placed, students),
+        'avg_days_to_decision': days(seconds, decided),
+    }
+
+
+
+
+def company_rows():
+    # grouped by the primary key, walking companies in id order, so no temporary index is built; the name
+    # depends on it
+    rows = db.session.execute(
+        select(CompanyProfile.id, CompanyProfile.name, func.count(DriveStats.drive_id),
+               func.sum(DriveStats.applications), func.sum(DriveStats.shortlisted), func.sum(DriveStats.selected),
+               func.sum(DriveStats.rejected), func.sum(DriveStats.decided), func.sum(DriveStats.decision_seconds))
+        .join(DriveStats, DriveStats.company_id == CompanyProfile.id)
+        .group_by(CompanyProfile.id)
+    ).all()
+    return [{
+        'company_id': company_id,
+        'company': name,
+        'drives': drives,
+        'applications': applications,
+        'shortlisted': shortlisted,
+        'selected': selected,
+        'rejected': rejected,
+        'shortlist_rate': rate(shortlisted + selected, applications),
+        'selection_rate': rate(selected, applications),
+        'offer_rate': rate(selected, shortlisted + selected),
+        'decided': decided,
+        'avg_days_to_decision': days(seconds, decided),
+    } for company_id, name, drives, applications, shortlisted, selected, rejected, decided, seconds in rows]
+
+
+
+
+def companies():
+    # a few hundred rows, sorted here rather than by a temporary index in the database
+    return sorted(company_rows(), key=lambda row: -row['applications'])
+
+
+
+
+def decisions():
+    rows = [row for row in company_rows() if row['decided']]
+    return sorted(rows, key=lambda row: -row['avg_days_to_decision'])
+
+
+
+
+def drives(limit=50, company_id=None):
+    # an archived drive keeps its row in drive_stats
+    statement = (select(DriveStats, func.coalesce(PlacementDrive.title, ArchivedDrive.title),
+                        func.coalesce(PlacementDrive.status, ArchivedDrive.status), CompanyProfile.name)
+                 .outerjoin(PlacementDrive, PlacementDrive.id == DriveStats.drive_id)
+                 .outerjoin(ArchivedDrive, ArchivedDrive.id == DriveStats.drive_id)
+                 .join(CompanyProfile, CompanyProfile.id == DriveStats.company_id))
+    if company_id is not None:
+        statement = statement.where(DriveStats.company_id == company_id)
+    else:
+        statement = statement.order_by(DriveStats.applications.desc()).limit(limit)
+    rows = [{
+        'drive_id': stats.drive_id,
+        'title': title,
+        'company': name,
+        'status': status,
+        'applications': stats.applications,
+        'shortlisted': stats.shortlisted,
+        'selected': stats.selected,
+        'rejected': stats.rejected,
+        'shortlist_rate': rate(stats.shortlisted + stats.selected, stats.applications),
+        'selection_rate': rate(stats.selected, stats.applications),
+        'avg_days_to_decision': days(stats.decision_seconds, stats.decided),
+    } for stats, title, status, name in db.session.execute(statement)]
+    return sorted(rows, key=lambda row: -row['applications']) if company_id is not None else rows
+
+
+
+
+def students(limit=50):
+    distribution = db.session.execute(select(StudentStats.selected, func.count(StudentStats.student_id))
+                                      .group_by(StudentStats.selected)).all()
+    top = db.session.execute(
+        select(StudentStats, StudentProfile.name, StudentProfile.student_id, StudentProfile.branch)
+        .join(StudentProfile, StudentProfile.id == StudentStats.student_id)
+        .where(StudentStats.selected > 0)
+        .order_by(StudentStats.selected.desc(), StudentStats.student_id.desc())
+        .limit(limit)
+    ).all()
+    return {
+        'selections_per_student': [{'selections': selected, 'students': count} for selected, count in distribution],
+        'most_selected': [{
+            'student_id': stats.student_id,
+            'name': name,
+            'roll_number': roll_number,
+            'branch': branch,
+            'applications': stats.applications,
+            'shortlisted': stats.shortlisted,
+            'selected': stats.selected,
+        } for stats, name, roll_number, branch in top],
+    }
+
+
+
+
+def report(name, **params):
+    # cached until the next refresh that changed something, in any process
+    epoch = current_epoch()
+    key = (name, tuple(sorted(params.items())))
+    cached = _reports.get(key)
+    if cached is not None and cached[0] == epoch:
+        return cached[1]
+    result = {'summary': summary, 'companies': companies, 'drives': drives, 'students': students,
+              'decisions': decisions}[name](**params)
+    with _lock:
+        if len(_reports) >= 256:
+            _reports.clear()
+        _reports[key] = (epoch, result)
+    return result
+
+
+
+
+def init_app(app):
+    interval = app.config.get('ANALYTICS_REFRESH_SECONDS', 60)
+    if interval and not app.testing and multiprocessing.parent_process() is None:
+        started = []
+        lock = threading.Lock()
+
+        @app.before_request
+        def start_refresher_once():
+            if not started:
+                with lock:
+                    if not started:
+                        thread = threading.Thread(target=refresh_periodically, args=(app, interval), daemon=True,
+                                                  name='analytics-refresher')
+                        thread.start()
+                        started.append(thread)
+
+    @app.cli.command('refresh-analytics')
+    @click.option('--full', is_flag=True, help='Rebuild the rollups from every application.')
+    def refresh_analytics_command(full):
+        if full:
+            with db.engine.begin() as conn:
+                rebuild(conn)
+            invalidate()
+            click.echo('Analytics rebuilt')
+            return
+        refreshed = refresh()
+        if refreshed is None:
+            click.echo('Another process is refreshing; nothing done')
+        else:
+            click.echo(f'{refreshed[0]} drive(s) and {refreshed[1]} student(s) refreshed')
@@ -0,0 +1,364 @@
+from flask import Blueprint, abort, current_app, g, jsonify, request
+from sqlalchemy import DateTime, select, tuple_
+from werkzeug.exceptions import HTTPException
+import click
+import hashlib
+import json
+import secrets
+import threading
+from . import db, events, identity, jobs, queries, tasks
+from .models import ApiToken, User, CompanyProfile, StudentProfile, PlacementDrive, Application
+from .pagination import decode_cursor, encode_cursor
+from .routing import replica_reads
+
+
+
+
+# Token-authenticated JSON for integrations. Reads run one SELECT of just the requested columns and serialize
+# the row tuples directly, without building ORM objects; pages are keyset cursors in index order.
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+RESOURCES = {
+    'drives': (PlacementDrive, {
+        'id': PlacementDrive.id,
+        'company_id': PlacementDrive.company_id,
+        'title': PlacementDrive.title,
+        'description': PlacementDrive.description,
+        'eligibility': PlacementDrive.eligibility,
+        'eligible_branches': PlacementDrive.eligible_branches,
+        'graduation_year': PlacementDrive.graduation_year,
+        'min_cgpa': PlacementDrive.min_cgpa,
+        'max_backlogs': PlacementDrive.max_backlogs,
+        'deadline': PlacementDrive.deadline,
+        'status': PlacementDrive.status,
+        'max_applicants': PlacementDrive.max_applicants,
+        'created_at': PlacementDrive.created_at,
+    }),
+    'applications': (Application, {
+        'id': Application.id,
+        'student_id': Application.student_id,
+        'drive_id': Application.drive_id,
+        'status': Application.status,
+        'applied_date': Application.applied_date,
+    }),
+    'students': (StudentProfile, {
+        'id': StudentProfile.id,
+        'user_id': StudentProfile.user_id,
+        'email': User.email,
+        'name': StudentProfile.name,
+        'student_id': StudentProfile.student_id,
+        'contact': StudentProfile.contact,
+        'resume_bio': StudentProfile.resume_bio,
+        'branch': StudentProfile.branch,
+        'graduation_year': StudentProfile.graduation_year,
+        'cgpa': StudentProfile.cgpa,
+        'backlogs': StudentProfile.backlogs,
+    }),
+    'companies': (CompanyProfile, {
+        'id': CompanyProfile.id,
+        'user_id': CompanyProfile.user_id,
+        'email': User.email,
+        'name': CompanyProfile.name,
+        'hr_contact': CompanyProfile.hr_contact,
+        'website': CompanyProfile.website,
+        'approval_status': CompanyProfile.approval_status,
+    }),
+}
+FILTERS = {
+    'drives': ('company_id', 'status'),
+    'applications': ('student_id', 'drive_id', 'status'),
+    'students': ('branch', 'graduation_year'),
+    'companies': ('approval_status',),
+}
+
+_principals = {}
+_lock = threading.Lock()
+
+
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+
+
+def create_token(user, name):
+    # only the hash is stored; the token itself is shown once
+    token = secrets.token_urlsafe(32)
+    db.session.add(ApiToken(user_id=user.id, name=name, token_hash=hash_token(token)))
+    return token
+
+
+
+
+def principal(token_hash):
+    # cached until the identity epoch moves, which blacklisting, approval changes and token revocation all do
+    epoch = identity.current_epoch()
+    cached = _principals.get(token_hash)
+    if cached is not None and cached[0] == epoch:
+        return cached[1]
+
+    row = db.session.execute(
+        select(User.id, User.role, User.is_active, CompanyProfile.id, CompanyProfile.approval_status,
+               StudentProfile.id)
+        .join(ApiToken, ApiToken.user_id == User.id)
+        .outerjoin(CompanyProfile, CompanyProfile.user_id == User.id)
+        .outerjoin(StudentProfile, StudentProfile.user_id == User.id)
+        .where(ApiToken.token_hash == token_hash)
+    ).first()
+    found = None
+    if row is not None and row[2] and (row[1] != 'company' or row[4] == 'approved'):
+        found = {'user_id': row[0], 'role': row[1], 'company_id': row[3], 'student_id': row[5]}
+    with _lock:
+        if len(_principals) >= 1024:
+            _principals.clear()
+        _principals[token_hash] = (epoch, found)
+    return found
+
+
+
+
+@api_bp.before_request
+def authenticate():
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    who = principal(hash_token(token)) if scheme.lower() == 'bearer' and token else None
+    if who is None:
+        abort(401, 'Send a valid API token as "Authorization: Bearer <token>".')
+    g.api_principal = who
+
+
+
+
+@api_bp.errorhandler(HTTPException)
+def json_error(error):
+    response = jsonify(error=error.description)
+    response.status_code = error.code
+    if error.code == 401:
+        response.headers['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+
+
+def visible(resource, who):
+    # the rows each role may read; admins read everything
+    role = who['role']
+    if role == 'admin':
+        return []
+    company_drives = select(PlacementDrive.id).where(PlacementDrive.company_id == who['company_id'])
+    applicants = select(Application.student_id).where(Application.drive_id.in_(company_drives))
+    if resource == 'drives':
+        return [PlacementDrive.company_id == who['company_id']] if role == 'company' \
+            else [PlacementDrive.status == 'approved']
+    if resource == 'applications':
+        return [Application.drive_id.in_(company_drives)] if role == 'company' \
+            else [Application.student_id == who['student_id']]
+    if resource == 'students':
+        return [StudentProfile.id.in_(applicants)] if role == 'company' else [StudentProfile.id == who['student_id']]
+    return [CompanyProfile.id == who['company_id']] if role == 'company' \
+        else [CompanyProfile.approval_status == 'approved']
+
+
+
+
+def int_list(name, limit):
+    values = [value for value in request.args.get(name, '').split(',') if value]
+    if not all(value.isdigit() for value in values):
+        abort(400, f'"{name}" must be a comma-separated list of ids.')
+    if len(values) > limit:
+        abort(400, f'At most {limit} ids per request.')
+    return [int(value) for value in values]
+
+
+
+
+def requested_fields(fields):
+    names = [name for name in request.args.get('fields', '').split(',') if name] or list(fields)
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        abort(400, f'Unknown field(s): {", ".join(unknown)}. Available: {", ".join(fields)}.')
+    return names
+
+
+
+
+def filters(resource, fields):
+    conditions = []
+    for name in FILTERS[resource]:
+        value = request.args.get(name)
+        if value is None:
+            continue
+        column = fields[name]
+        try:
+            conditions.append(column == column.type.python_type(value))
+        except ValueError:
+            abort(400, f'Invalid value for "{name}".')
+    return conditions
+
+
+
+
+def sort_keys(resource, model, who, batch):
+    # the order the index serving the caller's scope and filters already returns rows in, so no page is sorted
+    if batch:
+        return [model.id]
+    if resource == 'applications':
+        if who['role'] == 'company' or 'drive_id' in request.args and who['role'] == 'admin':
+            return [Application.drive_id, Application.applied_date, Application.id]
+        if who['role'] == 'student' or 'student_id' in request.args:
+            return [Application.student_id, Application.applied_date, Application.id]
+    if resource == 'drives' and (who['role'] == 'student' or who['role'] == 'admin' and 'status' in request.args):
+        return [PlacementDrive.status, PlacementDrive.deadline, PlacementDrive.id]
+    return [model.id]
+
+
+
+
+def page_limit():
+    default = current_app.config.get('API_PAGE_SIZE', 1000)
+    maximum = current_app.config.get('API_MAX_PAGE_SIZE', 10000)
+    return max(1, min(request.args.get('limit', default, type=int), maximum))
+
+
+
+
+def json_response(body, status=200):
+    return current_app.response_class(json.dumps(body, separators=(',', ':')), status=status,
+                                      mimetype='application/json')
+
+
+
+
+def listing(resource):
+    model, fields = RESOURCES[resource]
+    names = requested_fields(fields)
+    limit = page_limit()
+    ids = int_list('ids', current_app.config.get('API_MAX_BATCH', 1000))
+    keys = sort_keys(resource, model, g.api_principal, bool(ids))
+    statement = select(*keys, *[fields[name] for name in names]).select_from(model)
+    if 'email' in names:
+        statement = statement.join(User, User.id == model.user_id)
+    statement = statement.where(*visible(resource, g.api_principal), *filters(resource, fields))
+    if ids:
+        statement = statement.where(model.id.in_(ids))
+    after = request.args.get('after')
+    if after:
+        statement = statement.where(tuple_(*keys) > tuple_(*decode_cursor(after, keys)))
+    rows = db.session.execute(statement.order_by(*keys).limit(limit + 1)).all()
+
+    dates = [i for i, name in enumerate(names) if isinstance(fields[name].type, DateTime)]
+    data = []
+    for row in rows[:limit]:
+        values = list(row[len(keys):])
+        for i in dates:
+            if values[i] is not None:
+                values[i] = values[i].isoformat()
+        data.append(dict(zip(names, values)))
+    next_cursor = encode_cursor(rows[limit - 1][:len(keys)]) if len(rows) > limit else None
+    return json_response({'data': data, 'next': next_cursor})
+
+
+
+
+@api_bp.route('/drives')
+@replica_reads
+def drives():
+    return listing('drives')
+
+
+
+
+@api_bp.route('/applications')
+@replica_reads
+def applications():
+    return listing('applications')
+
+
+
+
+@api_bp.route('/students')
+@replica_reads
+def students():
+    return listing('students')
+
+
+
+
+@api_bp.route('/companies')
+@replica_reads
+def companies():
+    return listing('companies')
+
+
+
+
+@api_bp.route('/applications/status', methods=['POST'])
+def update_application_statuses():
+    who = g.api_principal
+    if who['role'] not in ('admin', 'company'):
+        abort(403, 'Only admins and companies can change application statuses.')
+    body = request.get_json(silent=True)
+    updates = body.get('updates') if isinstance(body, dict) else None
+    if not isinstance(updates, list) or not updates:
+        abort(400, 'Send {"updates": [{"id": ..., "status": ..., "expected_status": ...}, ...]}.')
+    limit = current_app.config.get('API_MAX_BATCH', 1000)
+    if len(updates) > limit:
+        abort(400, f'At most {limit} updates per request.')
+
+    changes = []
+    for item in updates:
+        if not isinstance(item, dict):
+            abort(400, f'Invalid update: {json.dumps(item)}.')
+        id, status, expected = item.get('id'), item.get('status'), item.get('expected_status')
+        if type(id) is not int or status not in queries.APPLICATION_STATUSES \
+                or expected not in (None, *queries.APPLICATION_STATUSES):
+            abort(400, f'Invalid update: {json.dumps(item)}.')
+        changes.append((id, status, expected))
+    if len({id for id, status, expected in changes}) != len(changes):
+        abort(400, 'Each application may appear only once per request.')
+
+    company_id = who['company_id'] if who['role'] == 'company' else None
+    changed = queries.set_application_statuses(changes, company_id)
+    for status in tasks.NOTIFIED_STATUSES:
+        notices = [{'application_id': id, 'status': status} for id, new_status in changed if new_status == status]
+        if notices:
+            jobs.enqueue_many('notify_application_status', notices)
+    events.publish_application_statuses([id for id, status in changed])
+    db.session.commit()
+
+    # skipped rows already had the status, had moved on from `expected_status`, or are not the caller's
+    updated = {id for id, status in changed}
+    return json_response({'updated': sorted(updated),
+                          'skipped': [id for id, status, expected in changes if id not in updated]})
+
+
+
+
+def init_app(app):
+    app.register_blueprint(api_bp)
+
+    @app.cli.command('create-api-token')
+    @click.argument('email')
+    @click.option('--name', default='integration', help='What the token is for, e.g. "ERP sync".')
+    def create_api_token_command(email, name):
+        user = User.query.filter_by(email=email).one_or_none()
+        if user is None:
+            raise click.ClickException(f'No user with email {email}.')
+        token = create_token(user, name)
+        db.session.commit()
+        click.echo(token)
+
+    @app.cli.command('revoke-api-token')
+    @click.argument('email')
+    @click.option('--name', help='Revoke only the tokens with this name.')
+    def revoke_api_token_command(email, name):
+        user = User.query.filter_by(email=email).one_or_none()
+        if user is None:
+            raise click.ClickException(f'No user with email {email}.')
+        tokens = [token for token in user.api_tokens if name is None or token.name == name]
+        for token in tokens:
+            db.session.delete(token)
+        db.session.commit()
+        identity.invalidate(user.id)
+        click.echo(f'{len(tokens)} token(s) revoked')
@@ -0,0 +1,152 @@
+from flask import current_app
+from sqlalchemy import delete, exists, func, insert, literal, select
+from datetime import datetime, timedelta
+import click
+import multiprocessing
+import threading
+import time
+from . import db, counters, search, sweeper
+from .models import ArchivedDrive, ArchivedApplication, PlacementDrive, Application
+
+
+
+
+# Past seasons move out of placement_drives and applications into archived_drives and archived_applications, so
+# the live tables, their indexes and every listing over them stay the size of the current season. History,
+# the placement export and the analytics rollups read both. Applications move in batches of at most
+# ARCHIVE_BATCH_SIZE, each its own short transaction, and a drive follows once its last application has moved.
+LEASE = 'season_archive:lease'
+BATCH_SIZE = 1000
+
+DRIVE_COLUMNS = ['id', 'company_id', 'title', 'description', 'eligibility', 'deadline', 'status', 'max_applicants',
+                 'eligible_branches', 'graduation_year', 'min_cgpa', 'max_backlogs', 'created_at']
+APPLICATION_COLUMNS = ['id', 'student_id', 'drive_id', 'status', 'applied_date', 'decided_at']
+
+
+
+
+def cutoff(days=None):
+    days = current_app.config.get('ARCHIVE_AFTER_DAYS', 365) if days is None else days
+    return datetime.now() - timedelta(days=days)
+
+
+
+
+def archivable_drives(conn, before, limit):
+    # closed drives whose deadline is older than `before`, oldest first along ix_placement_drives_status_deadline.
+    # SQLite hands out max(id) + 1, so the newest drive and application stay live and no id is ever reused.
+    newest_drive = select(func.max(PlacementDrive.id)).scalar_subquery()
+    newest_application = select(func.max(Application.id)).scalar_subquery()
+    return conn.scalars(
+        select(PlacementDrive.id)
+        .where(PlacementDrive.status == 'closed', PlacementDrive.deadline < before,
+               PlacementDrive.id < newest_drive,
+               ~exists().where(Application.id == newest_application, Application.drive_id == PlacementDrive.id))
+        .order_by(PlacementDrive.status, PlacementDrive.deadline)
+        .limit(limit)
+    ).all()
+
+
+
+
+def archive_batch(conn, before, batch_size=BATCH_SIZE):
+    # returns how many drives and applications were moved; (0, 0) once nothing is left to archive
+    drive_ids = archivable_drives(conn, before, batch_size)
+    if not drive_ids:
+        return 0, 0
+    now = datetime.utcnow()
+    conn.execute(insert(ArchivedDrive).from_select(
+        DRIVE_COLUMNS + ['archived_at'],
+        select(*[PlacementDrive.__table__.c[name] for name in DRIVE_COLUMNS], literal(now))
+        .where(PlacementDrive.id.in_(drive_ids), ~exists().where(ArchivedDrive.id == PlacementDrive.id))))
+
+    application_ids = conn.scalars(select(Application.id)
+                                   .where(Application.drive_id.in_(drive_ids))
+                                   .order_by(Application.drive_id)
+                                   .limit(batch_size)).all()
+    if application_ids:
+        conn.execute(insert(ArchivedApplication).from_select(
+            APPLICATION_COLUMNS,
+            select(*[Application.__table__.c[name] for name in APPLICATION_COLUMNS])
+            .where(Application.id.in_(application_ids))))
+        conn.execute(delete(Application).where(Application.id.in_(application_ids)))
+        # dashboard totals count the live tables
+        counters.increment(conn, 'applications', -len(application_ids))
+
+    remaining = set(conn.scalars(select(Application.drive_id).distinct().where(Application.drive_id.in_(drive_ids))))
+    emptied = [id for id in drive_ids if id not in remaining]
+    if emptied:
+        conn.execute(delete(PlacementDrive).where(PlacementDrive.id.in_(emptied)))
+        search.remove_documents(conn, PlacementDrive, emptied)
+        counters.increment(conn, 'drives', -len(emptied))
+    return len(emptied), len(application_ids)
+
+
+
+
+def archive(before, batch_size=BATCH_SIZE, pause=0.05):
+    # returns how many drives and applications were archived, or None when another process holds the lease
+    with db.engine.begin() as conn:
+        if not sweeper.acquire(conn, LEASE):
+            return None
+    drives = applications = 0
+    try:
+        while True:
+            with db.engine.begin() as conn:
+                moved = archive_batch(conn, before, batch_size)
+                sweeper.renew(conn, LEASE)
+            drives += moved[0]
+            applications += moved[1]
+            if moved == (0, 0):
+                break
+            # the write lock is free between batches, so requests waiting on it get their turn
+            time.sleep(pause)
+    finally:
+        with db.engine.begin() as conn:
+            sweeper.release(conn, LEASE)
+    return drives, applications
+
+
+
+
+def archive_periodically(app, interval):
+    with app.app_context():
+        batch_size = app.config.get('ARCHIVE_BATCH_SIZE', BATCH_SIZE)
+        while True:
+            try:
+                archived = archive(cutoff(), batch_size)
+                if archived and any(archived):
+                    app.logger.info('Archived %s drive(s) and %s application(s)', *archived)
+            except Exception:
+                app.logger.exception('Season archival failed')
+            time.sleep(interval)
+
+
+
+
+def init_app(app):
+    interval = app.config.get('ARCHIVE_INTERVAL_SECONDS', 86400)
+    if interval and not app.testing and multiprocessing.parent_process() is None:
+        started = []
+        lock = threading.Lock()
+
+        @app.before_request
+        def start_archiver_once():
+            if not started:
+                with lock:
+                    if not started:
+                        thread = threading.Thread(target=archive_periodically, args=(app, interval), daemon=True,
+                                                  name='season-archiver')
+                        thread.start()
+                        started.append(thread)
+
+    @app.cli.command('archive-season')
+    @click.option('--older-than-days', type=int, help='Archive drives closed this long past their deadline '
+                                                      '(default ARCHIVE_AFTER_DAYS).')
+    @click.option('--batch-size', type=int, help='Applications moved per transaction (default ARCHIVE_BATCH_SIZE).')
+    def archive_season_command(older_than_days, batch_size):
+        archived = archive(cutoff(older_than_days), batch_size or app.config.get('ARCHIVE_BATCH_SIZE', BATCH_SIZE))
+        if archived is None:
+            click.echo('Another process is archiving; nothing done')
+        else:
+            click.echo(f'{archived[0]} drive(s) and {archived[1]} application(s) archived')
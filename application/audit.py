@@ -0,0 +1,128 @@
+from flask import g, has_request_context
+from flask_login import current_user
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.orm import Session, object_session
+from datetime import datetime
+import click
+from . import db
+from .models import AuditEntry, Application
+
+
+
+
+# An append-only trail of who changed what: application status transitions and admin actions, with the old and
+# new values. Entries collect on the session as changes are made and are written by one multi-row INSERT when
+# it flushes or commits, so a request that changes a thousand applications adds one statement, not a thousand.
+APPLICATION_STATUS = 'application_status'
+ACCOUNT_STATES = {True: 'active', False: 'blacklisted'}
+
+
+
+
+def actor_id():
+    # the signed-in user or the owner of the API token; None for the CLI and background jobs
+    if not has_request_context():
+        return None
+    principal = g.get('api_principal')
+    if principal is not None:
+        return principal['user_id']
+    return current_user.id if current_user.is_authenticated else None
+
+
+
+
+def record(session, action, target_id, old=None, new=None, student_id=None, drive_id=None):
+    session.info.setdefault('audit_entries', []).append({
+        'actor_id': actor_id(), 'action': action, 'target_id': target_id, 'student_id': student_id,
+        'drive_id': drive_id, 'old_value': old, 'new_value': new, 'created_at': datetime.utcnow(),
+    })
+
+
+
+
+def record_statuses(session, changes):
+    # for Core UPDATEs: `changes` is (application id, student id, drive id, old status, new status)
+    for id, student_id, drive_id, old, new in changes:
+        record(session, APPLICATION_STATUS, id, old, new, student_id=student_id, drive_id=drive_id)
+
+
+
+
+def application_status_changed(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if history.has_changes():
+        record(object_session(target), APPLICATION_STATUS, target.id,
+               history.deleted[0] if history.deleted else None, target.status,
+               student_id=target.student_id, drive_id=target.drive_id)
+
+
+
+
+event.listen(Application, 'after_update', application_status_changed)
+
+
+
+
+def write(session):
+    entries = session.info.pop('audit_entries', None)
+    if entries:
+        session.connection().execute(insert(AuditEntry), entries)
+
+
+
+
+@event.listens_for(Session, 'after_flush')
+def write_flushed(session, flush_context):
+    write(session)
+
+
+
+
+@event.listens_for(Session, 'before_commit')
+def write_unflushed(session):
+    # entries recorded next to Core statements, when nothing is left for the commit to flush
+    write(session)
+
+
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard(session, previous_transaction):
+    session.info.pop('audit_entries', None)
+
+
+
+
+def timeline(student_id=None, drive_id=None, action=None):
+    # oldest first, along ix_audit_log_student_id_id or ix_audit_log_drive_id_id
+    column = AuditEntry.student_id if student_id is not None else AuditEntry.drive_id
+    statement = (select(AuditEntry)
+                 .where(column == (student_id if student_id is not None else drive_id))
+                 .order_by(column, AuditEntry.id))
+    if action is not None:
+        statement = statement.where(AuditEntry.action == action)
+    return db.session.scalars(statement).all()
+
+
+
+
+def application_timelines(student_id):
+    # application id -> its status changes, for a student's history
+    changes = {}
+    for entry in timeline(student_id=student_id, action=APPLICATION_STATUS):
+        changes.setdefault(entry.target_id, []).append(entry)
+    return changes
+
+
+
+
+def init_app(app):
+    @app.cli.command('audit-log')
+    @click.option('--student', type=int, help='Student profile id.')
+    @click.option('--drive', type=int, help='Placement drive id.')
+    def audit_log_command(student, drive):
+        if (student is None) == (drive is None):
+            raise click.UsageError('Pass exactly one of --student and --drive.')
+        for entry in timeline(student_id=student, drive_id=drive):
+            click.echo(f'{entry.created_at:%Y-%m-%d %H:%M:%S}  {entry.action} #{entry.target_id}  '
+                       f'{entry.old_value or "-"} -> {entry.new_value or "-"}  by {entry.actor_id or "system"}')
@@ -0,0 +1,59 @@
+from flask import current_app, get_template_attribute, request
+from markupsafe import Markup
+import re
+import threading
+from .submissions import current_epoch
+
+
+
+
+SLOT = re.compile(r'<!--(badge|action):(\d+)-->')
+
+_fragments = {}
+_lock = threading.Lock()
+
+
+
+
+def split(html):
+    # ['text', kind, id, 'text', kind, id, ..., 'text']
+    parts = SLOT.split(html)
+    return [(parts[i], parts[i + 1], int(parts[i + 2])) for i in range(0, len(parts) - 1, 3)], parts[-1]
+
+
+
+
+# an entry is dropped when a drive lifecycle route or the deadline sweeper bumps the drives epoch; `variant`
+# tells apart boards that differ for the same query string, such as each set of drives a student is eligible for
+def cached_fragment(render, variant=None):
+    if not current_app.config.get('DRIVE_BOARD_CACHE', True):
+        return split(render())
+
+    key = (variant, tuple(sorted(request.args.items(multi=True))))
+    epoch = current_epoch()
+    entry = _fragments.get(key)
+    if entry is not None and entry[0] == epoch:
+        return entry[1]
+
+    fragment = split(render())
+    with _lock:
+        if len(_fragments) >= current_app.config.get('DRIVE_BOARD_CACHE_SIZE', 256):
+            _fragments.clear()
+        _fragments[key] = (epoch, fragment)
+    return fragment
+
+
+
+
+def overlay(fragment, applied_drive_ids):
+    slots, tail = fragment
+    badge = get_template_attribute('student/drive_slots.html', 'applied_badge')
+    action = get_template_attribute('student/drive_slots.html', 'apply_action')
+    badges = {True: badge(True), False: badge(False)}
+    out = []
+    for text, kind, drive_id in slots:
+        applied = drive_id in applied_drive_ids
+        out.append(text)
+        out.append(badges[applied] if kind == 'badge' else action(drive_id, applied))
+    out.append(tail)
+    return Markup(''.join(out))
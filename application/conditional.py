@@ -0,0 +1,109 @@
+from flask import current_app, make_response, request, session
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+import atexit
+import hashlib
+import os
+import threading
+import time
+from . import db
+from .models import Counter
+
+
+
+
+PREFIX = 'conditional_get:'
+
+_tallies = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+
+
+def template_salt(app):
+    # a deploy that changes templates must not be answered with the previous release's 304s
+    newest = 0
+    for root, dirs, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            newest = max(newest, os.stat(os.path.join(root, name)).st_mtime_ns)
+    return str(newest)
+
+
+
+
+def etag(*parts):
+    key = repr((current_app.config['ETAG_SALT'],) + parts)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+
+
+def record(endpoint, not_modified):
+    with _lock:
+        for name in ('requests', 'not_modified') if not_modified else ('requests',):
+            key = f'{PREFIX}{endpoint}:{name}'
+            _tallies[key] = _tallies.get(key, 0) + 1
+
+
+
+
+def respond(tag, render):
+    # pending flash messages are part of the page, so the copy the browser holds is not current
+    fresh = tag in request.if_none_match and not session.get('_flashes')
+    record(request.endpoint, fresh)
+    response = current_app.response_class(status=304) if fresh else make_response(render())
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+
+
+def flush(conn):
+    with _lock:
+        tallies = dict(_tallies)
+        _tallies.clear()
+    if not tallies:
+        return
+    insert = postgresql.insert if conn.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(Counter).values([{'name': name, 'value': value} for name, value in sorted(tallies.items())])
+    conn.execute(statement.on_conflict_do_update(index_elements=['name'],
+                                                 set_={'value': Counter.value + statement.excluded.value}))
+
+
+
+
+def stats():
+    # a key range rather than LIKE, so the lookup uses the primary key; ';' sorts right after ':'
+    rows = db.session.execute(select(Counter.name, Counter.value)
+                              .where(Counter.name > PREFIX, Counter.name < PREFIX[:-1] + ';')).all()
+    counts = {}
+    for name, value in rows + list(_tallies.items()):
+        endpoint, kind = name[len(PREFIX):].rsplit(':', 1)
+        counts.setdefault(endpoint, {'requests': 0, 'not_modified': 0})[kind] += value
+    for endpoint in counts.values():
+        endpoint['hit_ratio'] = round(endpoint['not_modified'] / endpoint['requests'], 3) if endpoint['requests'] else 0
+    return counts
+
+
+
+
+def init_app(app):
+    app.config.setdefault('ETAG_SALT', template_salt(app))
+    interval = app.config.get('CONDITIONAL_GET_FLUSH_SECONDS', 60)
+
+    def flush_tallies():
+        if _tallies:
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    flush(conn)
+
+    @app.teardown_request
+    def flush_periodically(error):
+        global _last_flush
+        if time.monotonic() - _last_flush > interval:
+            _last_flush = time.monotonic()
+            flush_tallies()
+
+    atexit.register(flush_tallies)
@@ -1,9 +1,16 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.orm import joinedload
 from functools import wraps
 from datetime import datetime
-from . import db
-from .models import User, CompanyProfile, StudentProfile, PlacementDrive, Application
+import io
+from . import (db, analytics, audit, board, conditional, counters, eligibility, events, exports, identity, jobs,
+               queries, submissions, tasks, versions)
+from .importer import import_students, ImportFormatError
+from .pagination import paginate
+from .routing import replica_reads
+from .search import ranked_search
+from .models import User, CompanyProfile, StudentProfile, PlacementDrive, Application, Job
 
 
 
@@ -16,6 +23,39 @@ student_bp = Blueprint('student', __name__, url_prefix='/student')
 
 
 
+def drive_criteria_form():
+    # returns the drive's eligibility columns from the form, or None after flashing what is wrong
+    branches = [branch for branch in eligibility.BRANCHES if branch in request.form.getlist('eligible_branches')]
+    min_cgpa = request.form.get('min_cgpa', type=float)
+    max_backlogs = request.form.get('max_backlogs', type=int)
+    if min_cgpa is not None and not 0 <= min_cgpa <= 10:
+        flash('Minimum CGPA must be between 0 and 10.', 'danger')
+        return None
+    if max_backlogs is not None and max_backlogs < 0:
+        flash('Allowed backlogs cannot be negative.', 'danger')
+        return None
+    return {'eligible_branches': ','.join(branches) or None,
+            'graduation_year': request.form.get('graduation_year', type=int),
+            'min_cgpa': min_cgpa, 'max_backlogs': max_backlogs}
+
+
+
+
+def student_academics_form():
+    # returns the student's academic record from the form, or None after flashing what is wrong
+    academics = {'branch': request.form.get('branch') or None,
+                 'graduation_year': request.form.get('graduation_year', type=int),
+                 'cgpa': request.form.get('cgpa', type=float),
+                 'backlogs': request.form.get('backlogs', 0, type=int)}
+    error = eligibility.check_academics(**academics)
+    if error:
+        flash(error, 'danger')
+        return None
+    return academics
+
+
+
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -89,6 +129,10 @@ def login():
                 flash('Your company registration is pending approval.', 'warning')
                 return redirect(url_for('auth.login'))
             
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            
             login_user(user)
             flash('Login successful!', 'success')
             
@@ -201,69 +245,159 @@ def register_student():
 
 
 @admin_bp.route('/dashboard')
+@replica_reads
 @admin_required
 def dashboard():
-    total_students = StudentProfile.query.count()
-    total_companies = CompanyProfile.query.count()
-    total_applications = Application.query.count()
-    total_drives = PlacementDrive.query.count()
-    pending_companies = CompanyProfile.query.filter_by(approval_status='pending').count()
-    pending_drives = PlacementDrive.query.filter_by(status='pending').count()
+    counts = counters.read()
     
     return render_template('admin/dashboard.html',
-                         total_students=total_students,
-                         total_companies=total_companies,
-                         total_applications=total_applications,
-                         total_drives=total_drives,
-                         pending_companies=pending_companies,
-                         pending_drives=pending_drives)
+                         failed_jobs=jobs.failed(),
+                         total_students=counts['students'],
+                         total_companies=counts['companies'],
+                         total_applications=counts['applications'],
+                         total_drives=counts['drives'],
+                         pending_companies=counts['pending_companies'],
+                         pending_drives=counts['pending_drives'])
 
 
 
 
 @admin_bp.route('/companies')
+@replica_reads
 @admin_required
 def companies():
     search = request.args.get('search', '')
+    query, keys = queries.companies(), [CompanyProfile.id]
     if search:
-        companies = CompanyProfile.query.filter(CompanyProfile.name.contains(search)).all()
-    else:
-        companies = CompanyProfile.query.all()
+        query, keys = ranked_search(query, CompanyProfile, search, keys)
+    companies = paginate(query, keys)
     return render_template('admin/companies.html', companies=companies, search=search)
 
 
 
 
 @admin_bp.route('/students')
+@replica_reads
 @admin_required
 def students():
     search = request.args.get('search', '')
+    query, keys = queries.students(), [StudentProfile.id]
     if search:
-        students = StudentProfile.query.filter(
-            (StudentProfile.name.contains(search)) | 
-            (StudentProfile.student_id.contains(search))
-        ).all()
-    else:
-        students = StudentProfile.query.all()
+        query, keys = ranked_search(query, StudentProfile, search, keys)
+    students = paginate(query, keys)
     return render_template('admin/students.html', students=students, search=search)
 
 
 
 
+@admin_bp.route('/students/<int:id>/academics', methods=['GET', 'POST'])
+@admin_required
+def student_academics(id):
+    student = StudentProfile.query.get_or_404(id)
+    if request.method == 'POST':
+        academics = student_academics_form()
+        if academics is None:
+            return redirect(url_for('admin.student_academics', id=id))
+        old = eligibility.format_academics(student)
+        for name, value in academics.items():
+            setattr(student, name, value)
+        audit.record(db.session, 'update_academics', student.id, old, eligibility.format_academics(student),
+                     student_id=student.id)
+        db.session.commit()
+        identity.invalidate(student.user_id)
+        flash(f'Academic record of "{student.name}" updated.', 'success')
+        return redirect(url_for('admin.students'))
+    
+    return render_template('admin/student_academics.html', student=student, branches=eligibility.BRANCHES)
+
+
+
+
+@admin_bp.route('/students/import', methods=['GET', 'POST'])
+@admin_required
+def import_students_csv():
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV file to import.', 'danger')
+            return redirect(url_for('admin.import_students_csv'))
+        
+        try:
+            report = import_students(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            flash(f'Could not read the file: {e}', 'danger')
+            return redirect(url_for('admin.import_students_csv'))
+        flash(f'Imported {report.created} student(s), rejected {len(report.errors)} row(s).',
+              'success' if not report.errors else 'warning')
+    
+    return render_template('admin/import_students.html', report=report)
+
+
+
+
 @admin_bp.route('/drives')
+@replica_reads
 @admin_required
 def drives():
-    drives = PlacementDrive.query.all()
+    drives = paginate(queries.drives(), [PlacementDrive.created_at, PlacementDrive.id])
     return render_template('admin/drives.html', drives=drives)
 
 
 
 
+@admin_bp.route('/reports/placements.<any(csv, xlsx):format>')
+@replica_reads
+@admin_required
+def export_placements(format):
+    return exports.export_response(exports.placement_outcomes(), format, 'placement-outcomes')
+
+
+
+
+@admin_bp.route('/analytics')
+@replica_reads
+@admin_required
+def analytics_dashboard():
+    return render_template('admin/analytics.html',
+                           summary=analytics.report('summary'),
+                           companies=analytics.report('companies'),
+                           drives=analytics.report('drives', limit=20),
+                           students=analytics.report('students', limit=20))
+
+
+
+
+@admin_bp.route('/analytics/<any(summary, companies, drives, students, decisions):name>.json')
+@replica_reads
+@admin_required
+def analytics_report(name):
+    params = {}
+    if name in ('drives', 'students'):
+        params['limit'] = max(1, min(request.args.get('limit', 50, type=int), 1000))
+    if name == 'drives' and request.args.get('company_id', type=int) is not None:
+        params['company_id'] = request.args.get('company_id', type=int)
+    return analytics.report(name, **params)
+
+
+
+
+@admin_bp.route('/metrics/conditional-get')
+@replica_reads
+@admin_required
+def conditional_get_metrics():
+    return conditional.stats()
+
+
+
+
 @admin_bp.route('/approvals')
+@replica_reads
 @admin_required
 def approvals():
-    pending_companies = CompanyProfile.query.filter_by(approval_status='pending').all()
-    pending_drives = PlacementDrive.query.filter_by(status='pending').all()
+    pending_companies = paginate(queries.pending_companies(), [CompanyProfile.id], prefix='companies_')
+    pending_drives = paginate(queries.pending_drives(), [PlacementDrive.deadline, PlacementDrive.id],
+                              prefix='drives_')
     return render_template('admin/approvals.html', 
                          pending_companies=pending_companies,
                          pending_drives=pending_drives)
@@ -275,8 +409,13 @@ def approvals():
 @admin_required
 def approve_company(id):
     company = CompanyProfile.query.get_or_404(id)
+    audit.record(db.session, 'approve_company', company.id, company.approval_status, 'approved')
     company.approval_status = 'approved'
+    jobs.enqueue('notify_company_approval', company_id=company.id)
+    events.publish([company.user_id], 'company_approval',
+                   {'status': 'approved', 'message': 'Your company registration has been approved.'})
     db.session.commit()
+    identity.invalidate(company.user_id)
     flash(f'Company "{company.name}" has been approved.', 'success')
     return redirect(url_for('admin.approvals'))
 
@@ -287,8 +426,13 @@ def approve_company(id):
 @admin_required
 def reject_company(id):
     company = CompanyProfile.query.get_or_404(id)
+    audit.record(db.session, 'reject_company', company.id, company.approval_status, 'rejected')
     company.approval_status = 'rejected'
+    jobs.enqueue('notify_company_approval', company_id=company.id)
+    events.publish([company.user_id], 'company_approval',
+                   {'status': 'rejected', 'message': 'Your company registration has been rejected.'})
     db.session.commit()
+    identity.invalidate(company.user_id)
     flash(f'Company "{company.name}" has been rejected.', 'warning')
     return redirect(url_for('admin.approvals'))
 
@@ -299,8 +443,14 @@ def reject_company(id):
 @admin_required
 def approve_drive(id):
     drive = PlacementDrive.query.get_or_404(id)
+    audit.record(db.session, 'approve_drive', drive.id, drive.status, 'approved', drive_id=drive.id)
     drive.status = 'approved'
+    jobs.enqueue('notify_drive_approval', drive_id=drive.id)
+    events.publish([drive.company.user_id], 'drive_status',
+                   {'drive_id': drive.id, 'status': 'approved',
+                    'message': f'Drive "{drive.title}" has been approved.'})
     db.session.commit()
+    submissions.invalidate()
     flash(f'Drive "{drive.title}" has been approved.', 'success')
     return redirect(url_for('admin.approvals'))
 
@@ -311,8 +461,14 @@ def approve_drive(id):
 @admin_required
 def reject_drive(id):
     drive = PlacementDrive.query.get_or_404(id)
+    audit.record(db.session, 'reject_drive', drive.id, drive.status, 'rejected', drive_id=drive.id)
     drive.status = 'rejected'
+    jobs.enqueue('notify_drive_approval', drive_id=drive.id)
+    events.publish([drive.company.user_id], 'drive_status',
+                   {'drive_id': drive.id, 'status': 'rejected',
+                    'message': f'Drive "{drive.title}" has been rejected.'})
     db.session.commit()
+    submissions.invalidate()
     flash(f'Drive "{drive.title}" has been rejected.', 'warning')
     return redirect(url_for('admin.approvals'))
 
@@ -324,9 +480,13 @@ def reject_drive(id):
 def delete_company(id):
     company = CompanyProfile.query.get_or_404(id)
     user = company.user
-    db.session.delete(user)
+    audit.record(db.session, 'delete_company', company.id, audit.ACCOUNT_STATES[user.is_active], 'deleted')
+    # the cascade through drives and applications runs in the background; the account is locked out meanwhile
+    user.is_active = False
+    jobs.enqueue('delete_user', user_id=user.id)
     db.session.commit()
-    flash('Company has been deleted.', 'success')
+    identity.invalidate(user.id)
+    flash('Company has been scheduled for deletion.', 'success')
     return redirect(url_for('admin.companies'))
 
 
@@ -337,20 +497,43 @@ def delete_company(id):
 def delete_student(id):
     student = StudentProfile.query.get_or_404(id)
     user = student.user
-    db.session.delete(user)
+    audit.record(db.session, 'delete_student', student.id, audit.ACCOUNT_STATES[user.is_active], 'deleted',
+                 student_id=student.id)
+    user.is_active = False
+    jobs.enqueue('delete_user', user_id=user.id)
     db.session.commit()
-    flash('Student has been deleted.', 'success')
+    identity.invalidate(user.id)
+    flash('Student has been scheduled for deletion.', 'success')
     return redirect(url_for('admin.students'))
 
 
 
 
+@admin_bp.route('/jobs/<int:id>/retry')
+@admin_required
+def retry_job(id):
+    job = Job.query.get_or_404(id)
+    if job.status != 'failed':
+        flash('That job is not failed.', 'warning')
+        return redirect(url_for('admin.dashboard'))
+    audit.record(db.session, 'retry_job', job.id, 'failed', 'queued')
+    jobs.retry(job)
+    db.session.commit()
+    flash(f'Job "{job.name}" has been queued again.', 'success')
+    return redirect(url_for('admin.dashboard'))
+
+
+
+
 @admin_bp.route('/blacklist/company/<int:id>')
 @admin_required
 def blacklist_company(id):
     company = CompanyProfile.query.get_or_404(id)
+    audit.record(db.session, 'blacklist_company', company.id, audit.ACCOUNT_STATES[company.user.is_active],
+                 'blacklisted')
     company.user.is_active = False
     db.session.commit()
+    identity.invalidate(company.user_id)
     flash(f'Company "{company.name}" has been blacklisted.', 'warning')
     return redirect(url_for('admin.companies'))
 
@@ -361,8 +544,11 @@ def blacklist_company(id):
 @admin_required
 def blacklist_student(id):
     student = StudentProfile.query.get_or_404(id)
+    audit.record(db.session, 'blacklist_student', student.id, audit.ACCOUNT_STATES[student.user.is_active],
+                 'blacklisted', student_id=student.id)
     student.user.is_active = False
     db.session.commit()
+    identity.invalidate(student.user_id)
     flash(f'Student "{student.name}" has been blacklisted.', 'warning')
     return redirect(url_for('admin.students'))
 
@@ -373,8 +559,10 @@ def blacklist_student(id):
 @admin_required
 def activate_company(id):
     company = CompanyProfile.query.get_or_404(id)
+    audit.record(db.session, 'activate_company', company.id, audit.ACCOUNT_STATES[company.user.is_active], 'active')
     company.user.is_active = True
     db.session.commit()
+    identity.invalidate(company.user_id)
     flash(f'Company "{company.name}" has been activated.', 'success')
     return redirect(url_for('admin.companies'))
 
@@ -385,8 +573,11 @@ def activate_company(id):
 @admin_required
 def activate_student(id):
     student = StudentProfile.query.get_or_404(id)
+    audit.record(db.session, 'activate_student', student.id, audit.ACCOUNT_STATES[student.user.is_active], 'active',
+                 student_id=student.id)
     student.user.is_active = True
     db.session.commit()
+    identity.invalidate(student.user_id)
     flash(f'Student "{student.name}" has been activated.', 'success')
     return redirect(url_for('admin.students'))
 
@@ -394,10 +585,11 @@ def activate_student(id):
 
 
 @company_bp.route('/dashboard')
+@replica_reads
 @company_required
 def dashboard():
     company = current_user.company_profile
-    drives = company.placement_drives
+    drives = queries.company_drives(company.id)
     return render_template('company/dashboard.html', company=company, drives=drives)
 
 
@@ -409,8 +601,12 @@ def create_drive():
     if request.method == 'POST':
         title = request.form.get('title')
         description = request.form.get('description')
-        eligibility = request.form.get('eligibility')
+        eligibility_notes = request.form.get('eligibility')
         deadline_str = request.form.get('deadline')
+        max_applicants = request.form.get('max_applicants', type=int)
+        criteria = drive_criteria_form()
+        if criteria is None:
+            return redirect(url_for('company.create_drive'))
         
         deadline = datetime.strptime(deadline_str, '%Y-%m-%dT%H:%M')
         
@@ -418,13 +614,19 @@ def create_drive():
             flash('Deadline must be in the future.', 'danger')
             return redirect(url_for('company.create_drive'))
         
+        if max_applicants is not None and max_applicants < 1:
+            flash('Applicant limit must be at least 1.', 'danger')
+            return redirect(url_for('company.create_drive'))
+        
         drive = PlacementDrive(
             company_id=current_user.company_profile.id,
             title=title,
             description=description,
-            eligibility=eligibility,
+            eligibility=eligibility_notes,
             deadline=deadline,
-            status='pending'
+            max_applicants=max_applicants,
+            status='pending',
+            **criteria
         )
         db.session.add(drive)
         db.session.commit()
@@ -432,7 +634,7 @@ def create_drive():
         flash('Placement drive created successfully! Pending admin approval.', 'success')
         return redirect(url_for('company.dashboard'))
     
-    return render_template('company/create_drive.html')
+    return render_template('company/create_drive.html', branches=eligibility.BRANCHES)
 
 
 
@@ -452,12 +654,26 @@ def edit_drive(id):
         drive.eligibility = request.form.get('eligibility')
         deadline_str = request.form.get('deadline')
         drive.deadline = datetime.strptime(deadline_str, '%Y-%m-%dT%H:%M')
+        max_applicants = request.form.get('max_applicants', type=int)
+        
+        if max_applicants is not None and max_applicants < 1:
+            flash('Applicant limit must be at least 1.', 'danger')
+            return redirect(url_for('company.edit_drive', id=id))
+        drive.max_applicants = max_applicants
+        
+        criteria = drive_criteria_form()
+        if criteria is None:
+            return redirect(url_for('company.edit_drive', id=id))
+        for key, value in criteria.items():
+            setattr(drive, key, value)
         
         db.session.commit()
+        submissions.invalidate()
         flash('Drive updated successfully!', 'success')
         return redirect(url_for('company.dashboard'))
     
-    return render_template('company/edit_drive.html', drive=drive)
+    return render_template('company/edit_drive.html', drive=drive, branches=eligibility.BRANCHES,
+                           selected_branches=eligibility.parse_branches(drive.eligible_branches) or ())
 
 
 
@@ -472,7 +688,10 @@ def close_drive(id):
         return redirect(url_for('company.dashboard'))
     
     drive.status = 'closed'
+    events.publish_to_applicants(drive.id, 'drive_status',
+                                 {'drive_id': drive.id, 'status': 'closed', 'message': f'"{drive.title}" has closed.'})
     db.session.commit()
+    submissions.invalidate()
     flash('Drive has been closed.', 'success')
     return redirect(url_for('company.dashboard'))
 
@@ -488,15 +707,19 @@ def delete_drive(id):
         flash('Access denied.', 'danger')
         return redirect(url_for('company.dashboard'))
     
-    db.session.delete(drive)
+    # closed right away so it leaves the board; the applications go with it in the background
+    drive.status = 'closed'
+    jobs.enqueue('delete_drive', drive_id=drive.id)
     db.session.commit()
-    flash('Drive has been deleted.', 'success')
+    submissions.invalidate()
+    flash('Drive has been scheduled for deletion.', 'success')
     return redirect(url_for('company.dashboard'))
 
 
 
 
 @company_bp.route('/applicants/<int:drive_id>')
+@replica_reads
 @company_required
 def applicants(drive_id):
     drive = PlacementDrive.query.get_or_404(drive_id)
@@ -505,8 +728,36 @@ def applicants(drive_id):
         flash('Access denied.', 'danger')
         return redirect(url_for('company.dashboard'))
     
-    applications = Application.query.filter_by(drive_id=drive_id).all()
-    return render_template('company/applicants.html', drive=drive, applications=applications)
+    applications = paginate(queries.drive_applications(drive_id), [Application.applied_date, Application.id])
+    total = queries.count_drive_applications(drive_id)
+    eligible = eligibility.count_eligible_students(drive)
+    return render_template('company/applicants.html', drive=drive, applications=applications, total=total,
+                           eligible=eligible, criteria=eligibility.describe(drive))
+
+
+
+
+@company_bp.route('/applicants/<int:drive_id>/export.<any(csv, xlsx):format>')
+@replica_reads
+@company_required
+def export_applicants(drive_id, format):
+    drive = PlacementDrive.query.get_or_404(drive_id)
+    
+    if drive.company_id != current_user.company_profile.id:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('company.dashboard'))
+    
+    return exports.export_response(exports.drive_applicants(drive_id), format, f'drive-{drive_id}-applicants')
+
+
+
+
+@company_bp.route('/applications/export.<any(csv, xlsx):format>')
+@replica_reads
+@company_required
+def export_applications(format):
+    return exports.export_response(exports.company_applications(current_user.company_profile.id), format,
+                                   'applications')
 
 
 
@@ -514,29 +765,86 @@ def applicants(drive_id):
 @company_bp.route('/application/<int:id>/update', methods=['POST'])
 @company_required
 def update_application(id):
-    application = Application.query.get_or_404(id)
+    application = Application.query.options(joinedload(Application.drive)).get_or_404(id)
     
     if application.drive.company_id != current_user.company_profile.id:
         flash('Access denied.', 'danger')
         return redirect(url_for('company.dashboard'))
     
+    # read before the commit expires it, so the redirect does not load the application again
+    drive_id = application.drive_id
     new_status = request.form.get('status')
     if new_status in ['applied', 'shortlisted', 'selected', 'rejected']:
         application.status = new_status
+        if new_status in tasks.NOTIFIED_STATUSES:
+            jobs.enqueue('notify_application_status', application_id=application.id, status=new_status)
+        events.publish_application_statuses([application.id])
         db.session.commit()
         flash('Application status updated.', 'success')
     
-    return redirect(url_for('company.applicants', drive_id=application.drive_id))
+    return redirect(url_for('company.applicants', drive_id=drive_id))
+
+
+
+
+@company_bp.route('/applicants/<int:drive_id>/status', methods=['POST'])
+@company_required
+def update_applications(drive_id):
+    new_status = request.form.get('status')
+    if new_status not in queries.APPLICATION_STATUSES:
+        flash('Choose a status to apply.', 'danger')
+        return redirect(url_for('company.applicants', drive_id=drive_id))
+    
+    if request.form.get('scope') == 'filter':
+        from_status = request.form.get('from_status')
+        if from_status not in queries.APPLICATION_STATUSES:
+            flash('Choose which applicants to update.', 'danger')
+            return redirect(url_for('company.applicants', drive_id=drive_id))
+        seen = None
+    else:
+        from_status = None
+        seen = []
+        for value in request.form.getlist('application'):
+            id, _, status = value.partition(':')
+            if id.isdigit() and status in queries.APPLICATION_STATUSES:
+                seen.append((int(id), status))
+        if not seen:
+            flash('Select at least one applicant.', 'warning')
+            return redirect(url_for('company.applicants', drive_id=drive_id))
+    
+    changed = queries.update_application_statuses(drive_id, current_user.company_profile.id, new_status,
+                                                  seen=seen, from_status=from_status)
+    if new_status in tasks.NOTIFIED_STATUSES:
+        jobs.enqueue_many('notify_application_status',
+                          [{'application_id': id, 'status': new_status} for id in changed])
+    events.publish_application_statuses(changed)
+    db.session.commit()
+    
+    updated = len(changed)
+    skipped = len(seen) - updated if seen is not None else 0
+    if skipped:
+        flash(f'{updated} application(s) updated; {skipped} skipped because they already had that status '
+              f'or were changed by someone else.', 'warning')
+    else:
+        flash(f'{updated} application(s) updated.', 'success')
+    return redirect(url_for('company.applicants', drive_id=drive_id))
 
 
 
 
 @student_bp.route('/dashboard')
+@replica_reads
 @student_required
 def dashboard():
     student = current_user.student_profile
-    applications = Application.query.filter_by(student_id=student.id).all()
-    return render_template('student/dashboard.html', student=student, applications=applications)
+    
+    def render():
+        applications = queries.student_applications(student.id, limit=5)
+        counts = queries.application_status_counts(student.id)
+        return render_template('student/dashboard.html', student=student, applications=applications, counts=counts)
+    
+    tag = conditional.etag('student.dashboard', student.id, versions.student_version(student.id))
+    return conditional.respond(tag, render)
 
 
 
@@ -550,7 +858,9 @@ def profile():
         student.name = request.form.get('name')
         student.contact = request.form.get('contact')
         student.resume_bio = request.form.get('resume_bio')
+        # branch, graduation year, CGPA and backlogs decide eligibility, so only the placement office sets them
         db.session.commit()
+        identity.invalidate(current_user.id)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('student.profile'))
     
@@ -560,18 +870,40 @@ def profile():
 
 
 @student_bp.route('/drives')
+@replica_reads
 @student_required
 def drives():
     student = current_user.student_profile
-    approved_drives = PlacementDrive.query.filter_by(status='approved').filter(
-        PlacementDrive.deadline > datetime.now()
-    ).all()
+    search = request.args.get('search', '')
+    criteria = eligibility.student_criteria(student)
     
-    applied_drive_ids = [app.drive_id for app in student.applications]
+    def render():
+        # only the drives whose criteria the student meets, matched by the in-memory eligibility index; students
+        # eligible for the same drives share a cached board
+        index = eligibility.drive_index()
+        eligible = index.match(criteria)
+        
+        def render_board():
+            query, keys = queries.open_drives(index.drive_ids(eligible)), [PlacementDrive.deadline, PlacementDrive.id]
+            if search:
+                query, keys = ranked_search(query, PlacementDrive, search, keys)
+            approved_drives = paginate(query, keys)
+            return render_template('student/drive_board.html', drives=approved_drives, describe=eligibility.describe)
+        
+        # search results are ranked per query, so only the plain board pages are cached
+        fragment = board.split(render_board()) if search else board.cached_fragment(render_board, variant=eligible)
+        applied_drive_ids = queries.applied_drive_ids(student.id)
+        
+        return render_template('student/drives.html', 
+                             board=board.overlay(fragment, applied_drive_ids),
+                             search=search,
+                             profile_complete=None not in criteria)
     
-    return render_template('student/drives.html', 
-                         drives=approved_drives, 
-                         applied_drive_ids=applied_drive_ids)
+    # the board changes with the drives epoch, which the deadline sweeper bumps as drives expire, and with the
+    # student's own academic details
+    tag = conditional.etag('student.drives', student.id, versions.student_version(student.id),
+                           submissions.current_epoch(), criteria, sorted(request.args.items(multi=True)))
+    return conditional.respond(tag, render)
 
 
 
@@ -579,29 +911,27 @@ def drives():
 @student_bp.route('/apply/<int:drive_id>')
 @student_required
 def apply(drive_id):
-    drive = PlacementDrive.query.get_or_404(drive_id)
-    student = current_user.student_profile
+    outcome = submissions.submit(current_user.student_profile, drive_id)
     
-    if drive.status != 'approved':
+    if outcome == 'closed':
         flash('This drive is not accepting applications.', 'danger')
         return redirect(url_for('student.drives'))
     
-    if drive.deadline < datetime.now():
+    if outcome == 'expired':
         flash('Application deadline has passed.', 'danger')
         return redirect(url_for('student.drives'))
     
-    existing = Application.query.filter_by(student_id=student.id, drive_id=drive_id).first()
-    if existing:
+    if outcome == 'ineligible':
+        flash("You do not meet this drive's eligibility criteria.", 'danger')
+        return redirect(url_for('student.drives'))
+    
+    if outcome == 'duplicate':
         flash('You have already applied for this drive.', 'warning')
         return redirect(url_for('student.drives'))
     
-    application = Application(
-        student_id=student.id,
-        drive_id=drive_id,
-        status='applied'
-    )
-    db.session.add(application)
-    db.session.commit()
+    if outcome == 'full':
+        flash('This drive has reached its applicant limit.', 'danger')
+        return redirect(url_for('student.drives'))
     
     flash('Application submitted successfully!', 'success')
     return redirect(url_for('student.history'))
@@ -610,8 +940,15 @@ def apply(drive_id):
 
 
 @student_bp.route('/history')
+@replica_reads
 @student_required
 def history():
     student = current_user.student_profile
-    applications = Application.query.filter_by(student_id=student.id).order_by(Application.applied_date.desc()).all()
-    return render_template('student/history.html', applications=applications)
+    
+    def render():
+        applications = queries.student_applications(student.id)
+        return render_template('student/history.html', applications=applications,
+                               timelines=audit.application_timelines(student.id))
+    
+    tag = conditional.etag('student.history', student.id, versions.student_version(student.id))
+    return conditional.respond(tag, render)
@@ -0,0 +1,207 @@
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.orm import Session, object_session
+import click
+import multiprocessing
+import threading
+import time
+from . import db, sweeper
+from .models import Counter, CompanyProfile, StudentProfile, PlacementDrive, Application
+
+
+
+
+COUNTED_MODELS = {
+    StudentProfile: 'students',
+    CompanyProfile: 'companies',
+    PlacementDrive: 'drives',
+    Application: 'applications',
+}
+
+LEASE = 'counter_reconciler:lease'
+
+COUNTER_NAMES = ['students', 'companies', 'drives', 'applications', 'pending_companies', 'pending_drives']
+
+PENDING_COUNTERS = {
+    CompanyProfile: ('approval_status', 'pending_companies'),
+    PlacementDrive: ('status', 'pending_drives'),
+}
+
+
+
+
+def true_counts(conn):
+    return {
+        'students': conn.scalar(select(func.count(StudentProfile.id))),
+        'companies': conn.scalar(select(func.count(CompanyProfile.id))),
+        'drives': conn.scalar(select(func.count(PlacementDrive.id))),
+        'applications': conn.scalar(select(func.count(Application.id))),
+        'pending_companies': conn.scalar(
+            select(func.count(CompanyProfile.id)).where(CompanyProfile.approval_status == 'pending')),
+        'pending_drives': conn.scalar(
+            select(func.count(PlacementDrive.id)).where(PlacementDrive.status == 'pending')),
+    }
+
+
+
+
+def reconcile(conn):
+    counts = true_counts(conn)
+    stored = dict(conn.execute(select(Counter.name, Counter.value).where(Counter.name.in_(COUNTER_NAMES))).all())
+    drift = {}
+    for name, value in counts.items():
+        if name not in stored:
+            conn.execute(Counter.__table__.insert().values(name=name, value=value))
+        elif stored[name] != value:
+            conn.execute(Counter.__table__.update().where(Counter.name == name).values(value=value))
+        if stored.get(name) != value:
+            drift[name] = value - stored.get(name, 0)
+    return drift
+
+
+
+
+def read():
+    # the table also holds the background leases and conditional GET tallies
+    counts = dict.fromkeys(COUNTER_NAMES, 0)
+    counts.update(db.session.execute(select(Counter.name, Counter.value).where(Counter.name.in_(COUNTER_NAMES))).all())
+    return counts
+
+
+
+
+def increment(conn, name, delta):
+    conn.execute(text('UPDATE counters SET value = value + :delta WHERE name = :name'),
+                 {'delta': delta, 'name': name})
+
+
+
+
+def add(session, name, delta):
+    deltas = session.info.setdefault('counter_deltas', {})
+    deltas[name] = deltas.get(name, 0) + delta
+
+
+
+
+def pending_delta(target, attribute, inserted=False, deleted=False):
+    if inserted:
+        return 1 if (getattr(target, attribute) or 'pending') == 'pending' else 0
+    if deleted:
+        return -1 if getattr(target, attribute) == 'pending' else 0
+    history = inspect(target).attrs[attribute].history
+    if not history.has_changes():
+        return 0
+    before = history.deleted[0] if history.deleted else None
+    after = history.added[0] if history.added else None
+    return (after == 'pending') - (before == 'pending')
+
+
+
+
+def count_insert(mapper, connection, target):
+    session = object_session(target)
+    add(session, COUNTED_MODELS[mapper.class_], 1)
+    if mapper.class_ in PENDING_COUNTERS:
+        attribute, name = PENDING_COUNTERS[mapper.class_]
+        add(session, name, pending_delta(target, attribute, inserted=True))
+
+
+
+
+def count_delete(mapper, connection, target):
+    session = object_session(target)
+    add(session, COUNTED_MODELS[mapper.class_], -1)
+    if mapper.class_ in PENDING_COUNTERS:
+        attribute, name = PENDING_COUNTERS[mapper.class_]
+        add(session, name, pending_delta(target, attribute, deleted=True))
+
+
+
+
+def count_update(mapper, connection, target):
+    attribute, name = PENDING_COUNTERS[mapper.class_]
+    add(object_session(target), name, pending_delta(target, attribute))
+
+
+
+
+for counted_model in COUNTED_MODELS:
+    event.listen(counted_model, 'after_insert', count_insert)
+    event.listen(counted_model, 'after_delete', count_delete)
+for counted_model in PENDING_COUNTERS:
+    # the status columns are declared with active_history, so the old value is there even when it was expired
+    event.listen(counted_model, 'after_update', count_update)
+
+
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_deltas(session, flush_context):
+    deltas = session.info.pop('counter_deltas', None)
+    if not deltas:
+        return
+    conn = session.connection()
+    for name, delta in deltas.items():
+        if delta:
+            increment(conn, name, delta)
+
+
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_deltas(session, previous_transaction):
+    session.info.pop('counter_deltas', None)
+
+
+
+
+def reconcile_once():
+    # returns the drift, or None when another process holds the lease; every gunicorn worker runs the loop
+    with db.engine.begin() as conn:
+        if not sweeper.acquire(conn, LEASE):
+            return None
+    try:
+        with db.engine.begin() as conn:
+            return reconcile(conn)
+    finally:
+        with db.engine.begin() as conn:
+            sweeper.release(conn, LEASE)
+
+
+
+
+def reconcile_periodically(app, interval):
+    with app.app_context():
+        while True:
+            time.sleep(interval)
+            try:
+                drift = reconcile_once()
+                if drift:
+                    app.logger.warning('Dashboard counters drifted and were reconciled: %s', drift)
+            except Exception:
+                app.logger.exception('Counter reconciliation failed')
+
+
+
+
+def init_app(app):
+    interval = app.config.get('COUNTER_RECONCILE_SECONDS', 600)
+    if interval and not app.testing and multiprocessing.parent_process() is None:
+        started = []
+        lock = threading.Lock()
+
+        @app.before_request
+        def start_reconciler_once():
+            if not started:
+                with lock:
+                    if not started:
+                        thread = threading.Thread(target=reconcile_periodically, args=(app, interval), daemon=True,
+                                                  name='counter-reconciler')
+                        thread.start()
+                        started.append(thread)
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters_command():
+        with db.engine.begin() as conn:
+            drift = reconcile(conn)
+        click.echo(f'Counters reconciled, drift: {drift or "none"}')
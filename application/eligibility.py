@@ -0,0 +1,180 @@
+from sqlalchemy import func, select
+from bisect import bisect_left, bisect_right
+import threading
+from . import db
+from .models import StudentProfile
+
+
+
+
+BRANCHES = ['Computer Science', 'Information Technology', 'Electronics', 'Electrical', 'Mechanical', 'Civil',
+            'Chemical']
+
+_index = None
+_lock = threading.Lock()
+
+
+
+
+def parse_branches(value):
+    return frozenset(value.split(',')) if value else None
+
+
+
+
+def drive_criteria(drive):
+    return (parse_branches(drive.eligible_branches), drive.graduation_year, drive.min_cgpa, drive.max_backlogs)
+
+
+
+
+def student_criteria(student):
+    return (student.branch, student.graduation_year, student.cgpa, student.backlogs or 0)
+
+
+
+
+def check_academics(branch, graduation_year, cgpa, backlogs):
+    # the first thing wrong with a student's academic record, or None
+    if branch is not None and branch not in BRANCHES:
+        return 'Choose a branch from the list.'
+    if graduation_year is not None and not 2000 <= graduation_year <= 2100:
+        return 'Graduation year must be between 2000 and 2100.'
+    if cgpa is not None and not 0 <= cgpa <= 10:
+        return 'CGPA must be between 0 and 10.'
+    if backlogs < 0:
+        return 'Backlogs cannot be negative.'
+    return None
+
+
+
+
+def format_academics(student):
+    # short enough for an audit entry's old and new values
+    branch, graduation_year, cgpa, backlogs = student_criteria(student)
+    return ' / '.join('-' if value is None else str(value) for value in (branch, graduation_year, cgpa, backlogs))
+
+
+
+
+def is_eligible(criteria, student):
+    # a criterion the drive leaves empty admits everyone; one it sets needs the student's value to satisfy it
+    branches, year, min_cgpa, max_backlogs = criteria
+    branch, graduation_year, cgpa, backlogs = student
+    return ((branches is None or branch in branches)
+            and (year is None or graduation_year == year)
+            and (min_cgpa is None or (cgpa is not None and cgpa >= min_cgpa))
+            and (max_backlogs is None or backlogs <= max_backlogs))
+
+
+
+
+# Open drives are numbered by bit position. Each criterion keeps the bitset of drives a given student value
+# passes, so matching a student against every open drive is four lookups and three ANDs.
+class DriveIndex:
+    def __init__(self, drives):
+        self.ids = sorted(drives)
+        self.branch_open = self.year_open = 0
+        self.by_branch, self.by_year = {}, {}
+        cgpa_limits, backlog_limits = [], []
+        for position, drive_id in enumerate(self.ids):
+            bit = 1 << position
+            branches, year, min_cgpa, max_backlogs = drives[drive_id]
+            if branches is None:
+                self.branch_open |= bit
+            for branch in branches or ():
+                self.by_branch[branch] = self.by_branch.get(branch, 0) | bit
+            if year is None:
+                self.year_open |= bit
+            else:
+                self.by_year[year] = self.by_year.get(year, 0) | bit
+            cgpa_limits.append((min_cgpa if min_cgpa is not None else float('-inf'), bit))
+            backlog_limits.append((max_backlogs if max_backlogs is not None else float('inf'), bit))
+
+        # drives sorted by minimum CGPA, with the running union: prefix i admits any CGPA >= cutoff i
+        cgpa_limits.sort(key=lambda limit: limit[0])
+        self.cgpa_cutoffs = [cutoff for cutoff, bit in cgpa_limits]
+        self.cgpa_masks = [0]
+        for cutoff, bit in cgpa_limits:
+            self.cgpa_masks.append(self.cgpa_masks[-1] | bit)
+        # drives sorted by maximum backlogs, with the union of every drive from position i onwards
+        backlog_limits.sort(key=lambda limit: limit[0])
+        self.backlog_limits = [limit for limit, bit in backlog_limits]
+        self.backlog_masks = [0] * (len(backlog_limits) + 1)
+        for i in range(len(backlog_limits) - 1, -1, -1):
+            self.backlog_masks[i] = self.backlog_masks[i + 1] | backlog_limits[i][1]
+    
+    
+    
+    
+    def match(self, student):
+        branch, graduation_year, cgpa, backlogs = student
+        mask = self.branch_open | self.by_branch.get(branch, 0)
+        mask &= self.year_open | self.by_year.get(graduation_year, 0)
+        mask &= self.cgpa_masks[bisect_right(self.cgpa_cutoffs, cgpa if cgpa is not None else float('-inf'))]
+        mask &= self.backlog_masks[bisect_left(self.backlog_limits, backlogs)]
+        return mask
+    
+    
+    
+    
+    def drive_ids(self, mask):
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(self.ids[low.bit_length() - 1])
+            mask ^= low
+        return ids
+
+
+
+
+def drive_index():
+    # rebuilt whenever submissions takes a new open-drive snapshot
+    global _index
+    from .submissions import open_drives
+    drives = open_drives()
+    index = _index
+    if index is None or index[0] is not drives:
+        with _lock:
+            index = _index = (drives, DriveIndex({id: drive[2] for id, drive in drives.items()}))
+    return index[1]
+
+
+
+
+def eligible_students(drive):
+    # each condition is served by its own index on student_profiles
+    branches, year, min_cgpa, max_backlogs = drive_criteria(drive)
+    conditions = []
+    if branches is not None:
+        conditions.append(StudentProfile.branch.in_(sorted(branches)))
+    if year is not None:
+        conditions.append(StudentProfile.graduation_year == year)
+    if min_cgpa is not None:
+        conditions.append(StudentProfile.cgpa >= min_cgpa)
+    if max_backlogs is not None:
+        conditions.append(StudentProfile.backlogs <= max_backlogs)
+    return select(StudentProfile.id).where(*conditions)
+
+
+
+
+def count_eligible_students(drive):
+    return db.session.scalar(select(func.count()).select_from(eligible_students(drive).subquery()))
+
+
+
+
+def describe(drive):
+    branches, year, min_cgpa, max_backlogs = drive_criteria(drive)
+    parts = []
+    if branches is not None:
+        parts.append(', '.join(sorted(branches)))
+    if year is not None:
+        parts.append(f'{year} graduates')
+    if min_cgpa is not None:
+        parts.append(f'CGPA {min_cgpa:g}+')
+    if max_backlogs is not None:
+        parts.append('no backlogs' if max_backlogs == 0 else f'at most {max_backlogs} backlog(s)')
+    return ' · '.join(parts)
@@ -0,0 +1,116 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+
+
+DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_CACHE_SIZE_KB': 64 * 1024,
+    'DB_POOL_SIZE': 8,
+    'DB_MAX_OVERFLOW': 4,
+    'DB_POOL_TIMEOUT': 10,
+    'DB_POOL_RECYCLE': 3600,
+    'DB_POOL_PRE_PING': True,
+    'PG_APPLICATION_NAME': 'placement-portal',
+    'PG_CONNECT_TIMEOUT': 10,
+    'PG_STATEMENT_TIMEOUT_MS': 30000,
+    'PG_IDLE_IN_TRANSACTION_TIMEOUT_MS': 60000,
+}
+
+
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+
+
+def is_postgresql(uri):
+    return make_url(uri).get_backend_name() == 'postgresql'
+
+
+
+
+def normalize_uri(uri):
+    # hosting providers hand out postgres:// URLs; SQLAlchemy wants postgresql:// and the psycopg 3 driver
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    if uri.startswith('postgresql://'):
+        uri = 'postgresql+psycopg://' + uri[len('postgresql://'):]
+    return uri
+
+
+
+
+def engine_options(config, uri, options):
+    options = dict(options)
+    if is_sqlite_file(uri) or is_postgresql(uri):
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+    connect_args = dict(options.get('connect_args', {}))
+    if is_sqlite_file(uri):
+        connect_args.setdefault('timeout', config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+    elif is_postgresql(uri):
+        # a dropped connection is replaced on checkout, and a runaway query or a forgotten transaction is
+        # ended by the server instead of holding a pool slot and its locks
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+        connect_args.setdefault('application_name', config['PG_APPLICATION_NAME'])
+        connect_args.setdefault('connect_timeout', config['PG_CONNECT_TIMEOUT'])
+        connect_args.setdefault('options', f"-c statement_timeout={int(config['PG_STATEMENT_TIMEOUT_MS'])} "
+                                           f"-c idle_in_transaction_session_timeout="
+                                           f"{int(config['PG_IDLE_IN_TRANSACTION_TIMEOUT_MS'])}")
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+
+
+def configure(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI'] = normalize_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, uri,
+                                                             app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    replica = app.config.get('REPLICA_DATABASE_URI')
+    if replica:
+        replica = normalize_uri(replica)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = {'url': replica, **engine_options(app.config, replica, {})}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+
+
+def pragmas(config):
+    return [
+        f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}",
+    ]
+
+
+
+
+def init_app(app, engine):
+    if not is_sqlite_file(engine.url):
+        return
+    statements = pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
@@ -0,0 +1,286 @@
+from flask import current_app, has_app_context, request
+from flask_login import current_user, login_required
+from sqlalchemy import delete, event, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import json
+import os
+import queue
+import threading
+import time
+from . import db
+from .models import Event, StudentProfile, PlacementDrive, Application
+
+
+
+
+# Live updates are rows in `events`, written in the same transaction as the change they describe, so a page
+# is told about exactly the changes that committed. Each worker process runs one broker thread that reads new
+# rows when the events epoch file moves and hands them to that process's open streams; the row id is the SSE
+# event id, so a reconnecting browser resumes with Last-Event-ID from the table.
+_broker = None
+_lock = threading.Lock()
+
+
+
+
+def epoch_file():
+    return current_app.config.get('EVENTS_EPOCH_FILE') or os.path.join(current_app.instance_path, 'events.epoch')
+
+
+
+
+def current_epoch(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(str(time.time_ns()))
+
+
+
+
+def serialize_commits(session):
+    # on PostgreSQL ids are handed out before commit, so a later id could become visible first and be skipped
+    # by a broker that has already read past it; publishers take turns from the insert to their commit
+    if db.engine.dialect.name == 'postgresql':
+        session.execute(text('SELECT pg_advisory_xact_lock(7436021)'))
+    session.info['events_published'] = True
+
+
+
+
+def publish(user_ids, kind, data):
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    serialize_commits(db.session)
+    payload = json.dumps(data, separators=(',', ':'))
+    db.session.execute(insert(Event), [{'user_id': user_id, 'kind': kind, 'data': payload,
+                                        'created_at': datetime.utcnow()} for user_id in user_ids])
+
+
+
+
+def publish_to_applicants(drive_id, kind, data):
+    # one INSERT ... SELECT, however many students applied
+    serialize_commits(db.session)
+    applicants = (select(StudentProfile.user_id, literal(kind), literal(json.dumps(data, separators=(',', ':'))),
+                         literal(datetime.utcnow()))
+                  .join(Application, Application.student_id == StudentProfile.id)
+                  .where(Application.drive_id == drive_id))
+    db.session.execute(insert(Event).from_select(['user_id', 'kind', 'data', 'created_at'], applicants))
+
+
+
+
+def publish_application_statuses(application_ids):
+    if not application_ids:
+        return
+    serialize_commits(db.session)
+    rows = db.session.execute(
+        select(Application.id, Application.drive_id, Application.status, StudentProfile.user_id, PlacementDrive.title)
+        .join(StudentProfile, StudentProfile.id == Application.student_id)
+        .join(PlacementDrive, PlacementDrive.id == Application.drive_id)
+        .where(Application.id.in_(sorted(application_ids)))
+    ).all()
+    now = datetime.utcnow()
+    db.session.execute(insert(Event), [{
+        'user_id': user_id,
+        'kind': 'application_status',
+        'data': json.dumps({'application_id': id, 'drive_id': drive_id, 'status': status,
+                            'message': f'Your application for "{title}" is now {status}.'}, separators=(',', ':')),
+        'created_at': now,
+    } for id, drive_id, status, user_id, title in rows])
+
+
+
+
+@event.listens_for(Session, 'after_commit')
+def announce(session):
+    if session.info.pop('events_published', None) and has_app_context():
+        touch(epoch_file())
+
+
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard(session, previous_transaction):
+    session.info.pop('events_published', None)
+
+
+
+
+def prune(conn, hours):
+    conn.execute(delete(Event).where(Event.created_at < datetime.utcnow() - timedelta(hours=hours)))
+
+
+
+
+class Broker:
+    def __init__(self, app):
+        self.app = app
+        self.path = epoch_file()
+        self.poll = app.config.get('EVENTS_POLL_MS', 250) / 1000
+        self.recheck = app.config.get('EVENTS_RECHECK_SECONDS', 5)
+        self.retention = app.config.get('EVENTS_RETENTION_HOURS', 48)
+        self.subscribers = {}
+        self.streams = 0
+        self.lock = threading.Lock()
+        self.last_id = db.session.scalar(select(func.max(Event.id))) or 0
+        self.thread = None
+    
+    
+    
+    
+    def subscribe(self, user_id, limit=0):
+        # None once `limit` streams are open in this process
+        inbox = queue.SimpleQueue()
+        with self.lock:
+            if limit and self.streams >= limit:
+                return None
+            self.streams += 1
+            self.subscribers.setdefault(user_id, set()).add(inbox)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True, name='event-broker')
+                self.thread.start()
+        return inbox
+    
+    
+    
+    
+    def unsubscribe(self, user_id, inbox):
+        with self.lock:
+            self.streams -= 1
+            inboxes = self.subscribers.get(user_id)
+            if inboxes is not None:
+                inboxes.discard(inbox)
+                if not inboxes:
+                    del self.subscribers[user_id]
+    
+    
+    
+    
+    def deliver(self, rows):
+        with self.lock:
+            for id, user_id, kind, data in rows:
+                for inbox in self.subscribers.get(user_id, ()):
+                    inbox.put((id, kind, data))
+    
+    
+    
+    
+    def run(self):
+        seen_epoch = current_epoch(self.path)
+        checked = pruned = time.monotonic()
+        while True:
+            time.sleep(self.poll)
+            epoch = current_epoch(self.path)
+            # the epoch is the fast path; the periodic recheck picks up a commit whose touch was lost
+            if epoch == seen_epoch and time.monotonic() - checked < self.recheck:
+                continue
+            seen_epoch, checked = epoch, time.monotonic()
+            try:
+                with self.app.app_context():
+                    with db.engine.connect() as conn:
+                        while True:
+                            rows = conn.execute(select(Event.id, Event.user_id, Event.kind, Event.data)
+                                                .where(Event.id > self.last_id)
+                                                .order_by(Event.id).limit(1000)).all()
+                            if rows:
+                                self.last_id = rows[-1][0]
+                                self.deliver(rows)
+                            if len(rows) < 1000:
+                                break
+                    if self.retention and time.monotonic() - pruned > 3600:
+                        pruned = time.monotonic()
+                        with db.engine.begin() as conn:
+                            prune(conn, self.retention)
+            except Exception:
+                self.app.logger.exception('Reading live update events failed')
+
+
+
+
+def broker():
+    global _broker
+    with _lock:
+        if _broker is None:
+            _broker = Broker(current_app._get_current_object())
+        return _broker
+
+
+
+
+def message(id, kind, data):
+    return f'id: {id}\nevent: {kind}\ndata: {data}\n\n'
+
+
+
+
+@login_required
+def stream():
+    config = current_app.config
+    user_id = current_user.id
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    keepalive = config.get('EVENTS_KEEPALIVE_SECONDS', 15)
+    lifetime = config.get('EVENTS_STREAM_SECONDS', 600)
+    retry = config.get('EVENTS_RETRY_MS', 3000)
+    hub = broker()
+    # subscribed before reading the backlog, so nothing committed in between is missed; ids already sent are
+    # skipped when they also arrive through the inbox. A stream with no lifetime, or over EVENTS_MAX_STREAMS,
+    # only replays the backlog and the browser comes back after `retry`.
+    inbox = hub.subscribe(user_id, config.get('EVENTS_MAX_STREAMS', 0)) if lifetime else None
+    if lifetime and inbox is None:
+        # turned away for want of a free thread: come back much later rather than polling every few seconds
+        retry = config.get('EVENTS_BUSY_RETRY_MS', 60000)
+    backlog, cursor = [], None
+    if last_event_id is not None and last_event_id.isdigit():
+        backlog = db.session.execute(select(Event.id, Event.kind, Event.data)
+                                     .where(Event.user_id == user_id, Event.id > int(last_event_id))
+                                     .order_by(Event.id).limit(config.get('EVENTS_REPLAY_LIMIT', 500))).all()
+    elif inbox is None:
+        # a bare id line moves the browser's Last-Event-ID, so its reconnect replays whatever commits meanwhile
+        cursor = db.session.scalar(select(func.max(Event.id))) or 0
+
+    def generate():
+        # runs after the request context is gone, so it never holds a database connection while idle
+        sent = 0
+        try:
+            yield f'retry: {retry}\n\n'
+            if cursor is not None:
+                yield f'id: {cursor}\n\n'
+            for id, kind, data in backlog:
+                sent = id
+                yield message(id, kind, data)
+            if inbox is None:
+                return
+            closes = time.monotonic() + lifetime
+            while time.monotonic() < closes:
+                try:
+                    id, kind, data = inbox.get(timeout=min(keepalive, max(0.0, closes - time.monotonic())))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if id > sent:
+                    sent = id
+                    yield message(id, kind, data)
+        finally:
+            if inbox is not None:
+                hub.unsubscribe(user_id, inbox)
+
+    return current_app.response_class(generate(), mimetype='text/event-stream',
+                                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+
+
+def init_app(app):
+    app.add_url_rule('/events', 'events', stream)
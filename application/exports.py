@@ -0,0 +1,213 @@
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import select, union_all
+from xml.sax.saxutils import escape
+from datetime import datetime
+import csv
+import re
+import zipfile
+from . import db
+from .models import (User, CompanyProfile, StudentProfile, PlacementDrive, Application, ArchivedDrive,
+                     ArchivedApplication)
+
+
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# spreadsheet apps evaluate a cell that starts with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+APPLICANT_COLUMNS = [
+    ('Student Name', StudentProfile.name),
+    ('Student ID', StudentProfile.student_id),
+    ('Email', User.email),
+    ('Contact', StudentProfile.contact),
+    ('Applied Date', Application.applied_date),
+    ('Status', Application.status),
+]
+
+
+
+
+def drive_applicants(drive_id):
+    return (APPLICANT_COLUMNS,
+            select(*[column for name, column in APPLICANT_COLUMNS])
+            .select_from(Application)
+            .join(StudentProfile, Application.student_id == StudentProfile.id)
+            .join(User, StudentProfile.user_id == User.id)
+            .where(Application.drive_id == drive_id)
+            .order_by(Application.drive_id, Application.applied_date, Application.id))
+
+
+
+
+def company_applications(company_id):
+    columns = [('Drive', PlacementDrive.title)] + APPLICANT_COLUMNS
+    return (columns,
+            select(*[column for name, column in columns])
+            .select_from(PlacementDrive)
+            .join(Application, Application.drive_id == PlacementDrive.id)
+            .join(StudentProfile, Application.student_id == StudentProfile.id)
+            .join(User, StudentProfile.user_id == User.id)
+            .where(PlacementDrive.company_id == company_id)
+            .order_by(PlacementDrive.id, Application.applied_date, Application.id))
+
+
+
+
+def outcome_columns(drive, application):
+    return [('Company', CompanyProfile.name), ('Drive', drive.title), ('Drive Status', drive.status),
+            ('Student Name', StudentProfile.name), ('Student ID', StudentProfile.student_id), ('Email', User.email),
+            ('Contact', StudentProfile.contact), ('Applied Date', application.applied_date),
+            ('Status', application.status)]
+
+
+
+
+def placement_outcomes():
+    # the current season followed by the archived ones
+    selects = [select(*[column for name, column in outcome_columns(drive, application)])
+               .select_from(application)
+               .join(drive, application.drive_id == drive.id)
+               .join(CompanyProfile, drive.company_id == CompanyProfile.id)
+               .join(StudentProfile, application.student_id == StudentProfile.id)
+               .join(User, StudentProfile.user_id == User.id)
+               for drive, application in ((PlacementDrive, Application), (ArchivedDrive, ArchivedApplication))]
+    return outcome_columns(PlacementDrive, Application), union_all(*selects)
+
+
+
+
+def stream_rows(statement, batch_size):
+    # yield_per streams from the cursor with fixed-size fetchmany() calls instead of buffering the result
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        yield batch
+
+
+
+
+def cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    return str(value)
+
+
+
+
+class _Lines:
+    def write(self, line):
+        return line
+
+
+
+
+class _Buffer:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+
+
+def csv_value(value):
+    value = cell(value)
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+
+
+def csv_chunks(header, batches):
+    writer = csv.writer(_Lines())
+    yield ('\ufeff' + writer.writerow(header)).encode('utf-8')
+    for batch in batches:
+        yield ''.join(writer.writerow(map(csv_value, row)) for row in batch).encode('utf-8')
+
+
+
+
+def xlsx_row(values):
+    cells = ''.join(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(XML_INVALID.sub("", value))}</t></is></c>'
+                    for value in values)
+    return f'<row>{cells}</row>'.encode('utf-8')
+
+
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+
+
+
+def xlsx_chunks(header, batches):
+    # the zip is written to an unseekable buffer, so entries use data descriptors and each batch of
+    # rows can be sent as soon as it is compressed
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(xlsx_row(header))
+            for batch in batches:
+                sheet.write(b''.join(xlsx_row(map(cell, row)) for row in batch))
+                yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+
+
+def export_response(export, format, filename):
+    columns, statement = export
+    header = [name for name, column in columns]
+    batches = stream_rows(statement, current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+    chunks = csv_chunks(header, batches) if format == 'csv' else xlsx_chunks(header, batches)
+    return Response(stream_with_context(chunks), mimetype=FORMATS[format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{format}'})
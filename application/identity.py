@@ -0,0 +1,114 @@
+from flask import current_app, g
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+import os
+import threading
+import time
+from . import db, login_manager
+from .models import User
+
+
+
+
+_cache = {}
+_lock = threading.Lock()
+_seen_epoch = None
+
+
+
+
+def epoch_file():
+    return current_app.config.get('IDENTITY_EPOCH_FILE') or os.path.join(current_app.instance_path, 'identity.epoch')
+
+
+
+
+def current_epoch():
+    try:
+        return os.stat(epoch_file()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(user_id, None)
+    path = epoch_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(str(time.time_ns()))
+
+
+
+
+def detached_copy(instance, **relationships):
+    mapper = db.inspect(instance).mapper
+    copy = mapper.class_()
+    for column in mapper.column_attrs:
+        setattr(copy, column.key, getattr(instance, column.key))
+    for key, value in relationships.items():
+        setattr(copy, key, value)
+    return copy
+
+
+
+
+def snapshot(user):
+    company = student = None
+    copy = detached_copy(user, company_profile=None, student_profile=None)
+    if user.company_profile is not None:
+        company = detached_copy(user.company_profile)
+        copy.company_profile = company
+    if user.student_profile is not None:
+        student = detached_copy(user.student_profile)
+        copy.student_profile = student
+    for instance in (copy, company, student):
+        if instance is not None:
+            make_transient_to_detached(instance)
+    return copy
+
+
+
+
+def fetch_user(user_id):
+    return (User.query.options(joinedload(User.company_profile), joinedload(User.student_profile))
+            .filter(User.id == user_id)
+            .one_or_none())
+
+
+
+
+def cached_user(user_id):
+    global _seen_epoch
+    ttl = current_app.config.get('IDENTITY_CACHE_TTL', 30)
+    if not ttl:
+        return fetch_user(user_id)
+
+    epoch = current_epoch()
+    now = time.monotonic()
+    with _lock:
+        if epoch != _seen_epoch:
+            _cache.clear()
+            _seen_epoch = epoch
+        entry = _cache.get(user_id)
+    if entry and entry[0] > now:
+        return db.session.merge(entry[1], load=False)
+
+    user = fetch_user(user_id)
+    if user is not None:
+        with _lock:
+            if len(_cache) >= current_app.config.get('IDENTITY_CACHE_SIZE', 10000):
+                _cache.clear()
+            _cache[user_id] = (now + ttl, snapshot(user))
+    return user
+
+
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    if 'identity' not in g:
+        user = cached_user(int(user_id))
+        g.identity = user if user is not None and user.is_active else None
+    return g.identity
@@ -0,0 +1,177 @@
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+import click
+import csv
+import re
+from . import db, counters, eligibility, search
+from .models import User, StudentProfile
+from .passwords import hash_many
+
+
+
+
+REQUIRED_COLUMNS = ['email', 'password', 'name', 'student_id']
+ACADEMIC_COLUMNS = ['branch', 'graduation_year', 'cgpa', 'backlogs']
+OPTIONAL_COLUMNS = ['contact', 'resume_bio'] + ACADEMIC_COLUMNS
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def fail(self, line, row, message):
+        self.errors.append((line, row.get('email', ''), message))
+
+
+
+
+def parse_academics(row):
+    # raises ValueError for a number that does not parse
+    return {'branch': row['branch'] or None,
+            'graduation_year': int(row['graduation_year']) if row['graduation_year'] else None,
+            'cgpa': float(row['cgpa']) if row['cgpa'] else None,
+            'backlogs': int(row['backlogs']) if row['backlogs'] else 0}
+
+
+
+
+def validate(row, seen_emails, seen_student_ids):
+    for column in REQUIRED_COLUMNS:
+        if not row[column]:
+            return f'Missing {column}.'
+    if not EMAIL_PATTERN.match(row['email']):
+        return 'Invalid email address.'
+    if len(row['email']) > 120 or len(row['name']) > 100 or len(row['student_id']) > 50 \
+            or len(row['contact']) > 20:
+        return 'Value too long.'
+    try:
+        error = eligibility.check_academics(**parse_academics(row))
+    except ValueError:
+        error = 'Graduation year, CGPA and backlogs must be numbers.'
+    if error:
+        return error
+    if row['email'] in seen_emails:
+        return 'Duplicate email in file.'
+    if row['student_id'] in seen_student_ids:
+        return 'Duplicate student ID in file.'
+    return None
+
+
+
+
+def existing_values(column, values):
+    return set(db.session.scalars(select(column).where(column.in_(values))))
+
+
+
+
+def insert_chunk(chunk, report, hash_method=None, retry=True):
+    taken_emails = existing_values(User.email, [row['email'] for line, row in chunk])
+    taken_student_ids = existing_values(StudentProfile.student_id, [row['student_id'] for line, row in chunk])
+
+    accepted = []
+    for line, row in chunk:
+        if row['email'] in taken_emails:
+            report.fail(line, row, 'Email already registered.')
+        elif row['student_id'] in taken_student_ids:
+            report.fail(line, row, 'Student ID already registered.')
+        else:
+            accepted.append((line, row))
+    if not accepted:
+        return
+
+    hashes = hash_many([row['password'] for line, row in accepted], hash_method)
+    try:
+        users = db.session.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{'email': row['email'], 'password_hash': password_hash, 'role': 'student'}
+             for (line, row), password_hash in zip(accepted, hashes)]
+        ).scalars().all()
+        profiles = [{
+            'user_id': user_id,
+            'name': row['name'],
+            'student_id': row['student_id'],
+            'contact': row['contact'] or None,
+            'resume_bio': row['resume_bio'] or None,
+            **parse_academics(row),
+        } for (line, row), user_id in zip(accepted, users)]
+        profile_ids = db.session.execute(
+            insert(StudentProfile).returning(StudentProfile.id, sort_by_parameter_order=True), profiles
+        ).scalars().all()
+
+        conn = db.session.connection()
+        search.index_documents(conn, StudentProfile,
+                               [dict(profile, id=profile_id) for profile, profile_id in zip(profiles, profile_ids)])
+        counters.increment(conn, 'students', len(profile_ids))
+        db.session.commit()
+    except IntegrityError:
+        # another registration won the race for one of these rows; re-check and insert the rest
+        db.session.rollback()
+        if not retry:
+            raise
+        insert_chunk(accepted, report, hash_method, retry=False)
+        return
+    report.created += len(accepted)
+
+
+
+
+def import_students(stream, chunk_size=1000, hash_method=None):
+    reader = csv.DictReader(stream)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportFormatError(f'Missing column(s): {", ".join(missing)}')
+
+    report = ImportReport()
+    seen_emails, seen_student_ids = set(), set()
+    chunk = []
+    for row in reader:
+        line = reader.line_num
+        row = {column: (row.get(column) or '').strip() for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+        error = validate(row, seen_emails, seen_student_ids)
+        if error:
+            report.fail(line, row, error)
+            continue
+        seen_emails.add(row['email'])
+        seen_student_ids.add(row['student_id'])
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            insert_chunk(chunk, report, hash_method)
+            chunk = []
+    if chunk:
+        insert_chunk(chunk, report, hash_method)
+    return report
+
+
+
+
+def init_app(app):
+    @app.cli.command('import-students')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--chunk-size', default=1000, show_default=True)
+    @click.option('--hash-method', default=None,
+                  help='Password hash method for imported accounts (default IMPORT_PASSWORD_HASH_METHOD).')
+    @click.option('--report', type=click.File('w'), help='Write rejected rows to this CSV file.')
+    def import_students_command(csv_file, chunk_size, hash_method, report):
+        try:
+            result = import_students(csv_file, chunk_size, hash_method)
+        except ImportFormatError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Created {result.created} student(s), rejected {len(result.errors)} row(s).')
+        if report:
+            writer = csv.writer(report)
+            writer.writerow(['line', 'email', 'error'])
+            writer.writerows(result.errors)
+        else:
+            for line, email, message in result.errors[:20]:
+                click.echo(f'  line {line} ({email}): {message}')
@@ -0,0 +1,225 @@
+from flask import current_app
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import click
+import json
+import multiprocessing
+import threading
+import time
+from . import db
+from .models import Job
+
+
+
+
+# Jobs are rows in the `jobs` table. enqueue() adds them to the request's own session, so a job exists exactly
+# when the change that caused it was committed, and a worker that dies mid-job leaves it 'running' until
+# JOB_LOCK_TIMEOUT_SECONDS puts it back in the queue. Handlers can therefore run more than once and are written
+# to be idempotent.
+
+HANDLERS = {}
+
+_wake = threading.Event()
+_last_maintenance = 0.0
+
+
+
+
+def job(name):
+    def decorator(f):
+        HANDLERS[name] = f
+        return f
+    return decorator
+
+
+
+
+def enqueue(name, delay=0, **payload):
+    db.session.add(Job(name=name, payload=json.dumps(payload),
+                       run_at=datetime.utcnow() + timedelta(seconds=delay)))
+    db.session.info['jobs_enqueued'] = True
+
+
+
+
+def enqueue_many(name, payloads):
+    if not payloads:
+        return
+    now = datetime.utcnow()
+    db.session.execute(insert(Job), [{'name': name, 'payload': json.dumps(payload), 'status': 'queued',
+                                      'attempts': 0, 'max_attempts': 5, 'run_at': now, 'created_at': now}
+                                     for payload in payloads])
+    db.session.info['jobs_enqueued'] = True
+
+
+
+
+@event.listens_for(Session, 'after_commit')
+def wake_workers(session):
+    if session.info.pop('jobs_enqueued', None):
+        _wake.set()
+
+
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_wakeup(session, previous_transaction):
+    session.info.pop('jobs_enqueued', None)
+
+
+
+
+def claim(conn):
+    # one statement picks and locks the next due job, so two workers never run the same one
+    now = datetime.utcnow()
+    due = (select(Job.id)
+           .where(Job.status == 'queued', Job.run_at <= now)
+           .order_by(Job.run_at, Job.id)
+           .limit(1))
+    if conn.dialect.name == 'postgresql':
+        due = due.with_for_update(skip_locked=True)
+    return conn.execute(update(Job)
+                        .where(Job.id == due.scalar_subquery(), Job.status == 'queued')
+                        .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+                        .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)).first()
+
+
+
+
+def finish(conn, claimed, error=None):
+    if error is None:
+        values = {'status': 'done', 'locked_at': None, 'last_error': None}
+    elif claimed.attempts >= claimed.max_attempts:
+        values = {'status': 'failed', 'locked_at': None, 'last_error': error}
+        # nothing retries it from here; the admin dashboard lists it until someone does
+        current_app.logger.error('Job %s (%s) gave up after %s attempts: %s', claimed.id, claimed.name,
+                                 claimed.attempts, error)
+    else:
+        backoff = current_app.config.get('JOB_RETRY_BASE_SECONDS', 30) * 2 ** (claimed.attempts - 1)
+        values = {'status': 'queued', 'locked_at': None, 'last_error': error,
+                  'run_at': datetime.utcnow() + timedelta(seconds=backoff)}
+    conn.execute(update(Job).where(Job.id == claimed.id, Job.status == 'running').values(**values))
+
+
+
+
+def failed(limit=20):
+    return Job.query.filter_by(status='failed').order_by(Job.run_at.desc()).limit(limit).all()
+
+
+
+
+def retry(job):
+    job.status = 'queued'
+    job.attempts = 0
+    job.locked_at = None
+    job.run_at = datetime.utcnow()
+    db.session.info['jobs_enqueued'] = True
+
+
+
+
+def run_next():
+    with db.engine.begin() as conn:
+        claimed = claim(conn)
+    if claimed is None:
+        return False
+
+    error = None
+    try:
+        handler = HANDLERS[claimed.name]
+        handler(**json.loads(claimed.payload))
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Job %s (%s) failed on attempt %s', claimed.id, claimed.name, claimed.attempts)
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        db.session.remove()
+
+    with db.engine.begin() as conn:
+        finish(conn, claimed, error)
+    return True
+
+
+
+
+def run_pending(limit=None):
+    ran = 0
+    while (limit is None or ran < limit) and run_next():
+        ran += 1
+    return ran
+
+
+
+
+def maintain(conn):
+    now = datetime.utcnow()
+    timeout = current_app.config.get('JOB_LOCK_TIMEOUT_SECONDS', 600)
+    requeued = conn.execute(update(Job)
+                            .where(Job.status == 'running', Job.locked_at < now - timedelta(seconds=timeout))
+                            .values(status='queued', locked_at=None, run_at=now)).rowcount
+    retention = current_app.config.get('JOB_RETENTION_DAYS', 7)
+    conn.execute(delete(Job).where(Job.status == 'done', Job.run_at < now - timedelta(days=retention)))
+    return requeued
+
+
+
+
+def work(app, poll):
+    global _last_maintenance
+    with app.app_context():
+        while True:
+            try:
+                if time.monotonic() - _last_maintenance > 60:
+                    _last_maintenance = time.monotonic()
+                    with db.engine.begin() as conn:
+                        requeued = maintain(conn)
+                    if requeued:
+                        app.logger.warning('Requeued %s job(s) whose worker stopped responding', requeued)
+                if run_next():
+                    continue
+            except Exception:
+                app.logger.exception('Job worker failed')
+            _wake.wait(poll)
+            _wake.clear()
+
+
+
+
+def start_workers(app, count):
+    poll = app.config.get('JOB_POLL_SECONDS', 5)
+    threads = [threading.Thread(target=work, args=(app, poll), daemon=True, name=f'job-worker-{n}')
+               for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+
+
+def init_app(app):
+    from . import tasks
+
+    workers = app.config.get('JOB_WORKERS', 2)
+    if workers and not app.testing and multiprocessing.parent_process() is None:
+        started = []
+        lock = threading.Lock()
+
+        # started by the first request rather than here, so CLI commands and forking servers do not carry them
+        @app.before_request
+        def start_workers_once():
+            if not started:
+                with lock:
+                    if not started:
+                        started.extend(start_workers(app, workers))
+
+    @app.cli.command('run-jobs')
+    @click.option('--workers', default=2, show_default=True, help='Worker threads to run.')
+    @click.option('--once', is_flag=True, help='Run the jobs that are due now and exit.')
+    def run_jobs_command(workers, once):
+        if once:
+            click.echo(f'{run_pending()} job(s) run')
+            return
+        for thread in start_workers(app, workers):
+            thread.join()
@@ -0,0 +1,51 @@
+from flask import current_app
+from email.message import EmailMessage
+from datetime import datetime
+import json
+import os
+import smtplib
+import threading
+
+
+
+
+# MAIL_BACKEND 'memory' keeps messages in `outbox` for tests, 'file' appends them as JSON lines to
+# MAIL_SINK_FILE so they can be read during local development, and 'smtp' delivers them
+outbox = []
+_lock = threading.Lock()
+
+
+
+
+def sink_file():
+    return current_app.config.get('MAIL_SINK_FILE') or os.path.join(current_app.instance_path, 'mail_sink.jsonl')
+
+
+
+
+def send(to, subject, body):
+    backend = current_app.config.get('MAIL_BACKEND') or ('memory' if current_app.testing else 'file')
+    message = {'to': to, 'subject': subject, 'body': body, 'sent_at': datetime.utcnow().isoformat()}
+
+    if backend == 'memory':
+        outbox.append(message)
+    elif backend == 'file':
+        path = sink_file()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(message) + '\n')
+    elif backend == 'smtp':
+        email = EmailMessage()
+        email['From'] = current_app.config.get('MAIL_DEFAULT_SENDER', 'placements@localhost')
+        email['To'] = to
+        email['Subject'] = subject
+        email.set_content(body)
+        config = current_app.config
+        with smtplib.SMTP(config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25), timeout=30) as smtp:
+            if config.get('MAIL_USE_TLS'):
+                smtp.starttls()
+            if config.get('MAIL_USERNAME'):
+                smtp.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD', ''))
+            smtp.send_message(email)
+    else:
+        raise ValueError(f'unknown MAIL_BACKEND {backend!r}')
@@ -0,0 +1,369 @@
+from flask import abort, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+import atexit
+import glob
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from . import db
+
+
+
+
+# Each worker keeps its own totals and writes them to METRICS_DIR every METRICS_FLUSH_SECONDS; /metrics adds
+# up every worker's file, so Prometheus sees one set of series however many gunicorn workers there are. A
+# worker answering /metrics takes over the files of exited workers on its host, so totals never go backwards
+# and the directory holds one file per live worker.
+METRICS = {
+    'portal_requests_total': ('counter', 'Requests served, by endpoint, method and status.'),
+    'portal_request_duration_seconds': ('histogram', 'Time from the start of a request until its response closed.'),
+    'portal_request_db_statements_total': ('counter', 'SQL statements executed while serving requests.'),
+    'portal_request_db_seconds_total': ('counter', 'Time spent executing SQL while serving requests.'),
+    'portal_request_template_seconds_total': ('counter', 'Time spent rendering templates.'),
+    'portal_slow_queries_total': ('counter', 'SQL statements slower than METRICS_SLOW_QUERY_MS.'),
+}
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+_worker = None
+
+
+
+
+def inc(name, labels, value=1):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+
+
+def observe(name, labels, value, buckets):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+
+
+def snapshot():
+    with _lock:
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, labels, list(counts), total, count]
+                           for (name, labels), (counts, total, count) in _histograms.items()],
+        }
+
+
+
+
+def absorb(data):
+    with _lock:
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            _counters[key] = _counters.get(key, 0) + value
+        for name, labels, counts, total, count in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            histogram = _histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+            histogram[1] += total
+            histogram[2] += count
+
+
+
+
+def worker_file(directory):
+    # a new process gets a new file even if it reuses a dead worker's pid, so no worker's totals are overwritten.
+    # The host name keeps containers sharing METRICS_DIR from judging each other's pids.
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():
+        name = f'worker-{socket.gethostname()}-{os.getpid()}-{time.time_ns()}.json'
+        _worker = (os.getpid(), os.path.join(directory, name))
+    return _worker[1]
+
+
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+
+
+def adopt_exited_workers(directory):
+    host = socket.gethostname()
+    for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+        parts = os.path.basename(path)[len('worker-'):-len('.json')].rsplit('-', 2)
+        if len(parts) != 3 or parts[0] != host or not parts[1].isdigit() or is_running(int(parts[1])):
+            continue
+        # the rename lets exactly one worker take the file over
+        adopted = path + '.adopted'
+        try:
+            os.rename(path, adopted)
+            with open(adopted) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        absorb(data)
+        write(directory)
+        os.remove(adopted)
+
+
+
+
+def write(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = worker_file(directory)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+
+
+def collect(directory):
+    adopt_exited_workers(directory)
+    own = worker_file(directory)
+    snapshots = [snapshot()]
+    for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+        if path != own:
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    counters, histograms = {}, {}
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+
+
+def label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for key, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+
+
+def number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+
+
+def exposition(counters, histograms, buckets):
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    lines.append(f'{name}{label_text(labels)} {number(value)}')
+        else:
+            for (series, labels), (counts, total, count) in sorted(histograms.items()):
+                if series != name:
+                    continue
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f'{name}_bucket{label_text(labels, [("le", f"{bound:g}")])} {bucket_count}')
+                lines.append(f'{name}_bucket{label_text(labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{label_text(labels)} {number(total)}')
+                lines.append(f'{name}_count{label_text(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+
+
+def folded(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+
+
+# One thread samples the stacks of every thread that is serving a request; stacks are kept in the folded format
+# read by flamegraph.pl and speedscope
+class Sampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    
+    
+    
+    def start(self, ident):
+        with self.lock:
+            self.active[ident] = {}
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True, name='request-profiler')
+                self.thread.start()
+    
+    
+    
+    
+    def stop(self, ident):
+        with self.lock:
+            return self.active.pop(ident, None) or {}
+    
+    
+    
+    
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, stacks in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stack = folded(frame)
+                        stacks[stack] = stacks.get(stack, 0) + 1
+
+
+
+
+def dump_profile(directory, endpoint, elapsed, stacks):
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{round(elapsed * 1000)}ms.folded'
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+
+
+def init_app(app):
+    config = app.config
+    enabled = config.get('METRICS_ENABLED', False)
+    profile_ms = config.get('PROFILE_SLOW_REQUEST_MS', 0)
+    if not enabled and not profile_ms:
+        return
+
+    directory = config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+    profile_directory = config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+    buckets = tuple(config.get('METRICS_BUCKETS', DEFAULT_BUCKETS))
+    flush_seconds = config.get('METRICS_FLUSH_SECONDS', 10)
+    slow_query = config.get('METRICS_SLOW_QUERY_MS', 200) / 1000
+    sampler = Sampler(config.get('PROFILE_INTERVAL_MS', 5) / 1000) if profile_ms else None
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        if has_request_context() and 'metrics' in g:
+            g.metrics['statements'] += 1
+            g.metrics['db'] += elapsed
+        if slow_query and elapsed >= slow_query:
+            inc('portal_slow_queries_total', {})
+            app.logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, ' '.join(statement.split()))
+
+    def template_started(sender, template, context, **extra):
+        if 'metrics' in g:
+            g.metrics['template_started'].append(time.perf_counter())
+
+    def template_finished(sender, template, context, **extra):
+        if 'metrics' in g and g.metrics['template_started']:
+            g.metrics['template'] += time.perf_counter() - g.metrics['template_started'].pop()
+
+    if enabled:
+        with app.app_context():
+            # the replica bind too, so routed reads are counted
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        before_render_template.connect(template_started, app, weak=False)
+        template_rendered.connect(template_finished, app, weak=False)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics = {'started': time.perf_counter(), 'statements': 0, 'db': 0.0, 'template': 0.0,
+                     'template_started': []}
+        if sampler is not None:
+            sampler.start(threading.get_ident())
+
+    @app.after_request
+    def finish_request_metrics(response):
+        stats = g.get('metrics')
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        ident = threading.get_ident()
+
+        # observed when the response is closed, so streamed exports are timed to their last byte
+        def record():
+            global _last_flush
+            elapsed = time.perf_counter() - stats['started']
+            if enabled:
+                labels = {'endpoint': endpoint, 'method': method}
+                inc('portal_requests_total', dict(labels, status=str(response.status_code)))
+                observe('portal_request_duration_seconds', labels, elapsed, buckets)
+                inc('portal_request_db_statements_total', labels, stats['statements'])
+                inc('portal_request_db_seconds_total', labels, stats['db'])
+                inc('portal_request_template_seconds_total', labels, stats['template'])
+                if time.monotonic() - _last_flush > flush_seconds:
+                    _last_flush = time.monotonic()
+                    write(directory)
+            if sampler is not None:
+                stacks = sampler.stop(ident)
+                if stacks and elapsed * 1000 >= profile_ms:
+                    path = dump_profile(profile_directory, endpoint, elapsed, stacks)
+                    app.logger.info('Profiled slow request to %s (%.0f ms): %s', endpoint, elapsed * 1000, path)
+
+        response.call_on_close(record)
+        return response
+
+    if not enabled:
+        return
+
+    atexit.register(write, directory)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        token = config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(403)
+        counters, histograms = collect(directory)
+        return app.response_class(exposition(counters, histograms, buckets),
+                                  mimetype='text/plain; version=0.0.4')
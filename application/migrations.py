@@ -0,0 +1,212 @@
+from sqlalchemy import inspect, text
+import click
+from . import db
+
+
+
+
+MIGRATIONS = []
+
+
+
+
+def migration(version, description):
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        return f
+    return decorator
+
+
+
+
+def current_version(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    version = conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar()
+    return version or 0
+
+
+
+
+def create_index(conn, table, name):
+    index = next(i for i in db.metadata.tables[table].indexes if i.name == name)
+    index.create(conn, checkfirst=True)
+
+
+
+
+def add_column(conn, table, name, server_default=None):
+    existing = {column['name'] for column in inspect(conn).get_columns(table)}
+    if name in existing:
+        return
+    column = db.metadata.tables[table].c[name]
+    ddl = f'ALTER TABLE {table} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}'
+    if server_default is not None:
+        ddl += f' DEFAULT {server_default}'
+    conn.execute(text(ddl))
+
+
+
+
+def upgrade():
+    applied = []
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+        db.metadata.create_all(conn)
+        for number, description, f in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if number <= version:
+                continue
+            f(conn)
+            conn.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': number})
+            applied.append((number, description))
+    return applied
+
+
+
+
+@migration(1, 'indexes for status, approval and foreign key lookups')
+def add_lookup_indexes(conn):
+    create_index(conn, 'company_profiles', 'ix_company_profiles_user_id')
+    create_index(conn, 'company_profiles', 'ix_company_profiles_approval_status')
+    create_index(conn, 'student_profiles', 'ix_student_profiles_user_id')
+    create_index(conn, 'placement_drives', 'ix_placement_drives_status_deadline')
+    create_index(conn, 'placement_drives', 'ix_placement_drives_company_id')
+    create_index(conn, 'applications', 'ix_applications_drive_id_status')
+    create_index(conn, 'applications', 'ix_applications_student_id_applied_date')
+
+
+
+
+@migration(2, 'indexes for keyset pagination sort keys')
+def add_pagination_indexes(conn):
+    create_index(conn, 'placement_drives', 'ix_placement_drives_created_at')
+    create_index(conn, 'applications', 'ix_applications_drive_id_applied_date')
+
+
+
+
+@migration(3, 'full-text search indexes for students, companies and drives')
+def add_search_indexes(conn):
+    from . import search
+    if search.supported(conn):
+        search.create_indexes(conn)
+        search.rebuild(conn)
+
+
+
+
+@migration(4, 'dashboard counters')
+def add_counters(conn):
+    from . import counters
+    counters.reconcile(conn)
+
+
+
+
+@migration(5, 'optional applicant cap per drive')
+def add_drive_applicant_cap(conn):
+    add_column(conn, 'placement_drives', 'max_applicants')
+
+
+
+
+@migration(6, 'per-student version for conditional GET')
+def add_student_version(conn):
+    add_column(conn, 'student_profiles', 'version', server_default=0)
+
+
+
+
+@migration(7, 'background job queue')
+def add_jobs(conn):
+    create_index(conn, 'jobs', 'ix_jobs_status_run_at')
+
+
+
+
+@migration(8, 'close approved drives whose deadline has passed')
+def close_expired_drives(conn):
+    from . import sweeper
+    sweeper.close_expired(conn)
+
+
+
+
+@migration(9, 'structured eligibility for students and drives')
+def add_eligibility(conn):
+    add_column(conn, 'student_profiles', 'branch')
+    add_column(conn, 'student_profiles', 'graduation_year')
+    add_column(conn, 'student_profiles', 'cgpa')
+    add_column(conn, 'student_profiles', 'backlogs', server_default=0)
+    add_column(conn, 'placement_drives', 'eligible_branches')
+    add_column(conn, 'placement_drives', 'graduation_year')
+    add_column(conn, 'placement_drives', 'min_cgpa')
+    add_column(conn, 'placement_drives', 'max_backlogs')
+    create_index(conn, 'student_profiles', 'ix_student_profiles_branch')
+    create_index(conn, 'student_profiles', 'ix_student_profiles_graduation_year')
+    create_index(conn, 'student_profiles', 'ix_student_profiles_cgpa')
+    create_index(conn, 'student_profiles', 'ix_student_profiles_backlogs')
+
+
+
+
+@migration(10, 'API tokens')
+def add_api_tokens(conn):
+    create_index(conn, 'api_tokens', 'ix_api_tokens_user_id')
+
+
+
+
+@migration(11, 'full-text search indexes on PostgreSQL')
+def add_postgresql_search_indexes(conn):
+    from . import search
+    if search.postgresql(conn):
+        search.create_indexes(conn)
+
+
+
+
+@migration(12, 'live update events')
+def add_events(conn):
+    create_index(conn, 'events', 'ix_events_user_id_id')
+    create_index(conn, 'events', 'ix_events_created_at')
+
+
+
+
+@migration(13, 'placement analytics rollups')
+def add_analytics(conn):
+    from . import analytics
+    add_column(conn, 'applications', 'decided_at')
+    create_index(conn, 'drive_stats', 'ix_drive_stats_company_id')
+    create_index(conn, 'drive_stats', 'ix_drive_stats_applications')
+    create_index(conn, 'student_stats', 'ix_student_stats_selected')
+    analytics.rebuild(conn)
+
+
+
+
+@migration(14, 'season archive')
+def add_archive(conn):
+    create_index(conn, 'archived_drives', 'ix_archived_drives_company_id')
+    create_index(conn, 'archived_applications', 'ix_archived_applications_student_id_applied_date')
+    create_index(conn, 'archived_applications', 'ix_archived_applications_drive_id')
+
+
+
+
+@migration(15, 'audit log')
+def add_audit_log(conn):
+    create_index(conn, 'audit_log', 'ix_audit_log_student_id_id')
+    create_index(conn, 'audit_log', 'ix_audit_log_drive_id_id')
+
+
+
+
+def init_app(app):
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        applied = upgrade()
+        for number, description in applied:
+            click.echo(f'Applied migration {number}: {description}')
+        if not applied:
+            click.echo('Database schema is up to date.')
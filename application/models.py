@@ -1,18 +1,11 @@
-from . import db, login_manager
+from . import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import hash_password, verify_password, needs_rehash
 from datetime import datetime
 
 
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-
-
-
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
     
@@ -25,15 +18,23 @@ class User(db.Model, UserMixin):
     
     company_profile = db.relationship('CompanyProfile', backref='user', uselist=False, cascade='all, delete-orphan')
     student_profile = db.relationship('StudentProfile', backref='user', uselist=False, cascade='all, delete-orphan')
+    api_tokens = db.relationship('ApiToken', backref='user', cascade='all, delete-orphan')
+    events = db.relationship('Event', cascade='all, delete-orphan', passive_deletes=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     
     
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    
+    
+    
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
 
 
 
@@ -46,9 +47,17 @@ class CompanyProfile(db.Model):
     name = db.Column(db.String(200), nullable=False)
     hr_contact = db.Column(db.String(100), nullable=False)
     website = db.Column(db.String(200))
-    approval_status = db.Column(db.String(20), default='pending')
+    # active_history loads the old value on assignment, so counters.count_update sees the transition
+    approval_status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
+    search_rank = db.query_expression()
     
     placement_drives = db.relationship('PlacementDrive', backref='company', cascade='all, delete-orphan')
+    archived_drives = db.relationship('ArchivedDrive', backref='company', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_company_profiles_user_id', 'user_id'),
+        db.Index('ix_company_profiles_approval_status', 'approval_status'),
+    )
 
 
 
@@ -62,8 +71,23 @@ class StudentProfile(db.Model):
     student_id = db.Column(db.String(50), unique=True, nullable=False)
     contact = db.Column(db.String(20))
     resume_bio = db.Column(db.Text)
+    branch = db.Column(db.String(50))
+    graduation_year = db.Column(db.Integer)
+    cgpa = db.Column(db.Float)
+    backlogs = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_rank = db.query_expression()
     
     applications = db.relationship('Application', backref='student', cascade='all, delete-orphan')
+    archived_applications = db.relationship('ArchivedApplication', backref='student', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_student_profiles_user_id', 'user_id'),
+        db.Index('ix_student_profiles_branch', 'branch'),
+        db.Index('ix_student_profiles_graduation_year', 'graduation_year'),
+        db.Index('ix_student_profiles_cgpa', 'cgpa'),
+        db.Index('ix_student_profiles_backlogs', 'backlogs'),
+    )
 
 
 
@@ -77,10 +101,22 @@ class PlacementDrive(db.Model):
     description = db.Column(db.Text, nullable=False)
     eligibility = db.Column(db.Text)
     deadline = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), default='pending')
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
+    max_applicants = db.Column(db.Integer)
+    eligible_branches = db.Column(db.String(500))
+    graduation_year = db.Column(db.Integer)
+    min_cgpa = db.Column(db.Float)
+    max_backlogs = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    search_rank = db.query_expression()
     
     applications = db.relationship('Application', backref='drive', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_placement_drives_status_deadline', 'status', 'deadline'),
+        db.Index('ix_placement_drives_company_id', 'company_id'),
+        db.Index('ix_placement_drives_created_at', 'created_at'),
+    )
 
 
 
@@ -93,5 +129,187 @@ class Application(db.Model):
     drive_id = db.Column(db.Integer, db.ForeignKey('placement_drives.id'), nullable=False)
     status = db.Column(db.String(20), default='applied')
     applied_date = db.Column(db.DateTime, default=datetime.utcnow)
+    decided_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'drive_id', name='unique_student_drive'),
+        db.Index('ix_applications_drive_id_status', 'drive_id', 'status'),
+        db.Index('ix_applications_drive_id_applied_date', 'drive_id', 'applied_date'),
+        db.Index('ix_applications_student_id_applied_date', 'student_id', 'applied_date'),
+    )
+
+
+
+
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+
+
+
+class ApiToken(db.Model):
+    __tablename__ = 'api_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_api_tokens_user_id', 'user_id'),
+    )
+
+
+
+
+class Event(db.Model):
+    __tablename__ = 'events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    data = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_events_user_id_id', 'user_id', 'id'),
+        db.Index('ix_events_created_at', 'created_at'),
+    )
+
+
+
+
+class AnalyticsMark(db.Model):
+    __tablename__ = 'analytics_marks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)
+    key = db.Column(db.Integer, nullable=False)
+
+
+
+
+class DriveStats(db.Model):
+    __tablename__ = 'drive_stats'
+    
+    drive_id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, nullable=False)
+    applications = db.Column(db.Integer, nullable=False, default=0)
+    shortlisted = db.Column(db.Integer, nullable=False, default=0)
+    selected = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    decided = db.Column(db.Integer, nullable=False, default=0)
+    decision_seconds = db.Column(db.Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_drive_stats_company_id', 'company_id'),
+        db.Index('ix_drive_stats_applications', 'applications'),
+    )
+
+
+
+
+class StudentStats(db.Model):
+    __tablename__ = 'student_stats'
+    
+    student_id = db.Column(db.Integer, primary_key=True)
+    applications = db.Column(db.Integer, nullable=False, default=0)
+    shortlisted = db.Column(db.Integer, nullable=False, default=0)
+    selected = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_student_stats_selected', 'selected'),
+    )
+
+
+
+
+class ArchivedDrive(db.Model):
+    __tablename__ = 'archived_drives'
+    
+    # same ids as the placement_drives rows they were moved from
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    company_id = db.Column(db.Integer, db.ForeignKey('company_profiles.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    eligibility = db.Column(db.Text)
+    deadline = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    max_applicants = db.Column(db.Integer)
+    eligible_branches = db.Column(db.String(500))
+    graduation_year = db.Column(db.Integer)
+    min_cgpa = db.Column(db.Float)
+    max_backlogs = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    applications = db.relationship('ArchivedApplication', backref='drive', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_archived_drives_company_id', 'company_id'),
+    )
+
+
+
+
+class ArchivedApplication(db.Model):
+    __tablename__ = 'archived_applications'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student_profiles.id'), nullable=False)
+    drive_id = db.Column(db.Integer, db.ForeignKey('archived_drives.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    applied_date = db.Column(db.DateTime)
+    decided_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_archived_applications_student_id_applied_date', 'student_id', 'applied_date'),
+        db.Index('ix_archived_applications_drive_id', 'drive_id'),
+    )
+
+
+
+
+class AuditEntry(db.Model):
+    __tablename__ = 'audit_log'
+    
+    # append-only; no foreign keys, so the trail outlives the users, drives and applications it mentions
+    id = db.Column(db.Integer, primary_key=True)
+    actor_id = db.Column(db.Integer)
+    action = db.Column(db.String(50), nullable=False)
+    target_id = db.Column(db.Integer, nullable=False)
+    student_id = db.Column(db.Integer)
+    drive_id = db.Column(db.Integer)
+    old_value = db.Column(db.String(50))
+    new_value = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('student_id', 'drive_id', name='unique_student_drive'),)
+    __table_args__ = (
+        db.Index('ix_audit_log_student_id_id', 'student_id', 'id'),
+        db.Index('ix_audit_log_drive_id_id', 'drive_id', 'id'),
+    )
@@ -0,0 +1,104 @@
+from flask import request, current_app, abort, url_for
+from sqlalchemy import tuple_, DateTime
+from sqlalchemy.engine import Row
+from datetime import datetime
+import base64
+import binascii
+import json
+
+
+
+
+class Page:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, prefix=''):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.prefix = prefix
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def url(self, **cursor):
+        args = {key: value for key, value in request.args.items()
+                if key not in (self.prefix + 'after', self.prefix + 'before')}
+        args.update(cursor)
+        return url_for(request.endpoint, **request.view_args, **args)
+
+    def next_url(self):
+        return self.url(**{self.prefix + 'after': self.next_cursor})
+
+    def prev_url(self):
+        return self.url(**{self.prefix + 'before': self.prev_cursor})
+
+
+
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+
+
+def decode_cursor(cursor, keys):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(keys):
+            raise ValueError(cursor)
+        return [datetime.fromisoformat(v) if isinstance(k.type, DateTime) else v
+                for k, v in zip(keys, values)]
+    except (ValueError, TypeError, binascii.Error):
+        abort(400)
+
+
+
+
+def row_key(row, keys):
+    item = row[0] if isinstance(row, Row) else row
+    return [getattr(item, key.key) for key in keys]
+
+
+
+
+def page_size():
+    default = current_app.config.get('PAGE_SIZE', 50)
+    maximum = current_app.config.get('MAX_PAGE_SIZE', 200)
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, maximum))
+
+
+
+
+def paginate(query, keys, prefix=''):
+    per_page = page_size()
+    after = request.args.get(prefix + 'after')
+    before = request.args.get(prefix + 'before')
+
+    if before:
+        query = query.filter(tuple_(*keys) < tuple_(*decode_cursor(before, keys)))
+        query = query.order_by(*[key.desc() for key in keys])
+    else:
+        if after:
+            query = query.filter(tuple_(*keys) > tuple_(*decode_cursor(after, keys)))
+        query = query.order_by(*keys)
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows and (has_more or before):
+        next_cursor = encode_cursor(row_key(rows[-1], keys))
+    if rows and (after or (before and has_more)):
+        prev_cursor = encode_cursor(row_key(rows[0], keys))
+    return Page(rows, per_page, next_cursor, prev_cursor, prefix)
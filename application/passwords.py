@@ -0,0 +1,150 @@
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import atexit
+import multiprocessing
+import threading
+
+
+
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+# imported accounts start with a cheap hash of the password handed out with them; the first login replaces it
+# with PASSWORD_HASH_METHOD, as it does for any outdated hash
+IMPORT_METHOD = 'pbkdf2:sha256:1000'
+
+
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+_bulk_pool = None
+
+
+
+
+def setting(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+
+
+def normalize_method(method):
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        defaults = ['scrypt', '32768', '8', '1']
+    elif parts[0] == 'pbkdf2':
+        defaults = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join(parts + defaults[len(parts):])
+
+
+
+
+def hash_method():
+    return normalize_method(setting('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+
+
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != hash_method()
+
+
+
+
+def pool():
+    global _pool, _slots
+    workers = setting('PASSWORD_HASH_WORKERS', 2)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: gunicorn workers are threaded by the time the pool starts
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            # caps how many request threads may wait on hashing so the rest keep serving pages
+            _slots = threading.BoundedSemaphore(setting('PASSWORD_HASH_MAX_PENDING', 2))
+    return _pool
+
+
+
+
+def bulk_pool():
+    # imports hash on processes of their own, so a long import never queues ahead of logins
+    global _bulk_pool
+    workers = setting('PASSWORD_IMPORT_WORKERS', 1)
+    if not workers:
+        return None
+    with _pool_lock:
+        if _bulk_pool is None:
+            _bulk_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _bulk_pool
+
+
+
+
+def run(f, *args):
+    executor = pool()
+    if executor is None:
+        return f(*args)
+    if not _slots.acquire(timeout=setting('PASSWORD_HASH_TIMEOUT', 0.1)):
+        raise PasswordHasherBusy('password hashing queue is full')
+    try:
+        return executor.submit(f, *args).result()
+    finally:
+        _slots.release()
+
+
+
+
+def hash_password(password):
+    return run(generate_password_hash, password, hash_method(), setting('PASSWORD_SALT_LENGTH', 16))
+
+
+
+
+def verify_password(password_hash, password):
+    return run(check_password_hash, password_hash, password)
+
+
+
+
+def hash_many(passwords, method=None):
+    method = normalize_method(method or setting('IMPORT_PASSWORD_HASH_METHOD', IMPORT_METHOD))
+    salt_length = setting('PASSWORD_SALT_LENGTH', 16)
+    executor = bulk_pool()
+    if executor is None:
+        return [generate_password_hash(password, method, salt_length) for password in passwords]
+    chunksize = max(1, len(passwords) // (4 * setting('PASSWORD_IMPORT_WORKERS', 1)))
+    return list(executor.map(generate_password_hash, passwords, repeat(method), repeat(salt_length),
+                             chunksize=chunksize))
+
+
+
+
+def shutdown():
+    global _pool, _bulk_pool
+    with _pool_lock:
+        for executor in (_pool, _bulk_pool):
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        _pool = _bulk_pool = None
+
+
+
+
+def init_app(app):
+    @app.errorhandler(PasswordHasherBusy)
+    def hasher_busy(error):
+        return 'The server is busy, please try again in a moment.', 503, {'Retry-After': '1'}
+
+    atexit.register(shutdown)
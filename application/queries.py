@@ -0,0 +1,233 @@
+from flask import g, has_request_context
+from sqlalchemy import event, func, select, tuple_, update
+from sqlalchemy.orm import joinedload
+from . import db, analytics, audit, versions
+from .models import CompanyProfile, StudentProfile, PlacementDrive, Application, ArchivedDrive, ArchivedApplication
+
+
+
+
+class TooManyStatements(RuntimeError):
+    pass
+
+
+
+
+def drive_applicant_count():
+    return (select(func.count(Application.id))
+            .where(Application.drive_id == PlacementDrive.id)
+            .correlate(PlacementDrive)
+            .scalar_subquery()
+            .label('applicant_count'))
+
+
+
+
+def student_application_count():
+    return (select(func.count(Application.id))
+            .where(Application.student_id == StudentProfile.id)
+            .correlate(StudentProfile)
+            .scalar_subquery()
+            .label('application_count'))
+
+
+
+
+def companies():
+    return CompanyProfile.query.options(joinedload(CompanyProfile.user))
+
+
+
+
+def students():
+    return db.session.query(StudentProfile, student_application_count()).options(
+        joinedload(StudentProfile.user))
+
+
+
+
+def drives():
+    return (db.session.query(PlacementDrive, drive_applicant_count())
+            .options(joinedload(PlacementDrive.company)))
+
+
+
+
+def pending_companies():
+    return CompanyProfile.query.filter_by(approval_status='pending')
+
+
+
+
+def pending_drives():
+    return (PlacementDrive.query.filter_by(status='pending')
+            .options(joinedload(PlacementDrive.company)))
+
+
+
+
+def company_drives(company_id):
+    return (db.session.query(PlacementDrive, drive_applicant_count())
+            .filter(PlacementDrive.company_id == company_id)
+            .all())
+
+
+
+
+def drive_applications(drive_id):
+    return (Application.query.filter_by(drive_id=drive_id)
+            .options(joinedload(Application.student).joinedload(StudentProfile.user)))
+
+
+
+
+def count_drive_applications(drive_id):
+    return db.session.scalar(select(func.count(Application.id)).where(Application.drive_id == drive_id))
+
+
+
+
+def open_drives(drive_ids=None):
+    # the deadline sweeper closes expired drives, so 'approved' alone means open
+    query = PlacementDrive.query.filter_by(status='approved').options(joinedload(PlacementDrive.company))
+    if drive_ids is not None:
+        # `id + 0` keeps the planner on ix_placement_drives_status_deadline, which serves the board's deadline
+        # order, instead of looking ids up by primary key and sorting every eligible drive for each page
+        query = query.filter((PlacementDrive.id + 0).in_(drive_ids))
+    return query
+
+
+
+
+def applied_drive_ids(student_id):
+    return set(db.session.scalars(select(Application.drive_id).where(Application.student_id == student_id)))
+
+
+
+
+def student_applications(student_id, limit=None):
+    # live and archived applications, newest first; both kinds have .drive.company, .applied_date and .status
+    found = []
+    for model, drive in ((Application, PlacementDrive), (ArchivedApplication, ArchivedDrive)):
+        query = (model.query.filter_by(student_id=student_id)
+                 .options(joinedload(model.drive).joinedload(drive.company))
+                 .order_by(model.applied_date.desc()))
+        if limit:
+            query = query.limit(limit)
+        found += query.all()
+    found.sort(key=lambda application: application.applied_date, reverse=True)
+    return found[:limit] if limit else found
+
+
+
+
+APPLICATION_STATUSES = ['applied', 'shortlisted', 'selected', 'rejected']
+
+
+
+
+def application_status_counts(student_id):
+    totals = [0] * (len(APPLICATION_STATUSES) + 1)
+    for model in (Application, ArchivedApplication):
+        row = (db.session.query(
+                    func.count(model.id),
+                    *[func.count(model.id).filter(model.status == status) for status in APPLICATION_STATUSES])
+               .filter(model.student_id == student_id)
+               .one())
+        totals = [total + count for total, count in zip(totals, row)]
+    counts = dict(zip(APPLICATION_STATUSES, totals[1:]))
+    counts['total'] = totals[0]
+    return counts
+
+
+
+
+def update_application_statuses(drive_id, company_id, new_status, seen=None, from_status=None):
+    # ownership, the selection and the expected current status are all checked by the one UPDATE, so rows
+    # another recruiter changed since the page was rendered are left alone rather than overwritten
+    owned = select(PlacementDrive.id).where(PlacementDrive.id == drive_id, PlacementDrive.company_id == company_id)
+    statement = (update(Application)
+                 .where(Application.drive_id == drive_id, Application.drive_id.in_(owned),
+                        Application.status != new_status)
+                 .values(status=new_status, **analytics.decision_values(new_status))
+                 .returning(Application.id, Application.student_id)
+                 .execution_options(synchronize_session=False))
+    if seen is not None:
+        statement = statement.where(Application.id.in_([id for id, status in seen]),
+                                    tuple_(Application.id, Application.status).in_(seen))
+    if from_status is not None:
+        statement = statement.where(Application.status == from_status)
+    updated = db.session.execute(statement).all()
+    student_ids = {student_id for id, student_id in updated}
+    versions.bump_students(db.session.connection(), student_ids)
+    if updated:
+        analytics.mark(db.session.connection(), [drive_id], student_ids)
+    # the UPDATE only matched rows still in the status the recruiter saw, so that is the old one
+    previous = dict(seen) if seen is not None else {}
+    audit.record_statuses(db.session, [(id, student_id, drive_id, previous.get(id, from_status), new_status)
+                                       for id, student_id in updated])
+    return [id for id, student_id in updated]
+
+
+
+
+def set_application_statuses(changes, company_id=None):
+    # `changes` is (id, new_status, expected_status or None) per application; one UPDATE per new status. As
+    # above, a row whose status is no longer the expected one is left alone, and so is another company's row.
+    # The audit log needs the old status, so a change without an expected status expects the one read here;
+    # on PostgreSQL FOR UPDATE keeps it from moving before the UPDATE.
+    unexpected = [id for id, status, expected in changes if expected is None]
+    found = dict(db.session.execute(select(Application.id, Application.status)
+                                    .where(Application.id.in_(unexpected))
+                                    .with_for_update()).all()) if unexpected else {}
+    by_status = {}
+    for id, status, expected in changes:
+        expected = found.get(id) if expected is None else expected
+        if expected is not None:
+            by_status.setdefault(status, []).append((id, expected))
+    updated = []
+    for status, seen in by_status.items():
+        statement = (update(Application)
+                     .where(Application.id.in_([id for id, expected in seen]),
+                            tuple_(Application.id, Application.status).in_(seen), Application.status != status)
+                     .values(status=status, **analytics.decision_values(status))
+                     .returning(Application.id, Application.drive_id, Application.student_id)
+                     .execution_options(synchronize_session=False))
+        if company_id is not None:
+            owned = select(PlacementDrive.id).where(PlacementDrive.company_id == company_id)
+            statement = statement.where(Application.drive_id.in_(owned))
+        previous = dict(seen)
+        updated.extend((id, student_id, drive_id, previous[id], status)
+                       for id, drive_id, student_id in db.session.execute(statement))
+    student_ids = {student_id for id, student_id, drive_id, old, new in updated}
+    versions.bump_students(db.session.connection(), student_ids)
+    analytics.mark(db.session.connection(), {drive_id for id, student_id, drive_id, old, new in updated}, student_ids)
+    audit.record_statuses(db.session, updated)
+    return [(id, new) for id, student_id, drive_id, old, new in updated]
+
+
+
+
+def init_app(app):
+    limit = app.config.get('MAX_STATEMENTS_PER_REQUEST')
+    if not limit:
+        return
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.statement_count = g.get('statement_count', 0) + 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', count_statement)
+
+    @app.before_request
+    def reset_statement_count():
+        g.statement_count = 0
+
+    @app.after_request
+    def enforce_statement_limit(response):
+        count = g.get('statement_count', 0)
+        if count > limit:
+            raise TooManyStatements(f'{count} SQL statements issued, the limit is {limit}')
+        return response
@@ -0,0 +1,227 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import click
+import io
+import re
+from .pagination import encode_cursor
+
+
+
+
+MAX_STATEMENTS_PER_REQUEST = 8
+IMPORT_FIXTURE = (b'email,password,name,student_id\r\n'
+                  b'imported@plans.local,plans,Imported Student,PLAN-IMPORT\r\n'
+                  b'student@plans.local,plans,Plan Student,PLAN-DUP\r\n')
+
+
+
+
+def explain(conn, statement, parameters):
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+
+
+def rowid_walk(statement):
+    # the table an unfiltered page walks in primary key order: SQLite reads LIMIT rows off the rowid b-tree and
+    # reports it as a plain SCAN. Only the outermost FROM counts, and a WHERE there would make it a real scan.
+    outer = statement[statement.rfind('\nFROM '):]
+    match = re.fullmatch(r'\nFROM (\w+)\b[^\n]* ORDER BY \1\.id(?: ASC| DESC)?\n LIMIT [^\n]*', outer)
+    return match and f'SCAN {match.group(1)}'
+
+
+
+
+def unindexed_steps(statement, plan):
+    filtered = re.search(r'\s(WHERE|ORDER BY)\s', statement) is not None
+    walked = rowid_walk(statement)
+    problems = []
+    for detail in plan:
+        # a CONSTANT ROW scan walks a VALUES list in the statement, not a table
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE INDEX' not in detail \
+                and detail != 'SCAN CONSTANT ROW' and filtered and detail != walked:
+            problems.append(detail)
+        elif detail.startswith('USE TEMP B-TREE') and 'VIRTUAL TABLE INDEX' not in ' '.join(plan):
+            problems.append(detail)
+    return problems
+
+
+
+
+def seed_fixtures():
+    from . import db
+    from .api import hash_token
+    from .models import ApiToken, Job, User, CompanyProfile, StudentProfile, PlacementDrive, Application
+
+    admin = User(email='admin@plans.local', role='admin')
+    company_user = User(email='company@plans.local', role='company')
+    student_user = User(email='student@plans.local', role='student')
+    for user in (admin, company_user, student_user):
+        user.set_password('plans')
+        db.session.add(user)
+    db.session.flush()
+    for user in (admin, company_user, student_user):
+        db.session.add(ApiToken(user_id=user.id, name='plans', token_hash=hash_token(f'plans-{user.role}')))
+
+    company = CompanyProfile(user_id=company_user.id, name='Plans Inc', hr_contact='HR',
+                             approval_status='approved')
+    student = StudentProfile(user_id=student_user.id, name='Plan Student', student_id='PLAN-1',
+                             branch='Computer Science', graduation_year=2025, cgpa=8.0)
+    db.session.add_all([company, student])
+    db.session.flush()
+
+    drive = PlacementDrive(company_id=company.id, title='Engineer', description='Build things',
+                           deadline=datetime.now() + timedelta(days=7), status='approved',
+                           eligible_branches='Computer Science,Electronics', graduation_year=2025, min_cgpa=7.0,
+                           max_backlogs=0)
+    db.session.add(drive)
+    db.session.flush()
+
+    application = Application(student_id=student.id, drive_id=drive.id, status='applied')
+    failed_job = Job(name='delete_user', payload='{"user_id": 0}', status='failed', attempts=5,
+                     last_error='RuntimeError: plans')
+    db.session.add_all([application, failed_job])
+    db.session.commit()
+    return {'company': company.id, 'student': student.id, 'drive': drive.id, 'application': application.id,
+            'job': failed_job.id}
+
+
+
+
+def plan_requests(ids):
+    first_id = encode_cursor([0])
+    first_date = encode_cursor([datetime(2000, 1, 1), 0])
+    drive_first = encode_cursor([ids['drive'], datetime(2000, 1, 1), 0])
+    return [
+        ('admin', 'GET', '/admin/dashboard', None),
+        ('admin', 'GET', '/admin/companies', None),
+        ('admin', 'GET', '/admin/students', None),
+        ('admin', 'GET', '/admin/drives', None),
+        ('admin', 'GET', '/admin/approvals', None),
+        ('admin', 'GET', '/admin/students/import', None),
+        ('admin', 'GET', '/admin/reports/placements.csv', None),
+        ('admin', 'GET', '/admin/metrics/conditional-get', None),
+        ('admin', 'GET', '/admin/analytics', None),
+        ('admin', 'GET', '/admin/analytics/summary.json', None),
+        ('admin', 'GET', '/admin/analytics/companies.json', None),
+        ('admin', 'GET', '/admin/analytics/decisions.json', None),
+        ('admin', 'GET', '/admin/analytics/drives.json', None),
+        ('admin', 'GET', f'/admin/analytics/drives.json?company_id={ids["company"]}', None),
+        ('admin', 'GET', '/admin/analytics/students.json', None),
+        ('admin', 'POST', '/admin/students/import', {'file': (io.BytesIO(IMPORT_FIXTURE), 'students.csv')}),
+        ('admin', 'GET', '/admin/companies?search=pla', None),
+        ('admin', 'GET', '/admin/students?search=plan stud', None),
+        ('admin', 'GET', f'/admin/companies?after={first_id}', None),
+        ('admin', 'GET', f'/admin/students?before={first_id}', None),
+        ('admin', 'GET', f'/admin/drives?after={first_date}', None),
+        ('admin', 'GET', f'/admin/approvals?companies_after={first_id}&drives_after={first_date}', None),
+        ('admin', 'GET', f'/admin/approve/company/{ids["company"]}', None),
+        ('admin', 'GET', f'/admin/approve/drive/{ids["drive"]}', None),
+        ('admin', 'GET', f'/admin/activate/student/{ids["student"]}', None),
+        ('admin', 'GET', f'/admin/activate/company/{ids["company"]}', None),
+        ('admin', 'GET', f'/admin/jobs/{ids["job"]}/retry', None),
+        ('company', 'GET', '/company/dashboard', None),
+        ('company', 'GET', f'/company/drive/edit/{ids["drive"]}', None),
+        ('company', 'GET', f'/company/applicants/{ids["drive"]}', None),
+        ('company', 'GET', f'/company/applicants/{ids["drive"]}?after={first_date}', None),
+        ('company', 'GET', f'/company/applicants/{ids["drive"]}/export.csv', None),
+        ('company', 'GET', '/company/applications/export.xlsx', None),
+        ('company', 'POST', f'/company/application/{ids["application"]}/update', {'status': 'shortlisted'}),
+        ('company', 'POST', f'/company/applicants/{ids["drive"]}/status',
+         {'status': 'applied', 'application': f'{ids["application"]}:shortlisted'}),
+        ('company', 'POST', f'/company/applicants/{ids["drive"]}/status',
+         {'status': 'shortlisted', 'scope': 'filter', 'from_status': 'applied'}),
+        ('student', 'GET', '/student/dashboard', None),
+        ('student', 'GET', '/student/profile', None),
+        ('student', 'POST', '/student/profile',
+         {'name': 'Plan Student', 'branch': 'Computer Science', 'graduation_year': '2025', 'cgpa': '8.0'}),
+        ('student', 'GET', '/student/drives', None),
+        ('student', 'GET', '/student/drives?search=engineer', None),
+        ('student', 'GET', f'/student/drives?before={first_date}', None),
+        ('student', 'GET', f'/student/apply/{ids["drive"]}', None),
+        ('student', 'GET', '/student/history', None),
+        ('student', 'GET', '/events?last_event_id=0', None),
+        ('admin', 'GET', '/api/v1/applications', None),
+        ('admin', 'GET', f'/api/v1/applications?after={first_id}&fields=id,status', None),
+        ('admin', 'GET', f'/api/v1/applications?drive_id={ids["drive"]}&after={drive_first}', None),
+        ('admin', 'GET', f'/api/v1/students?ids={ids["student"]}&fields=id,email,cgpa', None),
+        ('admin', 'GET', '/api/v1/companies?approval_status=approved', None),
+        ('admin', 'GET', '/api/v1/drives?status=approved', None),
+        ('company', 'GET', '/api/v1/drives', None),
+        ('company', 'GET', '/api/v1/applications?status=shortlisted', None),
+        ('company', 'GET', f'/api/v1/applications?after={drive_first}', None),
+        ('company', 'GET', '/api/v1/students', None),
+        ('company', 'GET', '/api/v1/companies', None),
+        ('company', 'POST', '/api/v1/applications/status',
+         {'updates': [{'id': ids['application'], 'status': 'selected', 'expected_status': 'shortlisted'}]}),
+        ('student', 'GET', '/api/v1/drives', None),
+        ('student', 'GET', '/api/v1/applications', None),
+    ]
+
+
+
+
+def check_query_plans():
+    from . import create_app, db
+    from .migrations import upgrade
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'TESTING': True,
+        'MAX_STATEMENTS_PER_REQUEST': MAX_STATEMENTS_PER_REQUEST,
+        'PASSWORD_HASH_WORKERS': 0,
+        'EVENTS_STREAM_SECONDS': 0,
+    })
+    results = []
+    with app.app_context():
+        upgrade()
+        ids = seed_fixtures()
+        engine = db.engine
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().upper()
+        if not executemany and (verb.startswith(('SELECT', 'UPDATE', 'DELETE'))
+                                or verb.startswith('INSERT') and ' SELECT ' in verb):
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    client = app.test_client()
+    role = None
+    for request_role, method, path, data in plan_requests(ids):
+        if request_role != role:
+            client.get('/logout')
+            client.post('/login', data={'email': f'{request_role}@plans.local', 'password': 'plans'})
+            role = request_role
+        captured.clear()
+        if path.startswith('/api/'):
+            client.open(path, method=method, json=data,
+                        headers={'Authorization': f'Bearer plans-{request_role}'}).get_data()
+        else:
+            client.open(path, method=method, data=data).get_data()
+        statements = list(captured)
+        with engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = explain(conn, statement, parameters)
+                results.append((path, statement, plan, unindexed_steps(statement, plan)))
+    event.remove(engine, 'before_cursor_execute', capture)
+    return results
+
+
+
+
+def init_app(app):
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print the plan of every statement.')
+    def check_query_plans_command(verbose):
+        failures = 0
+        for path, statement, plan, problems in check_query_plans():
+            if problems:
+                failures += 1
+                click.echo(f'UNINDEXED {path}: {" | ".join(problems)}\n    {statement}')
+            elif verbose:
+                click.echo(f'ok {path}: {" | ".join(plan)}')
+        if failures:
+            raise click.ClickException(f'{failures} statement(s) do not use an index.')
+        click.echo('Every controller query uses an index.')
@@ -0,0 +1,52 @@
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+import time
+
+
+
+
+# With REPLICA_DATABASE_URI set, SELECTs issued by GET requests to views marked @replica_reads go to the replica
+# bind; everything else, and every statement that writes, goes to the primary. A browser that has just written
+# reads from the primary for REPLICA_STICKY_SECONDS, so it never sees a page from before its own change.
+STICKY_KEY = '_primary_until'
+
+
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False):
+            if self.info.get('replica') and not self.info.get('wrote'):
+                return self._db.engines['replica']
+        elif bind is None:
+            # a flush, a write, or a raw connection that may write; from here on this request reads its own writes
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+
+
+def replica_reads(f):
+    f.replica_reads = True
+    return f
+
+
+
+
+def init_app(app, db):
+    if 'replica' not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return
+    sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+    @app.before_request
+    def route_reads():
+        view = current_app.view_functions.get(request.endpoint)
+        db.session.info.pop('wrote', None)
+        db.session.info['replica'] = (request.method in ('GET', 'HEAD') and getattr(view, 'replica_reads', False)
+                                      and session.get(STICKY_KEY, 0) < time.time())
+
+    @app.after_request
+    def stick_to_primary(response):
+        if db.session.info.get('wrote'):
+            session[STICKY_KEY] = time.time() + sticky_seconds
+        return response
@@ -0,0 +1,186 @@
+from sqlalchemy import event, inspect, text, false, or_, Integer, Float
+from sqlalchemy.orm import with_expression
+import click
+import re
+from . import db
+from .models import CompanyProfile, StudentProfile, PlacementDrive
+
+
+
+
+SEARCH_INDEXES = {
+    StudentProfile: ('student_search', ['name', 'student_id', 'resume_bio']),
+    CompanyProfile: ('company_search', ['name']),
+    PlacementDrive: ('drive_search', ['title', 'description', 'eligibility']),
+}
+
+
+
+
+# SQLite keeps an FTS5 table per model in step with the rows; PostgreSQL indexes the tsvector expression itself,
+# so its indexes need no syncing
+def supported(conn):
+    return conn.dialect.name == 'sqlite'
+
+
+
+
+def postgresql(conn):
+    return conn.dialect.name == 'postgresql'
+
+
+
+
+def document(columns):
+    # the same text in the index and in queries, or PostgreSQL will not match the expression to the index
+    joined = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return f"to_tsvector('simple', {joined})"
+
+
+
+
+def create_indexes(conn):
+    if postgresql(conn):
+        for model, (table, columns) in SEARCH_INDEXES.items():
+            conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS ix_{table} ON {model.__tablename__} USING gin (({document(columns)}))'
+            ))
+        return
+    for table, columns in SEARCH_INDEXES.values():
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"{', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+
+
+
+
+def rebuild(conn):
+    if not supported(conn):
+        return
+    for model, (table, columns) in SEARCH_INDEXES.items():
+        values = ', '.join(f"coalesce({column}, '')" for column in columns)
+        conn.execute(text(f'DELETE FROM {table}'))
+        conn.execute(text(
+            f"INSERT INTO {table} (rowid, {', '.join(columns)}) SELECT id, {values} FROM {model.__tablename__}"
+        ))
+
+
+
+
+def index_documents(conn, model, documents):
+    if not supported(conn) or not documents:
+        return
+    table, columns = SEARCH_INDEXES[model]
+    conn.execute(
+        text(f"INSERT INTO {table} (rowid, {', '.join(columns)}) VALUES (:id, {', '.join(':' + c for c in columns)})"),
+        [{'id': document['id'], **{c: document.get(c) or '' for c in columns}} for document in documents]
+    )
+
+
+
+
+def sync_document(mapper, connection, target):
+    if not supported(connection):
+        return
+    table, columns = SEARCH_INDEXES[mapper.class_]
+    connection.execute(text(f'DELETE FROM {table} WHERE rowid = :id'), {'id': target.id})
+    index_documents(connection, mapper.class_, [{'id': target.id, **{c: getattr(target, c) for c in columns}}])
+
+
+
+
+def update_document(mapper, connection, target):
+    table, columns = SEARCH_INDEXES[mapper.class_]
+    state = inspect(target)
+    if any(state.attrs[c].history.has_changes() for c in columns):
+        sync_document(mapper, connection, target)
+
+
+
+
+def remove_document(mapper, connection, target):
+    remove_documents(connection, mapper.class_, [target.id])
+
+
+
+
+def remove_documents(conn, model, ids):
+    if not supported(conn) or not ids:
+        return
+    table, columns = SEARCH_INDEXES[model]
+    conn.execute(text(f'DELETE FROM {table} WHERE rowid = :id'), [{'id': id} for id in ids])
+
+
+
+
+for indexed_model in SEARCH_INDEXES:
+    event.listen(indexed_model, 'after_insert', sync_document)
+    event.listen(indexed_model, 'after_update', update_document)
+    event.listen(indexed_model, 'after_delete', remove_document)
+
+
+
+
+def match_expression(terms):
+    words = re.findall(r'\w+', terms)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+
+
+def tsquery(terms):
+    return ' & '.join(f'{word}:*' for word in re.findall(r'\w+', terms))
+
+
+
+
+def matches(model, terms):
+    table, columns = SEARCH_INDEXES[model]
+    return (text(f'SELECT rowid AS id, rank AS search_rank FROM {table} WHERE {table} MATCH :terms')
+            .bindparams(terms=match_expression(terms))
+            .columns(id=Integer, search_rank=Float)
+            .subquery(f'{table}_matches'))
+
+
+
+
+def postgresql_matches(model, terms):
+    # ts_rank grows with relevance; negated so that, like FTS5's rank, the best match sorts first
+    table, columns = SEARCH_INDEXES[model]
+    return (text(f"SELECT id, -ts_rank({document(columns)}, query) AS search_rank "
+                 f"FROM {model.__tablename__}, to_tsquery('simple', :terms) AS query "
+                 f"WHERE {document(columns)} @@ query")
+            .bindparams(terms=tsquery(terms))
+            .columns(id=Integer, search_rank=Float)
+            .subquery(f'{table}_matches'))
+
+
+
+
+def ranked_search(query, model, terms, keys):
+    if not match_expression(terms):
+        return query.filter(false()), keys
+
+    if postgresql(db.engine):
+        found = postgresql_matches(model, terms)
+    elif supported(db.engine):
+        found = matches(model, terms)
+    else:
+        table, columns = SEARCH_INDEXES[model]
+        return query.filter(or_(*[getattr(model, c).contains(terms) for c in columns])), keys
+
+    query = (query.join(found, found.c.id == model.id)
+             .options(with_expression(model.search_rank, found.c.search_rank)))
+    return query, [found.c.search_rank, model.id]
+
+
+
+
+def init_app(app):
+    @app.cli.command('rebuild-search')
+    def rebuild_search_command():
+        with db.engine.begin() as conn:
+            create_indexes(conn)
+            rebuild(conn)
+        click.echo('Search indexes rebuilt.')
@@ -0,0 +1,120 @@
+from flask import current_app
+from sqlalchemy import exists, func, literal, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+import os
+import threading
+import time
+from . import db, analytics, counters, eligibility, versions
+from .models import PlacementDrive, Application
+
+
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+
+
+def epoch_file():
+    return current_app.config.get('DRIVES_EPOCH_FILE') or os.path.join(current_app.instance_path, 'drives.epoch')
+
+
+
+
+def current_epoch():
+    try:
+        return os.stat(epoch_file()).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+
+
+def invalidate():
+    global _snapshot
+    with _lock:
+        _snapshot = None
+    path = epoch_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(str(time.time_ns()))
+
+
+
+
+def open_drives():
+    global _snapshot
+    epoch = current_epoch()
+    ttl = current_app.config.get('OPEN_DRIVES_CACHE_TTL', 60)
+    snapshot = _snapshot
+    if snapshot is None or snapshot[0] != epoch or time.monotonic() - snapshot[1] > ttl:
+        with _lock:
+            rows = db.session.execute(
+                select(PlacementDrive.id, PlacementDrive.deadline, PlacementDrive.max_applicants,
+                       PlacementDrive.eligible_branches, PlacementDrive.graduation_year, PlacementDrive.min_cgpa,
+                       PlacementDrive.max_backlogs)
+                .where(PlacementDrive.status == 'approved')
+            ).all()
+            snapshot = _snapshot = (epoch, time.monotonic(),
+                                    {row.id: (row.deadline, row.max_applicants, eligibility.drive_criteria(row))
+                                     for row in rows})
+    return snapshot[2]
+
+
+
+
+def application_insert(dialect, student_id, drive_id, now):
+    applicants = select(func.count(Application.id)).where(Application.drive_id == drive_id).scalar_subquery()
+    still_open = exists().where(
+        PlacementDrive.id == drive_id,
+        PlacementDrive.status == 'approved',
+        PlacementDrive.deadline > now,
+        or_(PlacementDrive.max_applicants.is_(None), PlacementDrive.max_applicants > applicants),
+    )
+    row = (select(literal(student_id), literal(drive_id), literal('applied'), literal(datetime.utcnow()))
+           .where(still_open))
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    return (insert(Application)
+            .from_select(['student_id', 'drive_id', 'status', 'applied_date'], row)
+            .on_conflict_do_nothing(index_elements=['student_id', 'drive_id']))
+
+
+
+
+def submit(student, drive_id):
+    student_id = student.id
+    drive = open_drives().get(drive_id)
+    if drive is None:
+        return 'closed'
+    deadline, cap, criteria = drive
+    now = datetime.now()
+    if deadline < now:
+        return 'expired'
+    if not eligibility.is_eligible(criteria, eligibility.student_criteria(student)):
+        return 'ineligible'
+
+    # the drive checks, the cap and the duplicate check all happen inside the one INSERT, so the
+    # snapshot only has to be right about which drives are worth trying
+    conn = db.session.connection()
+    if cap is not None and conn.dialect.name != 'sqlite':
+        # SQLite serialises writers; elsewhere lock the drive row so concurrent inserts see each other's count
+        conn.execute(select(PlacementDrive.id).where(PlacementDrive.id == drive_id).with_for_update())
+    inserted = conn.execute(application_insert(conn.dialect.name, student_id, drive_id, now)).rowcount
+    if inserted:
+        counters.increment(conn, 'applications', inserted)
+        versions.bump_students(conn, [student_id])
+        analytics.mark(conn, [drive_id], [student_id])
+    db.session.commit()
+    if inserted:
+        return 'applied'
+
+    if db.session.scalar(select(Application.id).where(Application.student_id == student_id,
+                                                      Application.drive_id == drive_id)) is not None:
+        return 'duplicate'
+    if cap is not None and db.session.scalar(
+            select(func.count(Application.id)).where(Application.drive_id == drive_id)) >= cap:
+        return 'full'
+    invalidate()
+    return 'closed'
@@ -0,0 +1,126 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+import click
+import multiprocessing
+import threading
+import time
+from . import db, submissions, versions
+from .models import Counter, PlacementDrive
+
+
+
+
+# Approved drives are closed by this sweep once their deadline passes, so reads can treat status 'approved'
+# as open. Every process runs the loop, but a lease row in `counters` lets only one of them sweep at a time.
+LEASE = 'deadline_sweeper:lease'
+LEASE_SECONDS = 300
+
+
+
+
+def close_expired(conn, now=None):
+    # served by ix_placement_drives_status_deadline; running it twice closes nothing the second time
+    now = now or datetime.now()
+    closed = conn.execute(update(PlacementDrive)
+                          .where(PlacementDrive.status == 'approved', PlacementDrive.deadline <= now)
+                          .values(status='closed')
+                          .returning(PlacementDrive.id)).scalars().all()
+    versions.bump_applicants(conn, closed)
+    return closed
+
+
+
+
+def next_deadline(conn):
+    return conn.scalar(select(func.min(PlacementDrive.deadline)).where(PlacementDrive.status == 'approved'))
+
+
+
+
+def acquire(conn, lease=LEASE):
+    now = int(time.time())
+    if conn.execute(update(Counter)
+                    .where(Counter.name == lease, Counter.value <= now)
+                    .values(value=now + LEASE_SECONDS)).rowcount:
+        return True
+    insert = postgresql.insert if conn.dialect.name == 'postgresql' else sqlite.insert
+    return bool(conn.execute(insert(Counter).values(name=lease, value=now + LEASE_SECONDS)
+                             .on_conflict_do_nothing(index_elements=['name'])).rowcount)
+
+
+
+
+def renew(conn, lease=LEASE):
+    # for a holder whose work may outlast LEASE_SECONDS
+    conn.execute(update(Counter).where(Counter.name == lease).values(value=int(time.time()) + LEASE_SECONDS))
+
+
+
+
+def release(conn, lease=LEASE):
+    conn.execute(update(Counter).where(Counter.name == lease).values(value=0))
+
+
+
+
+def sweep():
+    # returns the closed drive ids, or None when another process holds the lease
+    with db.engine.begin() as conn:
+        if not acquire(conn):
+            return None
+    try:
+        with db.engine.begin() as conn:
+            closed = close_expired(conn)
+        if closed:
+            submissions.invalidate()
+        return closed
+    finally:
+        with db.engine.begin() as conn:
+            release(conn)
+
+
+
+
+def sweep_periodically(app, interval):
+    with app.app_context():
+        while True:
+            upcoming = None
+            try:
+                closed = sweep()
+                if closed:
+                    app.logger.info('Closed %s drive(s) past their deadline', len(closed))
+                with db.engine.connect() as conn:
+                    upcoming = next_deadline(conn)
+            except Exception:
+                app.logger.exception('Deadline sweep failed')
+            # wake for the next deadline, and at least every `interval` for drives approved or edited meanwhile
+            wait = interval if upcoming is None else (upcoming - datetime.now()).total_seconds()
+            time.sleep(min(interval, max(wait, 1)))
+
+
+
+
+def init_app(app):
+    interval = app.config.get('DEADLINE_SWEEP_SECONDS', 60)
+    if interval and not app.testing and multiprocessing.parent_process() is None:
+        started = []
+        lock = threading.Lock()
+
+        @app.before_request
+        def start_sweeper_once():
+            if not started:
+                with lock:
+                    if not started:
+                        thread = threading.Thread(target=sweep_periodically, args=(app, interval), daemon=True,
+                                                  name='deadline-sweeper')
+                        thread.start()
+                        started.append(thread)
+
+    @app.cli.command('close-expired-drives')
+    def close_expired_drives_command():
+        closed = sweep()
+        if closed is None:
+            click.echo('Another process is sweeping; nothing done')
+        else:
+            click.echo(f'{len(closed)} drive(s) closed')
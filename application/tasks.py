@@ -0,0 +1,74 @@
+from . import db, identity, mail, submissions
+from .jobs import job
+from .models import User, CompanyProfile, PlacementDrive, Application
+
+
+
+
+NOTIFIED_STATUSES = ('shortlisted', 'selected')
+
+
+
+
+@job('delete_user')
+def delete_user(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return
+    db.session.delete(user)
+    db.session.commit()
+    identity.invalidate(user_id)
+    submissions.invalidate()
+
+
+
+
+@job('delete_drive')
+def delete_drive(drive_id):
+    drive = db.session.get(PlacementDrive, drive_id)
+    if drive is None:
+        return
+    db.session.delete(drive)
+    db.session.commit()
+    submissions.invalidate()
+
+
+
+
+@job('notify_application_status')
+def notify_application_status(application_id, status):
+    application = db.session.get(Application, application_id)
+    # a recruiter who changed their mind before the job ran should not send a stale notice
+    if application is None or application.status != status or status not in NOTIFIED_STATUSES:
+        return
+    drive = application.drive
+    mail.send(application.student.user.email,
+              f'You have been {status} for {drive.title}',
+              f'Dear {application.student.name},\n\n'
+              f'{drive.company.name} has {status} your application for "{drive.title}".\n')
+
+
+
+
+@job('notify_company_approval')
+def notify_company_approval(company_id):
+    company = db.session.get(CompanyProfile, company_id)
+    if company is None or company.approval_status not in ('approved', 'rejected'):
+        return
+    mail.send(company.user.email,
+              f'Your company registration has been {company.approval_status}',
+              f'Dear {company.hr_contact},\n\n'
+              f'The placement cell has {company.approval_status} the registration of {company.name}.\n')
+
+
+
+
+@job('notify_drive_approval')
+def notify_drive_approval(drive_id):
+    drive = db.session.get(PlacementDrive, drive_id)
+    if drive is None or drive.status not in ('approved', 'rejected'):
+        return
+    mail.send(drive.company.user.email,
+              f'Your placement drive "{drive.title}" has been {drive.status}',
+              f'Dear {drive.company.hr_contact},\n\n'
+              f'The placement cell has {drive.status} the drive "{drive.title}".\n')
@@ -0,0 +1,94 @@
+from sqlalchemy import create_engine, func, insert, select, text
+import click
+import time
+from . import db, counters, migrations, search
+from .models import Counter, User
+
+
+
+
+# Copies a SQLite database into the configured one (normally PostgreSQL) table by table, in foreign key order.
+# On PostgreSQL with psycopg each batch goes through COPY; anywhere else it is one multi-row INSERT.
+BATCH_SIZE = 10000
+
+
+
+
+def latest_version():
+    return max(number for number, description, f in migrations.MIGRATIONS)
+
+
+
+
+def reset_sequences(conn):
+    # rows inserted with their ids leave each serial sequence where it was; move it past the largest id
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in db.metadata.sorted_tables:
+        if 'id' in table.c:
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                              f"coalesce(max(id), 0) + 1, false) FROM {table.name}"))
+
+
+
+
+def copy_batch(conn, table, columns, rows):
+    if conn.dialect.name == 'postgresql' and conn.dialect.driver == 'psycopg':
+        with conn.connection.driver_connection.cursor() as cursor:
+            with cursor.copy(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+    else:
+        conn.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+
+
+def copy_database(source_uri, batch_size=BATCH_SIZE, echo=print):
+    source = create_engine(source_uri)
+    with source.connect() as src:
+        version = migrations.current_version(src)
+        if version != latest_version():
+            raise click.ClickException(f'The source is at schema version {version}; run upgrade-db on it first.')
+
+    migrations.upgrade()
+    copied = {}
+    with db.engine.begin() as conn, source.connect() as src:
+        if conn.scalar(select(func.count(User.id))):
+            raise click.ClickException('The target database already has users; copy into an empty database.')
+        # upgrade() seeded the counters from the empty tables; the copied ones are reconciled afterwards
+        conn.execute(Counter.__table__.delete())
+        for table in db.metadata.sorted_tables:
+            started = time.perf_counter()
+            columns = [column.name for column in table.c]
+            query = select(table).order_by(*table.primary_key)
+            if table is Counter.__table__:
+                # a lease held in the source belongs to a process that will never release it in the target
+                query = query.where(Counter.name.not_like('%:lease'))
+            result = src.execution_options(stream_results=True).execute(query)
+            count = 0
+            for rows in result.partitions(batch_size):
+                copy_batch(conn, table, columns, [tuple(row) for row in rows])
+                count += len(rows)
+            copied[table.name] = count
+            echo(f'{table.name}: {count} rows in {time.perf_counter() - started:.1f}s')
+        reset_sequences(conn)
+        search.rebuild(conn)
+        counters.reconcile(conn)
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('ANALYZE'))
+    source.dispose()
+    return copied
+
+
+
+
+def init_app(app):
+    @app.cli.command('copy-database')
+    @click.argument('source')
+    @click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows per COPY or INSERT batch.')
+    def copy_database_command(source, batch_size):
+        # SOURCE is a SQLite file such as instance/placement.db, or any SQLAlchemy URL
+        uri = source if '://' in source else f'sqlite:///{source}'
+        copied = copy_database(uri, batch_size, click.echo)
+        click.echo(f'Copied {sum(copied.values())} rows from {len(copied)} tables.')
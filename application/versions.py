@@ -0,0 +1,87 @@
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session, object_session
+from . import db
+from .models import StudentProfile, PlacementDrive, Application
+
+
+
+
+# A student's version changes whenever anything on their dashboard, history or drive board changes:
+# their applications, their profile, or a drive they applied to.
+
+
+
+
+def bump_students(conn, student_ids):
+    if student_ids:
+        conn.execute(update(StudentProfile)
+                     .where(StudentProfile.id.in_(sorted(student_ids)))
+                     .values(version=StudentProfile.version + 1))
+
+
+
+
+def bump_applicants(conn, drive_ids):
+    if drive_ids:
+        applicants = select(Application.student_id).where(Application.drive_id.in_(sorted(drive_ids)))
+        conn.execute(update(StudentProfile)
+                     .where(StudentProfile.id.in_(applicants))
+                     .values(version=StudentProfile.version + 1))
+
+
+
+
+def student_version(student_id):
+    return db.session.scalar(select(StudentProfile.version).where(StudentProfile.id == student_id))
+
+
+
+
+def pending(session, key):
+    return session.info.setdefault(key, set())
+
+
+
+
+def application_changed(mapper, connection, target):
+    pending(object_session(target), 'bumped_students').add(target.student_id)
+
+
+
+
+def drive_changed(mapper, connection, target):
+    pending(object_session(target), 'bumped_drives').add(target.id)
+
+
+
+
+def profile_changing(mapper, connection, target):
+    target.version = StudentProfile.version + 1
+
+
+
+
+for change in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Application, change, application_changed)
+event.listen(PlacementDrive, 'after_update', drive_changed)
+event.listen(StudentProfile, 'before_update', profile_changing)
+
+
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_bumps(session, flush_context):
+    students = session.info.pop('bumped_students', None)
+    drives = session.info.pop('bumped_drives', None)
+    if students or drives:
+        conn = session.connection()
+        bump_students(conn, students)
+        bump_applicants(conn, drives)
+
+
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_bumps(session, previous_transaction):
+    session.info.pop('bumped_students', None)
+    session.info.pop('bumped_drives', None)
@@ -0,0 +1,163 @@
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.login_storm import free_port, percentile, start_server
+
+
+# cheap hashes keep the 1,000 logins out of the measurement
+HASH_METHOD = 'pbkdf2:sha256:1'
+
+
+
+
+def seed(database_uri, students, cap):
+    from application import create_app, db
+    from application.migrations import upgrade
+    from application.models import User, CompanyProfile, StudentProfile, PlacementDrive
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'PASSWORD_HASH_METHOD': HASH_METHOD,
+                      'PASSWORD_HASH_WORKERS': 0, 'COUNTER_RECONCILE_SECONDS': 0})
+    with app.app_context():
+        upgrade()
+        company_user = User(email='company@bench.local', role='company')
+        company_user.set_password('burst')
+        db.session.add(company_user)
+        db.session.flush()
+        company = CompanyProfile(user_id=company_user.id, name='Burst', hr_contact='HR', approval_status='approved')
+        db.session.add(company)
+        db.session.flush()
+        drive = PlacementDrive(company_id=company.id, title='Burst', description='Burst', status='approved',
+                               deadline=datetime.now() + timedelta(days=1), max_applicants=cap)
+        db.session.add(drive)
+        for i in range(students):
+            user = User(email=f'burst{i}@bench.local', role='student', password_hash=company_user.password_hash)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=user.id, name=f'Burst {i}', student_id=f'BURST-{i}'))
+        db.session.commit()
+        return drive.id
+
+
+
+
+def verify(database_uri, drive_id):
+    from sqlalchemy import func, select
+    from application import create_app, db, counters
+    from application.models import Application
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'PASSWORD_HASH_WORKERS': 0,
+                      'COUNTER_RECONCILE_SECONDS': 0})
+    with app.app_context():
+        applications = db.session.scalar(select(func.count(Application.id)).where(Application.drive_id == drive_id))
+        distinct = db.session.scalar(select(func.count(func.distinct(Application.student_id)))
+                                     .where(Application.drive_id == drive_id))
+        return applications, distinct, counters.read()['applications']
+
+
+
+
+def login(port, i):
+    body = urllib.parse.urlencode({'email': f'burst{i}@bench.local', 'password': 'burst'})
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+
+
+def run_burst(port, drive_id, cookies, tabs):
+    requests = [(cookie, tab) for cookie in cookies for tab in range(tabs)]
+    barrier = threading.Barrier(len(requests))
+    results = [None] * len(requests)
+
+    def apply(n):
+        cookie, tab = requests[n]
+        barrier.wait()
+        started = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        conn.request('GET', f'/student/apply/{drive_id}', headers={'Cookie': cookie})
+        response = conn.getresponse()
+        response.read()
+        results[n] = (response.status, response.getheader('Location', ''), time.perf_counter() - started)
+
+    threads = [threading.Thread(target=apply, args=(n,)) for n in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = max(elapsed for status, location, elapsed in results)
+    return results, elapsed
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent applications to one drive: correctness and latency.')
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--cap', type=int, default=None, help='max_applicants for the drive')
+    parser.add_argument('--tabs', type=int, default=2, help='simultaneous apply requests per student')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='apply-burst-')
+    database_uri = f'sqlite:///{os.path.join(directory, "burst.db")}'
+    drive_id = seed(database_uri, args.students, args.cap)
+
+    config = {
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'PASSWORD_HASH_METHOD': HASH_METHOD,
+        'PASSWORD_HASH_WORKERS': 0,
+        'IDENTITY_EPOCH_FILE': os.path.join(directory, 'identity.epoch'),
+        'DRIVES_EPOCH_FILE': os.path.join(directory, 'drives.epoch'),
+    }
+    port = free_port()
+    server = start_server(config, port, args.workers, args.threads)
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            cookies = list(pool.map(lambda i: login(port, i), range(args.students)))
+        results, elapsed = run_burst(port, drive_id, cookies, args.tabs)
+    finally:
+        server.terminate()
+        server.wait()
+
+    applications, distinct, counter = verify(database_uri, drive_id)
+    latencies = [elapsed for status, location, elapsed in results]
+    expected = min(args.students, args.cap) if args.cap else args.students
+    server_errors = sum(1 for status, location, elapsed in results if status >= 500)
+    correct = applications == distinct == expected and counter == applications and not server_errors
+    print(json.dumps({
+        'students': args.students,
+        'requests': len(results),
+        'cap': args.cap,
+        'accepted': sum(1 for status, location, elapsed in results if location.endswith('/student/history')),
+        'turned_away': sum(1 for status, location, elapsed in results if location.endswith('/student/drives')),
+        'server_errors': server_errors,
+        'applications': applications,
+        'correct': correct,
+        'requests_per_second': round(len(results) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1),
+    }))
+    if not correct:
+        sys.exit(1)
+
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.login_storm import percentile
+
+
+
+
+def make_app(directory, cache):
+    from application import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, "board.db")}',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1',
+        'PASSWORD_HASH_WORKERS': 0,
+        'COUNTER_RECONCILE_SECONDS': 0,
+        'IDENTITY_EPOCH_FILE': os.path.join(directory, 'identity.epoch'),
+        'DRIVES_EPOCH_FILE': os.path.join(directory, 'drives.epoch'),
+        'DRIVE_BOARD_CACHE': cache,
+    })
+
+
+
+
+def seed(app, drives, applied):
+    from application import db
+    from application.migrations import upgrade
+    from application.models import User, CompanyProfile, StudentProfile, PlacementDrive, Application
+
+    with app.app_context():
+        upgrade()
+        student_user = User(email='student@bench.local', role='student')
+        student_user.set_password('board')
+        db.session.add(student_user)
+        db.session.flush()
+        student = StudentProfile(user_id=student_user.id, name='Board Student', student_id='BOARD-1')
+        db.session.add(student)
+        companies = []
+        for i in range(max(1, drives // 10)):
+            user = User(email=f'company{i}@bench.local', role='company', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            company = CompanyProfile(user_id=user.id, name=f'Company {i}', hr_contact='HR', approval_status='approved')
+            db.session.add(company)
+            companies.append(company)
+        db.session.flush()
+        for i in range(drives):
+            drive = PlacementDrive(company_id=companies[i % len(companies)].id, title=f'Engineer {i}',
+                                   description='Build and run the placement platform. ' * 8,
+                                   eligibility='B.Tech, CGPA 7.0 and above', status='approved',
+                                   deadline=datetime.now() + timedelta(days=1 + i))
+            db.session.add(drive)
+            db.session.flush()
+            if i < applied:
+                db.session.add(Application(student_id=student.id, drive_id=drive.id))
+        db.session.commit()
+
+
+
+
+def measure(app, requests):
+    client = app.test_client()
+    client.post('/login', data={'email': 'student@bench.local', 'password': 'board'})
+    client.get('/student/drives')
+    latencies = []
+    for n in range(requests):
+        started = time.perf_counter()
+        response = client.get('/student/drives')
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Student drive board latency with and without the fragment cache.')
+    parser.add_argument('--drives', type=int, default=300)
+    parser.add_argument('--applied', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='drive-board-')
+    seed(make_app(directory, False), args.drives, args.applied)
+    for cache in (False, True):
+        result = measure(make_app(directory, cache), args.requests)
+        result['cache'] = cache
+        print(json.dumps(result), flush=True)
+
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+
+
+def seed(database_uri, users, method):
+    from application import create_app, db
+    from application.migrations import upgrade
+    from application.models import User, StudentProfile
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'PASSWORD_HASH_METHOD': method,
+                      'PASSWORD_HASH_WORKERS': 0})
+    with app.app_context():
+        upgrade()
+        password_hash = None
+        for i in range(users):
+            user = User(email=f'storm{i}@bench.local', role='student')
+            if password_hash is None:
+                user.set_password('storm')
+                password_hash = user.password_hash
+            user.password_hash = password_hash
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(StudentProfile(user_id=user.id, name=f'Storm {i}', student_id=f'STORM-{i}'))
+        db.session.commit()
+
+
+
+
+def start_server(config, port, workers, threads):
+    factory = f'application:create_app({config!r})'
+    process = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+         '--log-level', 'warning', factory],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/login')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+
+
+def run_storm(port, users, duration, login_threads, probe_threads):
+    stop = time.time() + duration
+    logins, rejected, probe_latencies = [], [], []
+    lock = threading.Lock()
+
+    def login(n):
+        i = n
+        while time.time() < stop:
+            body = urllib.parse.urlencode({'email': f'storm{i % users}@bench.local', 'password': 'storm'})
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            started = time.perf_counter()
+            conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            response.read()
+            with lock:
+                (logins if response.status == 302 else rejected).append(time.perf_counter() - started)
+            i += login_threads
+
+    def probe():
+        while time.time() < stop:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            started = time.perf_counter()
+            conn.request('GET', '/login')
+            conn.getresponse().read()
+            with lock:
+                probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login, args=(n,)) for n in range(login_threads)]
+    threads += [threading.Thread(target=probe) for n in range(probe_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'logins_per_second': round(len(logins) / duration, 2),
+        'login_p99_ms': round(percentile(logins, 99) * 1000, 1) if logins else None,
+        'logins_rejected_busy': len(rejected),
+        'probe_requests': len(probe_latencies),
+        'probe_p50_ms': round(percentile(probe_latencies, 50) * 1000, 1) if probe_latencies else None,
+        'probe_p99_ms': round(percentile(probe_latencies, 99) * 1000, 1) if probe_latencies else None,
+    }
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login storm: login throughput and page latency under load.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-threads', type=int, default=32)
+    parser.add_argument('--probe-threads', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--method', default='scrypt')
+    parser.add_argument('--hash-timeout', type=float, default=0.1)
+    parser.add_argument('--hash-workers', type=int, nargs='+', default=[0, 2],
+                        help='PASSWORD_HASH_WORKERS values to compare, 0 hashes on the request thread')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='login-storm-')
+    database_uri = f'sqlite:///{os.path.join(directory, "storm.db")}'
+    seed(database_uri, args.users, args.method)
+
+    results = []
+    for hash_workers in args.hash_workers:
+        config = {
+            'SQLALCHEMY_DATABASE_URI': database_uri,
+            'PASSWORD_HASH_METHOD': args.method,
+            'PASSWORD_HASH_WORKERS': hash_workers,
+            'PASSWORD_HASH_TIMEOUT': args.hash_timeout,
+            'IDENTITY_EPOCH_FILE': os.path.join(directory, 'identity.epoch'),
+        }
+        port = free_port()
+        server = start_server(config, port, args.workers, args.threads)
+        try:
+            result = run_storm(port, args.users, args.duration, args.login_threads, args.probe_threads)
+        finally:
+            server.terminate()
+            server.wait()
+        result['hash_workers'] = hash_workers
+        results.append(result)
+        print(json.dumps(result), flush=True)
+
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,478 @@
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.login_storm import percentile
+from benchmarks.synthetic_data import DEFAULTS, PASSWORD, PASSWORD_HASH_METHOD, generate
+
+
+
+
+BLUEPRINTS = ('auth', 'admin', 'company', 'student')
+EXPORT_REQUESTS = 3
+# routes that are expected to answer without touching the database: static forms, pages whose user comes from
+# the identity cache and reports served from their in-process cache
+QUERY_FREE = {
+    ('auth.index', 'GET'), ('auth.login', 'GET'), ('auth.logout', 'GET'), ('auth.register', 'GET'),
+    ('auth.register_company', 'GET'), ('auth.register_student', 'GET'), ('admin.import_students_csv', 'GET'),
+    ('admin.analytics_dashboard', 'GET'), ('admin.analytics_report', 'GET'), ('company.create_drive', 'GET'),
+    ('student.profile', 'GET'),
+}
+
+
+
+
+def make_app(directory, database_uri):
+    from application import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'PASSWORD_HASH_METHOD': PASSWORD_HASH_METHOD,
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_IMPORT_WORKERS': 0,
+        'COUNTER_RECONCILE_SECONDS': 0,
+        'CONDITIONAL_GET_FLUSH_SECONDS': 0,
+        'JOB_WORKERS': 0,
+        'DEADLINE_SWEEP_SECONDS': 0,
+        'ANALYTICS_REFRESH_SECONDS': 0,
+        'ARCHIVE_INTERVAL_SECONDS': 0,
+        'MAIL_BACKEND': 'memory',
+        'IDENTITY_EPOCH_FILE': os.path.join(directory, 'identity.epoch'),
+        'DRIVES_EPOCH_FILE': os.path.join(directory, 'drives.epoch'),
+        'ANALYTICS_EPOCH_FILE': os.path.join(directory, 'analytics.epoch'),
+    })
+
+
+
+
+def fixture_accounts(session, role, prefix, count):
+    from application.models import User
+    users = [User(email=f'{prefix}-{n}@bench.local', role=role) for n in range(count)]
+    for user in users:
+        user.set_password(PASSWORD)
+    session.add_all(users)
+    return users
+
+
+
+
+def fixture_companies(session, run, name, status, count):
+    from application.models import CompanyProfile
+    users = fixture_accounts(session, 'company', f'{name.lower().replace(" ", "-")}{run}', count)
+    companies = [CompanyProfile(user=user, name=f'{name} {run} {n}', hr_contact='Benchmark HR', website='',
+                                approval_status=status)
+                 for n, user in enumerate(users)]
+    session.add_all(companies)
+    return companies
+
+
+
+
+def applicant_drives(session, company_id, applicants):
+    # approved drives outside the measured company that are still open, have room for every benchmark applicant
+    # and admit the most of them, picked with the same index submissions uses; returns (academics, drive ids)
+    from sqlalchemy import func, or_, select
+    from application import eligibility
+    from application.models import PlacementDrive, Application
+
+    now = datetime.now()
+    applied = select(func.count(Application.id)).where(Application.drive_id == PlacementDrive.id).scalar_subquery()
+    rows = session.execute(
+        select(PlacementDrive.id, PlacementDrive.eligible_branches, PlacementDrive.graduation_year,
+               PlacementDrive.min_cgpa, PlacementDrive.max_backlogs)
+        .where(PlacementDrive.status == 'approved', PlacementDrive.deadline > now + timedelta(hours=1),
+               PlacementDrive.company_id != company_id,
+               or_(PlacementDrive.max_applicants.is_(None), PlacementDrive.max_applicants >= applied + applicants))
+    ).all()
+    index = eligibility.DriveIndex({row.id: eligibility.drive_criteria(row) for row in rows})
+    candidates = [(branch, year, 10.0, 0) for branch in eligibility.BRANCHES for year in (now.year, now.year + 1)]
+    academics = max(candidates, key=lambda student: bin(index.match(student)).count('1'))
+    drive_ids = index.drive_ids(index.match(academics))
+    if not drive_ids:
+        raise SystemExit('No open drive admits a benchmark applicant; generate more drives.')
+    return academics, drive_ids
+
+
+
+
+def pick_fixtures(app, run, count):
+    # the busiest rows, so each route is measured against the largest pages it serves. Routes that approve,
+    # reject, blacklist or delete accounts and drives get rows of their own, so they never touch the measured
+    # company or student, and student.apply gets a new applicant per request so each one really inserts.
+    from sqlalchemy import desc, func, select
+    from application import db
+    from application.models import User, CompanyProfile, StudentProfile, PlacementDrive, Application, Job
+
+    with app.app_context():
+        session = db.session
+        drive_counts = (select(PlacementDrive.company_id, func.count(PlacementDrive.id).label('drives'))
+                        .join(CompanyProfile, CompanyProfile.id == PlacementDrive.company_id)
+                        .where(PlacementDrive.status == 'approved', CompanyProfile.approval_status == 'approved')
+                        .group_by(PlacementDrive.company_id).order_by(desc('drives')).limit(1))
+        company_id = session.execute(drive_counts).first()[0]
+        company_drives = session.scalars(select(PlacementDrive.id).where(PlacementDrive.company_id == company_id,
+                                                                         PlacementDrive.status == 'approved')
+                                         .order_by(PlacementDrive.id)).all()
+        drive_id = session.execute(select(Application.drive_id, func.count(Application.id).label('n'))
+                                   .where(Application.drive_id.in_(company_drives))
+                                   .group_by(Application.drive_id).order_by(desc('n')).limit(1)).first()[0]
+        student_id = session.execute(select(Application.student_id, func.count(Application.id).label('n'))
+                                     .join(StudentProfile, StudentProfile.id == Application.student_id)
+                                     .join(User, User.id == StudentProfile.user_id)
+                                     .where(User.is_active.is_(True))
+                                     .group_by(Application.student_id).order_by(desc('n')).limit(1)).first()[0]
+        student = session.get(StudentProfile, student_id)
+        other_students = session.scalars(select(StudentProfile.id).where(StudentProfile.id != student_id)
+                                         .order_by(desc(StudentProfile.id)).limit(count)).all()
+        academics, open_drives = applicant_drives(session, company_id, count)
+
+        pending_companies = fixture_companies(session, run, 'Pending Co', 'pending', count)
+        other_companies = fixture_companies(session, run, 'Listed Co', 'approved', count)
+        [owner] = fixture_companies(session, run, 'Drive Owner Co', 'approved', 1)
+        deadline = datetime.now() + timedelta(days=30)
+        pending_drives = [PlacementDrive(company=owner, title=f'Pending Drive {run} {n}', deadline=deadline,
+                                         description='Waiting for approval.', status='pending')
+                          for n in range(count)]
+        applicants = [StudentProfile(user=user, name=f'Applicant {n}', student_id=f'APP-{run}-{n}',
+                                     branch=academics[0], graduation_year=academics[1], cgpa=academics[2],
+                                     backlogs=academics[3])
+                      for n, user in enumerate(fixture_accounts(session, 'student', f'applicant{run}', count))]
+        failed_jobs = [Job(name='delete_user', payload='{"user_id": 0}', status='failed', attempts=5,
+                           last_error='RuntimeError: benchmark') for n in range(count)]
+        session.add_all(pending_drives + applicants + failed_jobs)
+        session.commit()
+        return {
+            'company': company_id,
+            'company_email': session.scalar(select(User.email).join(CompanyProfile)
+                                            .where(CompanyProfile.id == company_id)),
+            'drive': drive_id,
+            'application': session.scalar(select(Application.id).where(Application.drive_id == drive_id).limit(1)),
+            'student': student_id,
+            'student_email': session.scalar(select(User.email).join(StudentProfile)
+                                            .where(StudentProfile.id == student_id)),
+            'student_academics': {'branch': student.branch or '', 'graduation_year': student.graduation_year or '',
+                                  'cgpa': '' if student.cgpa is None else student.cgpa,
+                                  'backlogs': student.backlogs},
+            'spare_drives': [id for id in company_drives if id != drive_id] or [drive_id],
+            'applicants': [(applicant.user.email, open_drives[n % len(open_drives)])
+                           for n, applicant in enumerate(applicants)],
+            'pending_companies': [company.id for company in pending_companies],
+            'pending_drives': [drive.id for drive in pending_drives],
+            'other_companies': [company.id for company in other_companies],
+            'other_students': other_students,
+            'failed_jobs': [job.id for job in failed_jobs],
+        }
+
+
+
+
+def import_csv(run, i):
+    rows = ['email,password,name,student_id'] + [f'import{run}-{i}-{n}@bench.local,{PASSWORD},Imported {n},'
+                                                 f'IMP-{run}-{i}-{n}' for n in range(20)]
+    return {'file': (io.BytesIO('\r\n'.join(rows).encode()), 'students.csv')}
+
+
+
+
+def route_table(ids, run):
+    # (endpoint, role, method, path(i), data(i), requests); role None is a logged-out client, 'fresh' a new one
+    # per request and 'applicant' a different new student per request. Routes that change state cycle through
+    # spare rows so the fixtures stay usable.
+    def cycle(rows):
+        return lambda i: rows[i % len(rows)]
+
+    spare = cycle(ids['spare_drives'])
+    pending_company, pending_drive = cycle(ids['pending_companies']), cycle(ids['pending_drives'])
+    other_company, other_student = cycle(ids['other_companies']), cycle(ids['other_students'])
+    failed_job = cycle(ids['failed_jobs'])
+    deadline = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%dT%H:%M')
+    drive_form = {'title': 'Benchmark Engineer', 'description': 'Measure the portal.', 'eligibility': 'Any branch',
+                  'deadline': deadline}
+    return [
+        ('auth.index', None, 'GET', lambda i: '/', None, None),
+        ('auth.login', None, 'GET', lambda i: '/login', None, None),
+        ('auth.login', 'fresh', 'POST', lambda i: '/login',
+         lambda i: {'email': ids['student_email'], 'password': PASSWORD}, None),
+        ('auth.logout', 'fresh-student', 'GET', lambda i: '/logout', None, None),
+        ('auth.register', None, 'GET', lambda i: '/register', None, None),
+        ('auth.register_company', None, 'GET', lambda i: '/register/company', None, None),
+        ('auth.register_company', 'fresh', 'POST', lambda i: '/register/company',
+         lambda i: {'email': f'newco{run}-{i}@bench.local', 'password': PASSWORD, 'name': f'New Co {run} {i}',
+                    'hr_contact': 'HR', 'website': ''}, None),
+        ('auth.register_student', None, 'GET', lambda i: '/register/student', None, None),
+        ('auth.register_student', 'fresh', 'POST', lambda i: '/register/student',
+         lambda i: {'email': f'newstudent{run}-{i}@bench.local', 'password': PASSWORD, 'name': 'New Student',
+                    'student_id': f'NEW-{run}-{i}', 'contact': '', 'resume_bio': ''}, None),
+        ('admin.dashboard', 'admin', 'GET', lambda i: '/admin/dashboard', None, None),
+        ('admin.companies', 'admin', 'GET', lambda i: '/admin/companies', None, None),
+        ('admin.companies', 'admin', 'GET', lambda i: '/admin/companies?search=quantum', None, None),
+        ('admin.students', 'admin', 'GET', lambda i: '/admin/students', None, None),
+        ('admin.students', 'admin', 'GET', lambda i: '/admin/students?search=sharma', None, None),
+        ('admin.student_academics', 'admin', 'GET', lambda i: f'/admin/students/{other_student(i)}/academics',
+         None, None),
+        ('admin.student_academics', 'admin', 'POST', lambda i: f'/admin/students/{other_student(i)}/academics',
+         lambda i: {'branch': 'Computer Science', 'graduation_year': '2026', 'cgpa': '8.1', 'backlogs': '0'}, None),
+        ('admin.import_students_csv', 'admin', 'GET', lambda i: '/admin/students/import', None, None),
+        ('admin.import_students_csv', 'admin', 'POST', lambda i: '/admin/students/import',
+         lambda i: import_csv(run, i), None),
+        ('admin.drives', 'admin', 'GET', lambda i: '/admin/drives', None, None),
+        ('admin.export_placements', 'admin', 'GET', lambda i: '/admin/reports/placements.csv', None,
+         EXPORT_REQUESTS),
+        ('admin.conditional_get_metrics', 'admin', 'GET', lambda i: '/admin/metrics/conditional-get', None, None),
+        ('admin.approvals', 'admin', 'GET', lambda i: '/admin/approvals', None, None),
+        ('admin.analytics_dashboard', 'admin', 'GET', lambda i: '/admin/analytics', None, None),
+        ('admin.analytics_report', 'admin', 'GET', lambda i: '/admin/analytics/companies.json', None, None),
+        ('admin.analytics_report', 'admin', 'GET', lambda i: '/admin/analytics/drives.json', None, None),
+        ('admin.approve_company', 'admin', 'GET', lambda i: f'/admin/approve/company/{pending_company(i)}', None,
+         None),
+        ('admin.reject_company', 'admin', 'GET', lambda i: f'/admin/reject/company/{pending_company(i)}', None,
+         None),
+        ('admin.approve_drive', 'admin', 'GET', lambda i: f'/admin/approve/drive/{pending_drive(i)}', None, None),
+        ('admin.reject_drive', 'admin', 'GET', lambda i: f'/admin/reject/drive/{pending_drive(i)}', None, None),
+        ('admin.blacklist_company', 'admin', 'GET', lambda i: f'/admin/blacklist/company/{other_company(i)}',
+         None, None),
+        ('admin.activate_company', 'admin', 'GET', lambda i: f'/admin/activate/company/{other_company(i)}',
+         None, None),
+        ('admin.blacklist_student', 'admin', 'GET', lambda i: f'/admin/blacklist/student/{other_student(i)}',
+         None, None),
+        ('admin.activate_student', 'admin', 'GET', lambda i: f'/admin/activate/student/{other_student(i)}',
+         None, None),
+        ('admin.delete_company', 'admin', 'GET', lambda i: f'/admin/delete/company/{other_company(i)}', None,
+         None),
+        ('admin.delete_student', 'admin', 'GET', lambda i: f'/admin/delete/student/{other_student(i)}', None,
+         None),
+        ('admin.retry_job', 'admin', 'GET', lambda i: f'/admin/jobs/{failed_job(i)}/retry', None, None),
+        ('company.dashboard', 'company', 'GET', lambda i: '/company/dashboard', None, None),
+        ('company.create_drive', 'company', 'GET', lambda i: '/company/drive/create', None, None),
+        ('company.create_drive', 'company', 'POST', lambda i: '/company/drive/create', lambda i: drive_form, None),
+        ('company.edit_drive', 'company', 'GET', lambda i: f'/company/drive/edit/{ids["drive"]}', None, None),
+        ('company.edit_drive', 'company', 'POST', lambda i: f'/company/drive/edit/{ids["drive"]}',
+         lambda i: dict(drive_form, title='Busiest Drive'), None),
+        ('company.applicants', 'company', 'GET', lambda i: f'/company/applicants/{ids["drive"]}', None, None),
+        ('company.export_applicants', 'company', 'GET', lambda i: f'/company/applicants/{ids["drive"]}/export.csv',
+         None, EXPORT_REQUESTS),
+        ('company.export_applications', 'company', 'GET', lambda i: '/company/applications/export.xlsx', None,
+         EXPORT_REQUESTS),
+        ('company.update_application', 'company', 'POST',
+         lambda i: f'/company/application/{ids["application"]}/update',
+         lambda i: {'status': ('shortlisted', 'applied')[i % 2]}, None),
+        ('company.update_applications', 'company', 'POST', lambda i: f'/company/applicants/{ids["drive"]}/status',
+         lambda i: {'scope': 'filter', 'from_status': ('applied', 'shortlisted')[i % 2],
+                    'status': ('shortlisted', 'applied')[i % 2]}, None),
+        ('company.close_drive', 'company', 'GET', lambda i: f'/company/drive/close/{spare(i)}', None, None),
+        ('company.delete_drive', 'company', 'GET', lambda i: f'/company/drive/delete/{spare(i)}', None, None),
+        ('student.dashboard', 'student', 'GET', lambda i: '/student/dashboard', None, None),
+        ('student.profile', 'student', 'GET', lambda i: '/student/profile', None, None),
+        ('student.profile', 'student', 'POST', lambda i: '/student/profile',
+         lambda i: {'name': 'Benchmark Student', 'contact': '9000000000', 'resume_bio': 'Measured.',
+                    **ids['student_academics']}, None),
+        ('student.drives', 'student', 'GET', lambda i: '/student/drives', None, None),
+        ('student.drives', 'student', 'GET', lambda i: '/student/drives?search=engineer', None, None),
+        ('student.apply', 'applicant', 'GET', lambda i: f'/student/apply/{ids["applicants"][i][1]}', None, None),
+        ('student.history', 'student', 'GET', lambda i: '/student/history', None, None),
+    ]
+
+
+
+
+def missing_routes(app, table):
+    covered = {entry[0] for entry in table}
+    return sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                  if rule.endpoint.split('.')[0] in BLUEPRINTS and rule.endpoint not in covered)
+
+
+
+
+def consume(response):
+    # drain streamed bodies chunk by chunk, as a server would, instead of buffering them with get_data()
+    size = sum(len(chunk) for chunk in response.iter_encoded())
+    response.close()
+    return size
+
+
+
+
+def logged_in(app, email):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': PASSWORD})
+    assert response.status_code == 302, f'could not log in as {email}'
+    return client
+
+
+
+
+def measure(app, table, ids, requests):
+    from sqlalchemy import event
+    from application import db
+
+    with app.app_context():
+        engine = db.engine
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', count)
+    clients = {
+        None: app.test_client(),
+        'admin': logged_in(app, 'admin@bench.local'),
+        'company': logged_in(app, ids['company_email']),
+        'student': logged_in(app, ids['student_email']),
+    }
+
+    def client_for(role, i):
+        if role == 'fresh':
+            return app.test_client()
+        if role == 'fresh-student':
+            return logged_in(app, ids['student_email'])
+        if role == 'applicant':
+            return logged_in(app, ids['applicants'][i][0])
+        return clients[role]
+
+    results = []
+    for endpoint, role, method, path, data, limit in table:
+        latencies, counts, codes, sizes = [], [], {}, []
+        login_redirects = 0
+        runs = min(requests, limit or requests)
+        # one untimed request under tracemalloc for peak memory, then the timed ones
+        client = client_for(role, runs)
+        gc.collect()
+        tracemalloc.start()
+        consume(client.open(path(runs), method=method, data=data(runs) if data else None))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        for i in range(runs):
+            client = client_for(role, i)
+            payload = data(i) if data else None
+            statements[0] = 0
+            started = time.perf_counter()
+            response = client.open(path(i), method=method, data=payload)
+            sizes.append(consume(response))
+            latencies.append(time.perf_counter() - started)
+            counts.append(statements[0])
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+            if response.status_code in (301, 302, 303, 307, 308) \
+                    and urlsplit(response.headers.get('Location', '')).path == '/login':
+                login_redirects += 1
+        results.append({
+            'endpoint': endpoint,
+            'method': method,
+            'path': path(0),
+            'requests': runs,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+            'statements': round(sum(counts) / len(counts), 1),
+            'min_statements': min(counts),
+            'max_statements': max(counts),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'response_kb': round(max(sizes) / 1024, 1),
+            'status_codes': {str(code): n for code, n in sorted(codes.items())},
+            'login_redirects': login_redirects,
+        })
+        print(json.dumps(results[-1]), flush=True)
+    event.remove(engine, 'before_cursor_execute', count)
+    return results
+
+
+
+
+def compare(results, baseline_file):
+    with open(baseline_file) as f:
+        baseline = {(r['endpoint'], r['method'], r['path']): r for r in json.load(f)['routes']}
+    print(f'{"route":<60} {"p50 ms":^30} {"statements":^16}')
+    for result in results:
+        before = baseline.get((result['endpoint'], result['method'], result['path']))
+        if before is None:
+            continue
+        change = (result['p50_ms'] / before['p50_ms'] - 1) * 100 if before['p50_ms'] else 0
+        print(f'{result["method"] + " " + result["path"]:<60} {before["p50_ms"]:>9.2f} -> {result["p50_ms"]:<9.2f}'
+              f'{change:+6.0f}%   {before["statements"]:>6} -> {result["statements"]}')
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-route latency, SQL statement counts and peak memory.')
+    parser.add_argument('--database', help='Database made by synthetic_data.py; copied before the run. '
+                                           'Generated at --scale when omitted.')
+    parser.add_argument('--database-url', help='Run against this empty database, e.g. PostgreSQL, instead of a '
+                                               'SQLite copy; it is filled at --scale.')
+    parser.add_argument('--scale', type=float, default=0.02, help='Synthetic data volume when no --database.')
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+    parser.add_argument('--output', default='route_benchmark.json', help='Where to save the results.')
+    parser.add_argument('--compare', metavar='BASELINE', help='Earlier --output file to compare against.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='route-benchmark-')
+    database = os.path.join(directory, 'routes.db')
+    if args.database and not args.database_url:
+        shutil.copyfile(args.database, database)
+    app = make_app(directory, args.database_url or f'sqlite:///{database}')
+    with app.app_context():
+        from application import db
+        from application.migrations import upgrade
+        upgrade()
+        backend = db.engine.dialect.name
+    if args.database_url or not args.database:
+        generate(app, **{name: max(1, int(default * args.scale)) for name, default in DEFAULTS.items()})
+    with app.app_context():
+        from application import counters
+        volumes = counters.read()
+
+    run = int(time.time())
+    ids = pick_fixtures(app, run, args.requests + 1)
+    table = route_table(ids, run)
+    missing = missing_routes(app, table)
+    if missing:
+        raise SystemExit(f'No benchmark entry for: {", ".join(missing)}')
+
+    results = measure(app, table, ids, args.requests)
+    report = {
+        'started_at': datetime.fromtimestamp(run).isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'backend': backend,
+        'database': args.database,
+        'rows': volumes,
+        'requests_per_route': args.requests,
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved {len(results)} routes to {args.output}', flush=True)
+    if args.compare:
+        compare(results, args.compare)
+    checks = [
+        ('Server errors from', lambda r: any(int(code) >= 500 for code in r['status_codes'])),
+        # a signed-in client sent back to the login page measured the redirect, not the route
+        ('Redirected to /login from', lambda r: r['login_redirects'] and not r['endpoint'].startswith('auth.')),
+        ('No SQL statements from', lambda r: r['min_statements'] == 0
+                                             and (r['endpoint'], r['method']) not in QUERY_FREE),
+    ]
+    failures = []
+    for label, failed in checks:
+        routes = [f'{r["method"]} {r["path"]}' for r in results if failed(r)]
+        if routes:
+            failures.append(f'{label}: {", ".join(routes)}')
+    if failures:
+        raise SystemExit('\n'.join(failures))
+
+
+
+
+if __name__ == '__main__':
+    main()
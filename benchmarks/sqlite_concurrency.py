@@ -0,0 +1,167 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+PROFILES = {
+    'sqlite-defaults': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': 0,
+                        'SQLITE_CACHE_SIZE_KB': 2000},
+    'production': {},
+}
+
+
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else None
+
+
+
+
+def make_app(database_uri, profile):
+    from application import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'PASSWORD_HASH_WORKERS': 0,
+                       'COUNTER_RECONCILE_SECONDS': 0, **PROFILES[profile]})
+
+
+
+
+def seed(database_uri, profile, students):
+    from application import db
+    from application.migrations import upgrade
+    from application.models import User, CompanyProfile, StudentProfile, PlacementDrive, Application
+
+    app = make_app(database_uri, profile)
+    with app.app_context():
+        upgrade()
+        company_user = User(email='company@bench.local', role='company', password_hash='x')
+        db.session.add(company_user)
+        db.session.flush()
+        company = CompanyProfile(user_id=company_user.id, name='Bench', hr_contact='HR', approval_status='approved')
+        db.session.add(company)
+        db.session.flush()
+        drive = PlacementDrive(company_id=company.id, title='Bench', description='Bench',
+                               deadline=datetime.now() + timedelta(days=30), status='approved')
+        db.session.add(drive)
+        db.session.flush()
+        for i in range(students):
+            user = User(email=f's{i}@bench.local', role='student', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            student = StudentProfile(user_id=user.id, name=f'S{i}', student_id=f'S{i}')
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(Application(student_id=student.id, drive_id=drive.id))
+        db.session.commit()
+        return drive.id
+
+
+
+
+def writer(database_uri, profile, drive_id, duration, results):
+    from sqlalchemy import text
+    from application import db
+
+    app = make_app(database_uri, profile)
+    commits = errors = 0
+    statuses = ['applied', 'shortlisted']
+    with app.app_context():
+        stop = time.time() + duration
+        while time.time() < stop:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text('UPDATE applications SET status = :status WHERE drive_id = :drive'),
+                                 {'status': statuses[commits % 2], 'drive': drive_id})
+                commits += 1
+            except Exception:
+                errors += 1
+    results.put(('writer', commits, errors, []))
+
+
+
+
+def reader(database_uri, profile, students, duration, results):
+    from sqlalchemy import text
+    from application import db
+
+    app = make_app(database_uri, profile)
+    latencies, errors = [], 0
+    with app.app_context():
+        stop = time.time() + duration
+        i = 0
+        while time.time() < stop:
+            started = time.perf_counter()
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text('SELECT a.id, a.status, d.title FROM applications a '
+                                      'JOIN placement_drives d ON d.id = a.drive_id '
+                                      'WHERE a.student_id = :student ORDER BY a.applied_date DESC'),
+                                 {'student': i % students + 1}).all()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+            i += 1
+    results.put(('reader', len(latencies), errors, latencies))
+
+
+
+
+def run(profile, students, writers, readers, duration, base_dir=None):
+    directory = tempfile.mkdtemp(prefix='sqlite-concurrency-', dir=base_dir)
+    database_uri = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    drive_id = seed(database_uri, profile, students)
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=writer, args=(database_uri, profile, drive_id, duration, results))
+                 for n in range(writers)]
+    processes += [context.Process(target=reader, args=(database_uri, profile, students, duration, results))
+                  for n in range(readers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for process in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [l for kind, count, errors, values in collected if kind == 'reader' for l in values]
+    return {
+        'profile': profile,
+        'writer_commits': sum(count for kind, count, errors, values in collected if kind == 'writer'),
+        'writer_errors': sum(errors for kind, count, errors, values in collected if kind == 'writer'),
+        'reads': len(latencies),
+        'read_errors': sum(errors for kind, count, errors, values in collected if kind == 'reader'),
+        'read_p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'read_p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        'read_max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+        'reads_over_10ms': sum(1 for l in latencies if l > 0.01),
+    }
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reader latency while writers commit, per SQLite engine profile.')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--writers', type=int, default=1)
+    parser.add_argument('--readers', type=int, default=3)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--dir', help='directory for the scratch database, use a real disk to include fsync cost')
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        print(json.dumps(run(profile, args.students, args.writers, args.readers, args.duration, args.dir)), flush=True)
+
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+
+PASSWORD = 'bench'
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Ananya', 'Vihaan', 'Saanvi', 'Arjun', 'Meera', 'Kabir', 'Riya',
+               'Rohan', 'Kavya', 'Aditya', 'Nisha', 'Karan', 'Pooja', 'Siddharth', 'Tara', 'Dev', 'Zoya']
+LAST_NAMES = ['Sharma', 'Iyer', 'Patel', 'Reddy', 'Gupta', 'Nair', 'Singh', 'Menon', 'Das', 'Joshi',
+              'Kulkarni', 'Bose', 'Chopra', 'Rao', 'Verma', 'Pillai', 'Mehta', 'Sen', 'Kapoor', 'Shah']
+SKILLS = ['Python', 'Java', 'C++', 'SQL', 'React', 'embedded systems', 'CAD', 'data analysis', 'machine learning',
+          'cloud infrastructure', 'VLSI', 'structural design', 'networking', 'Go', 'Kubernetes']
+COMPANY_WORDS = ['Apex', 'Blue', 'Core', 'Delta', 'Edge', 'Fusion', 'Global', 'Helix', 'Infinity', 'Nova',
+                 'Orbit', 'Prime', 'Quantum', 'Vertex', 'Zenith']
+COMPANY_SUFFIXES = ['Systems', 'Technologies', 'Labs', 'Solutions', 'Analytics', 'Networks', 'Engineering',
+                    'Consulting', 'Dynamics', 'Software']
+ROLES = ['Software Engineer', 'Data Analyst', 'Graduate Engineer Trainee', 'Design Engineer', 'Product Analyst',
+         'Site Engineer', 'Firmware Engineer', 'Cloud Associate', 'QA Engineer', 'Business Analyst']
+
+DEFAULTS = {'students': 50000, 'companies': 500, 'drives': 5000, 'applications': 1000000}
+
+
+
+
+def company_status(rng):
+    return rng.choices(['approved', 'pending', 'rejected'], weights=[90, 7, 3])[0]
+
+
+
+
+def drive_status(rng):
+    return rng.choices(['approved', 'closed', 'pending', 'rejected'], weights=[40, 50, 8, 2])[0]
+
+
+
+
+def application_status(rng, drive_status):
+    if drive_status == 'closed':
+        return rng.choices(['applied', 'shortlisted', 'selected', 'rejected'], weights=[10, 15, 10, 65])[0]
+    return rng.choices(['applied', 'shortlisted', 'rejected'], weights=[80, 12, 8])[0]
+
+
+
+
+def allocate(total, weights, caps):
+    # share `total` out in proportion to `weights`; what a capped drive cannot take goes to the others
+    counts = [0] * len(weights)
+    uncapped = [i for i in range(len(weights)) if caps[i] > 0]
+    while total > 0 and uncapped:
+        share = total / sum(weights[i] for i in uncapped)
+        for i in uncapped:
+            extra = min(caps[i] - counts[i], max(1, round(weights[i] * share)), total)
+            counts[i] += extra
+            total -= extra
+            if total == 0:
+                break
+        uncapped = [i for i in uncapped if counts[i] < caps[i]]
+    return counts
+
+
+
+
+def batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+
+
+def generate(app, students, companies, drives, applications, seed=42, batch_size=10000):
+    from sqlalchemy import func, insert, select
+    from application import db, analytics, counters, search, transfer
+    from application.eligibility import BRANCHES
+    from application.models import User, CompanyProfile, StudentProfile, PlacementDrive, Application
+    from application.passwords import hash_password
+
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    season_start = now - timedelta(days=180)
+    timings = {}
+
+    with app.app_context():
+        # every account shares one hash, made with the app's PASSWORD_HASH_METHOD
+        password_hash = hash_password(PASSWORD)
+        with db.engine.begin() as conn:
+            if conn.scalar(select(func.count(User.id))):
+                raise SystemExit('The database already has users; generate into an empty database.')
+
+            started = time.perf_counter()
+            users = [{'id': 1, 'email': 'admin@bench.local', 'password_hash': password_hash, 'role': 'admin',
+                      'is_active': True, 'created_at': season_start}]
+            company_user_ids = range(2, 2 + companies)
+            student_user_ids = range(2 + companies, 2 + companies + students)
+            for n, user_id in enumerate(company_user_ids):
+                users.append({'id': user_id, 'email': f'company{n}@bench.local', 'password_hash': password_hash,
+                              'role': 'company', 'is_active': True, 'created_at': season_start})
+            for n, user_id in enumerate(student_user_ids):
+                users.append({'id': user_id, 'email': f'student{n}@bench.local', 'password_hash': password_hash,
+                              'role': 'student', 'is_active': rng.random() > 0.01,
+                              'created_at': season_start + timedelta(minutes=rng.randrange(60 * 24 * 30))})
+            for chunk in batches(users, batch_size):
+                conn.execute(insert(User), chunk)
+
+            company_rows = [{'id': n + 1, 'user_id': user_id,
+                             'name': f'{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)} {n}',
+                             'hr_contact': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                             'website': f'https://company{n}.example.com', 'approval_status': company_status(rng)}
+                            for n, user_id in enumerate(company_user_ids)]
+            conn.execute(insert(CompanyProfile), company_rows)
+
+            student_rows = []
+            graduation_years = [now.year, now.year + 1]
+            for n, user_id in enumerate(student_user_ids):
+                branch = rng.choice(BRANCHES)
+                student_rows.append({
+                    'id': n + 1, 'user_id': user_id,
+                    'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    'student_id': f'STU{n:07d}', 'contact': f'9{rng.randrange(10 ** 9):09d}',
+                    'resume_bio': f'{branch} student skilled in {", ".join(rng.sample(SKILLS, 3))}.',
+                    'branch': branch, 'graduation_year': rng.choice(graduation_years),
+                    'cgpa': round(min(10.0, max(5.0, rng.gauss(7.4, 0.9))), 2),
+                    'backlogs': rng.choices([0, 1, 2, 3], weights=[75, 13, 8, 4])[0],
+                    'version': 0,
+                })
+            for chunk in batches(student_rows, batch_size):
+                conn.execute(insert(StudentProfile), chunk)
+            timings['users_seconds'] = round(time.perf_counter() - started, 2)
+
+            started = time.perf_counter()
+            hiring = [row['id'] for row in company_rows if row['approval_status'] == 'approved'] \
+                or [row['id'] for row in company_rows]
+            drive_rows = []
+            for n in range(drives):
+                status = drive_status(rng)
+                created_at = season_start + timedelta(minutes=rng.randrange(60 * 24 * 170))
+                if status == 'closed':
+                    deadline = created_at + timedelta(days=rng.randint(3, 20))
+                    deadline = min(deadline, now - timedelta(hours=1))
+                else:
+                    deadline = now + timedelta(days=rng.randint(1, 60), minutes=rng.randrange(1440))
+                role = rng.choice(ROLES)
+                branches = rng.sample(BRANCHES, rng.randint(2, 4)) if rng.random() < 0.7 else None
+                drive_rows.append({
+                    'id': n + 1, 'company_id': rng.choice(hiring), 'title': f'{role} {n}',
+                    'description': f'Join us as a {role}. You will work with {", ".join(rng.sample(SKILLS, 4))}.',
+                    'eligibility': rng.choice(['', 'Strong communication skills.', 'Willing to relocate.']),
+                    'eligible_branches': ','.join(branches) if branches else None,
+                    'graduation_year': rng.choice([None, None, now.year, now.year + 1]),
+                    'min_cgpa': rng.choice([None, 6.0, 6.5, 7.0, 7.5, 8.0]),
+                    'max_backlogs': rng.choice([None, 0, 0, 1, 2]),
+                    'deadline': deadline, 'status': status,
+                    'max_applicants': rng.choice([None] * 9 + [rng.randint(100, 1000)]),
+                    'created_at': created_at,
+                })
+            conn.execute(insert(PlacementDrive), drive_rows)
+            timings['drives_seconds'] = round(time.perf_counter() - started, 2)
+
+            # a few popular drives take most applications; each drive draws distinct students
+            started = time.perf_counter()
+            open_to_applicants = [row for row in drive_rows if row['status'] in ('approved', 'closed')]
+            weights = [rng.paretovariate(1.5) for row in open_to_applicants]
+            caps = [min(students, row['max_applicants'] or students) for row in open_to_applicants]
+            application_id = 1
+            pending_rows = []
+            for row, count in zip(open_to_applicants, allocate(applications, weights, caps)):
+                window = max(60, int((min(row['deadline'], now) - row['created_at']).total_seconds()))
+                for student_id in rng.sample(range(1, students + 1), count):
+                    status = application_status(rng, row['status'])
+                    applied_date = row['created_at'] + timedelta(seconds=rng.randrange(window))
+                    # decided up to two weeks after applying, derived from the id so the rng sequence is unchanged
+                    decided_at = None if status == 'applied' \
+                        else min(now, applied_date + timedelta(hours=application_id * 7919 % 336))
+                    pending_rows.append({
+                        'id': application_id, 'student_id': student_id, 'drive_id': row['id'],
+                        'status': status, 'applied_date': applied_date, 'decided_at': decided_at,
+                    })
+                    application_id += 1
+                if len(pending_rows) >= batch_size:
+                    conn.execute(insert(Application), pending_rows)
+                    pending_rows = []
+            if pending_rows:
+                conn.execute(insert(Application), pending_rows)
+            timings['applications_seconds'] = round(time.perf_counter() - started, 2)
+
+            started = time.perf_counter()
+            if search.supported(conn):
+                search.rebuild(conn)
+            counters.reconcile(conn)
+            analytics.rebuild(conn)
+            transfer.reset_sequences(conn)
+            timings['indexes_seconds'] = round(time.perf_counter() - started, 2)
+    return {'students': students, 'companies': companies, 'drives': drives, 'applications': application_id - 1,
+            'seed': seed, **timings}
+
+
+
+
+def make_app(database):
+    from application import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': database if '://' in database else f'sqlite:///{os.path.abspath(database)}',
+        'PASSWORD_HASH_METHOD': PASSWORD_HASH_METHOD,
+        'PASSWORD_HASH_WORKERS': 0,
+        'COUNTER_RECONCILE_SECONDS': 0,
+        'JOB_WORKERS': 0,
+        'DEADLINE_SWEEP_SECONDS': 0,
+        'ANALYTICS_REFRESH_SECONDS': 0,
+        'ARCHIVE_INTERVAL_SECONDS': 0,
+    })
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill an empty portal database with reproducible synthetic data.')
+    parser.add_argument('database', help='SQLite file to create, or the URL of an empty database')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply every default volume by this factor.')
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=int, help=f'Default {default:,} times --scale.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    volumes = {name: getattr(args, name) or max(1, int(default * args.scale)) for name, default in DEFAULTS.items()}
+    app = make_app(args.database)
+    with app.app_context():
+        from application.migrations import upgrade
+        upgrade()
+    started = time.perf_counter()
+    result = generate(app, seed=args.seed, batch_size=args.batch_size, **volumes)
+    result['total_seconds'] = round(time.perf_counter() - started, 2)
+    print(json.dumps(result))
+
+
+
+
+if __name__ == '__main__':
+    main()
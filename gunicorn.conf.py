@@ -0,0 +1,25 @@
+import os
+
+
+
+
+# gunicorn reads this file from the working directory. Pages run on threaded workers: the password hashing pool
+# (PASSWORD_HASH_MAX_PENDING), the connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW) and SQLite's busy timeout
+# are all sized for a few request threads per process. GUNICORN_WORKER_CLASS=gevent is for the second gunicorn
+# that docker-compose.yml runs to serve /events only, behind deploy/nginx.conf.
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:7860')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gthread':
+    # an open /events stream holds a request thread, so leave at least half of each worker's threads to pages;
+    # browsers past the limit get missed events replayed and reconnect after EVENTS_RETRY_MS
+    os.environ.setdefault('PORTAL_EVENTS_MAX_STREAMS', str(max(1, threads // 2)))
+elif worker_class == 'gevent':
+    # idle streams are greenlets holding no connection, so one worker keeps worker_connections of them open.
+    # Background work stays with the threaded workers: its SQLite calls would stall every stream in the process.
+    for name in ('JOB_WORKERS', 'DEADLINE_SWEEP_SECONDS', 'ANALYTICS_REFRESH_SECONDS', 'ARCHIVE_INTERVAL_SECONDS',
+                 'COUNTER_RECONCILE_SECONDS', 'PASSWORD_HASH_WORKERS'):
+        os.environ.setdefault(f'PORTAL_{name}', '0')
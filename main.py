@@ -1,5 +1,6 @@
 from application import create_app, db
 from application.models import User
+from application.migrations import upgrade
 
 
 
@@ -11,7 +12,7 @@ app = create_app()
 
 def init_db():
     with app.app_context():
-        db.create_all()
+        upgrade()
         
         admin = User.query.filter_by(email='admin@portal.com').first()
         if not admin:
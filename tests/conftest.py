@@ -0,0 +1,168 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from application import (analytics, api, board, conditional, create_app, db, eligibility, events, identity,
+                         submissions)
+from application.migrations import upgrade
+from application.models import User, CompanyProfile, StudentProfile, PlacementDrive
+
+
+
+
+PASSWORD = 'secret'
+
+# CI's postgresql job points the suite at its server; each test starts from an empty public schema
+DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+POSTGRESQL = bool(DATABASE_URL)
+
+
+
+
+def settings(directory):
+    # every file the app writes stays in the test's directory, and no background thread starts
+    return {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': DATABASE_URL or f'sqlite:///{directory}/portal.db',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1',
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_IMPORT_WORKERS': 0,
+        'MAIL_BACKEND': 'memory',
+        'OPEN_DRIVES_CACHE_TTL': 0,
+        'IDENTITY_EPOCH_FILE': os.path.join(directory, 'identity.epoch'),
+        'DRIVES_EPOCH_FILE': os.path.join(directory, 'drives.epoch'),
+        'EVENTS_EPOCH_FILE': os.path.join(directory, 'events.epoch'),
+        'ANALYTICS_EPOCH_FILE': os.path.join(directory, 'analytics.epoch'),
+        'METRICS_DIR': os.path.join(directory, 'metrics'),
+        'PROFILE_DIR': os.path.join(directory, 'profiles'),
+    }
+
+
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    # process-wide caches are keyed by ids and epoch files that the next test's database reuses
+    identity._cache.clear()
+    identity._seen_epoch = None
+    analytics._reports.clear()
+    api._principals.clear()
+    board._fragments.clear()
+    conditional._tallies.clear()
+    submissions._snapshot = None
+    eligibility._index = None
+    events._broker = None
+    yield
+
+
+
+
+@pytest.fixture
+def config(tmp_path):
+    return settings(str(tmp_path))
+
+
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    with app.app_context():
+        if POSTGRESQL:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('DROP SCHEMA public CASCADE')
+                conn.exec_driver_sql('CREATE SCHEMA public')
+        upgrade()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+
+
+def add_student(email, **profile):
+    user = User(email=email, role='student')
+    user.set_password(PASSWORD)
+    student = StudentProfile(user=user, name=email.split('@')[0], student_id=email, **profile)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+
+
+def add_company(email, approval_status='approved'):
+    user = User(email=email, role='company')
+    user.set_password(PASSWORD)
+    company = CompanyProfile(user=user, name=email.split('@')[0], hr_contact='HR', approval_status=approval_status)
+    db.session.add(company)
+    db.session.commit()
+    return company
+
+
+
+
+def add_drive(company, status='approved', deadline=None, **criteria):
+    from datetime import datetime, timedelta
+    drive = PlacementDrive(company=company, title='Engineer', description='Build things.', status=status,
+                           deadline=deadline or datetime.now() + timedelta(days=7), **criteria)
+    db.session.add(drive)
+    db.session.commit()
+    submissions.invalidate()
+    return drive
+
+
+
+
+def log_in(client, email):
+    response = client.post('/login', data={'email': email, 'password': PASSWORD})
+    assert response.status_code == 302 and '/login' not in response.headers['Location']
+    return client
+
+
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+
+
+@pytest.fixture
+def serve(config):
+    # runs gunicorn with gunicorn.conf.py on this test's database; returns its port
+    processes = []
+
+    def start(**environment):
+        port = free_port()
+        env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', **environment)
+        env.update({f'PORTAL_{name}': json.dumps(value) for name, value in config.items()})
+        process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--log-level', 'warning', 'main:app'],
+                                   cwd=ROOT, env=env)
+        processes.append(process)
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return port
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError('gunicorn did not start')
+
+    yield start
+    for process in processes:
+        # a quick shutdown; a graceful one would wait out the open streams
+        process.send_signal(signal.SIGINT)
+        process.wait()
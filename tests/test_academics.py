@@ -0,0 +1,74 @@
+import io
+
+from application import db
+from application.importer import import_students
+from application.models import AuditEntry, StudentProfile, User
+from tests.conftest import PASSWORD, add_student, log_in
+
+
+
+
+def add_admin(email):
+    user = User(email=email, role='admin')
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+
+
+def test_students_cannot_change_their_academic_record(app):
+    student = add_student('asha@example.com', branch='Electronics', graduation_year=2026, cgpa=6.0, backlogs=2)
+    client = log_in(app.test_client(), 'asha@example.com')
+
+    response = client.post('/student/profile', data={
+        'name': 'Asha', 'contact': '555', 'resume_bio': 'Hello',
+        'branch': 'Computer Science', 'graduation_year': '2025', 'cgpa': '9.9', 'backlogs': '0',
+    })
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    student = db.session.get(StudentProfile, student.id)
+    assert (student.name, student.contact) == ('Asha', '555')
+    assert (student.branch, student.graduation_year, student.cgpa, student.backlogs) == ('Electronics', 2026, 6.0, 2)
+    page = client.get('/student/profile').get_data(as_text=True)
+    assert 'name="cgpa"' not in page
+
+
+
+
+def test_admin_sets_academic_record_and_it_is_audited(app):
+    student = add_student('ravi@example.com')
+    add_admin('office@example.com')
+    client = log_in(app.test_client(), 'office@example.com')
+
+    form = {'branch': 'Computer Science', 'graduation_year': '2026', 'cgpa': '8.5', 'backlogs': '0'}
+    assert client.post(f'/admin/students/{student.id}/academics', data=form).status_code == 302
+    assert client.post(f'/admin/students/{student.id}/academics', data=dict(form, cgpa='11')).status_code == 302
+
+    db.session.expire_all()
+    student = db.session.get(StudentProfile, student.id)
+    assert (student.branch, student.graduation_year, student.cgpa, student.backlogs) == \
+        ('Computer Science', 2026, 8.5, 0)
+    entry = AuditEntry.query.filter_by(action='update_academics').one()
+    assert entry.new_value == 'Computer Science / 2026 / 8.5 / 0'
+
+
+
+
+def test_import_takes_the_academic_record(app):
+    rows = ('email,password,name,student_id,branch,graduation_year,cgpa,backlogs\n'
+            'a@example.com,pw,A,S1,Computer Science,2026,8.2,1\n'
+            'b@example.com,pw,B,S2,,,,\n'
+            'c@example.com,pw,C,S3,Astrology,2026,8.2,0\n'
+            'd@example.com,pw,D,S4,Computer Science,2026,high,0\n')
+
+    report = import_students(io.StringIO(rows))
+
+    assert report.created == 2
+    assert [line for line, email, message in report.errors] == [4, 5]
+    students = {s.student_id: s for s in StudentProfile.query}
+    assert (students['S1'].branch, students['S1'].graduation_year, students['S1'].cgpa,
+            students['S1'].backlogs) == ('Computer Science', 2026, 8.2, 1)
+    assert (students['S2'].branch, students['S2'].cgpa, students['S2'].backlogs) == (None, None, 0)
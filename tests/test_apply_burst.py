@@ -0,0 +1,67 @@
+import http.client
+import threading
+import urllib.parse
+
+from sqlalchemy import func, select
+
+from application import counters, db
+from application.models import Application
+from tests.conftest import PASSWORD, add_company, add_drive, add_student
+
+
+STUDENTS = 24
+TABS = 2
+CAP = 10
+
+
+
+
+def request(port, method, path, headers=None, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request(method, path, body, headers or {})
+        response = conn.getresponse()
+        response.read()
+        return response
+    finally:
+        conn.close()
+
+
+
+
+def test_a_burst_of_applications_never_overfills_a_capped_drive(app, serve):
+    drive = add_drive(add_company('acme@example.com'), max_applicants=CAP)
+    for i in range(STUDENTS):
+        add_student(f'burst{i}@example.com')
+    drive_id = drive.id
+    port = serve(GUNICORN_WORKERS='2', GUNICORN_THREADS='4')
+
+    cookies = []
+    for i in range(STUDENTS):
+        response = request(port, 'POST', '/login', {'Content-Type': 'application/x-www-form-urlencoded'},
+                           urllib.parse.urlencode({'email': f'burst{i}@example.com', 'password': PASSWORD}))
+        cookies.append(response.getheader('Set-Cookie').split(';', 1)[0])
+
+    # every student applies from two tabs at once
+    attempts = [cookie for cookie in cookies for tab in range(TABS)]
+    start = threading.Barrier(len(attempts), timeout=30)
+    results = [None] * len(attempts)
+
+    def apply(n):
+        start.wait()
+        response = request(port, 'GET', f'/student/apply/{drive_id}', {'Cookie': attempts[n]})
+        results[n] = (response.status, response.getheader('Location', ''))
+
+    threads = [threading.Thread(target=apply, args=(n,)) for n in range(len(attempts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(status == 302 for status, location in results), results
+    accepted = sum(1 for status, location in results if location.endswith('/student/history'))
+    rows = db.session.scalar(select(func.count(Application.id)).where(Application.drive_id == drive_id))
+    students = db.session.scalar(select(func.count(func.distinct(Application.student_id)))
+                                 .where(Application.drive_id == drive_id))
+    assert accepted == rows == students == CAP
+    assert counters.read()['applications'] == CAP
@@ -0,0 +1,69 @@
+from application import counters, create_app, db, sweeper, transfer
+from application.models import CompanyProfile, Counter, PlacementDrive
+from tests.conftest import add_company, add_drive, settings
+
+
+
+
+def test_approving_an_expired_row_moves_the_pending_counters(app):
+    company = add_company('acme@example.com', approval_status='pending')
+    drive = add_drive(company, status='pending')
+    assert counters.read()['pending_companies'] == 1
+    assert counters.read()['pending_drives'] == 1
+
+    # with the status expired, the old value is only known if assignment loads it
+    company = db.session.get(CompanyProfile, company.id)
+    drive = db.session.get(PlacementDrive, drive.id)
+    db.session.expire(company, ['approval_status'])
+    db.session.expire(drive, ['status'])
+    company.approval_status = 'approved'
+    drive.status = 'approved'
+    db.session.commit()
+
+    assert counters.read()['pending_companies'] == 0
+    assert counters.read()['pending_drives'] == 0
+
+
+
+
+def test_reconciliation_waits_for_the_lease_and_fixes_drift(app):
+    add_company('acme@example.com')
+    with db.engine.begin() as conn:
+        counters.increment(conn, 'companies', 5)
+        assert sweeper.acquire(conn, counters.LEASE)
+
+    assert counters.reconcile_once() is None
+    assert counters.read()['companies'] == 6
+
+    with db.engine.begin() as conn:
+        sweeper.release(conn, counters.LEASE)
+    assert counters.reconcile_once() == {'companies': -5}
+    assert counters.read()['companies'] == 1
+    assert db.session.get(Counter, counters.LEASE).value == 0
+
+
+
+
+def test_read_returns_only_dashboard_counters(app):
+    with db.engine.begin() as conn:
+        sweeper.acquire(conn)
+        conn.execute(Counter.__table__.insert().values(name='conditional_get:admin.dashboard:304', value=7))
+
+    assert set(counters.read()) == set(counters.COUNTER_NAMES)
+
+
+
+
+def test_copy_database_leaves_source_leases_behind(app, tmp_path):
+    add_company('acme@example.com')
+    with db.engine.begin() as conn:
+        assert sweeper.acquire(conn)
+    source = db.engine.url.render_as_string(hide_password=False)
+    target = dict(settings(str(tmp_path)), SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path}/target.db')
+
+    copy = create_app(target)
+    with copy.app_context():
+        transfer.copy_database(source, echo=lambda line: None)
+        assert db.session.get(Counter, sweeper.LEASE) is None
+        assert counters.read()['companies'] == 1
+        db.engine.dispose()
@@ -0,0 +1,100 @@
+import socket
+import time
+import urllib.parse
+
+from application import db, events
+from tests.conftest import PASSWORD, add_student
+
+
+
+
+def log_in_over_http(port, email):
+    body = urllib.parse.urlencode({'email': email, 'password': PASSWORD})
+    with socket.create_connection(('127.0.0.1', port)) as s:
+        s.sendall(f'POST /login HTTP/1.1\r\nHost: test\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+                  f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n{body}'.encode())
+        response = read_until_closed(s, 5)
+    cookie = next(line for line in response.split(b'\r\n') if line.lower().startswith(b'set-cookie:'))
+    return cookie.split(b':', 1)[1].split(b';')[0].strip().decode()
+
+
+
+
+def read_until_closed(s, timeout):
+    s.settimeout(timeout)
+    data = b''
+    while True:
+        chunk = s.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+
+
+
+def read_for(s, seconds, until=None):
+    # whatever arrives within `seconds`, or until `until` does, and whether the server closed the stream
+    data = b''
+    ends = time.monotonic() + seconds
+    while time.monotonic() < ends and (until is None or until not in data):
+        s.settimeout(max(0.01, ends - time.monotonic()))
+        try:
+            chunk = s.recv(65536)
+        except socket.timeout:
+            return data, False
+        if not chunk:
+            return data, True
+        data += chunk
+    return data, False
+
+
+
+
+def open_stream(port, cookie, path='/events'):
+    s = socket.create_connection(('127.0.0.1', port))
+    s.sendall(f'GET {path} HTTP/1.1\r\nHost: test\r\nCookie: {cookie}\r\n\r\n'.encode())
+    return s
+
+
+
+
+def test_gevent_process_holds_many_streams_and_delivers_events(app, serve):
+    student = add_student('streamer@test.local')
+    port = serve(GUNICORN_WORKER_CLASS='gevent', GUNICORN_WORKERS='1')
+    cookie = log_in_over_http(port, 'streamer@test.local')
+    streams = [open_stream(port, cookie) for n in range(200)]
+    try:
+        for s in streams:
+            data, closed = read_for(s, 5, until=b'retry: 3000')
+            assert b'retry: 3000' in data and not closed
+        events.publish([student.user_id], 'application_status', {'message': 'Shortlisted'})
+        db.session.commit()
+        for s in streams:
+            data, closed = read_for(s, 10, until=b'Shortlisted')
+            assert b'event: application_status' in data
+    finally:
+        for s in streams:
+            s.close()
+
+
+
+
+def test_threaded_workers_turn_streams_past_the_cap_away_for_a_minute(app, serve):
+    add_student('capped@test.local')
+    # a short keepalive lets the stream's thread notice the closed socket, so the server stops quickly
+    port = serve(GUNICORN_WORKERS='1', GUNICORN_THREADS='2', PORTAL_EVENTS_KEEPALIVE_SECONDS='1')
+    cookie = log_in_over_http(port, 'capped@test.local')
+    held = open_stream(port, cookie)
+    try:
+        data, closed = read_for(held, 5, until=b'retry: 3000')
+        assert not closed and b'retry: 3000' in data
+        turned_away = open_stream(port, cookie)
+        data, closed = read_for(turned_away, 5)
+        assert closed
+        assert b'retry: 60000' in data and b'id: 0' in data
+        # the other thread is still free for pages
+        with open_stream(port, cookie, '/student/dashboard') as page:
+            data, closed = read_for(page, 5, until=b'</html>')
+        assert data.startswith(b'HTTP/1.1 200')
+    finally:
+        held.close()
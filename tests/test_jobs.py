@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+
+from application import db, jobs
+from application.models import AuditEntry, Job, StudentProfile, User
+from tests.conftest import PASSWORD, add_student, log_in
+
+
+
+
+@pytest.fixture
+def config(config):
+    return dict(config, JOB_RETRY_BASE_SECONDS=0)
+
+
+
+
+def add_admin(email):
+    user = User(email=email, role='admin')
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+
+
+
+
+def run_jobs(app):
+    # in a context of its own, as a worker thread runs them
+    with app.app_context():
+        return jobs.run_pending()
+
+
+
+
+def test_a_deletion_that_runs_out_of_retries_is_logged_shown_and_retried(app, monkeypatch, caplog):
+    student_id = add_student('asha@example.com').id
+    add_admin('office@example.com')
+    client = log_in(app.test_client(), 'office@example.com')
+    assert client.get(f'/admin/delete/student/{student_id}').status_code == 302
+
+    def broken(user_id):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setitem(jobs.HANDLERS, 'delete_user', broken)
+    with caplog.at_level(logging.ERROR):
+        assert run_jobs(app) == 5
+    job = Job.query.filter_by(name='delete_user').one()
+    assert job.status == 'failed'
+    assert any('gave up after 5 attempts: RuntimeError: disk full' in message for message in caplog.messages)
+
+    page = client.get('/admin/dashboard').get_data(as_text=True)
+    assert 'Failed Background Jobs' in page and 'disk full' in page
+
+    monkeypatch.undo()
+    assert client.get(f'/admin/jobs/{job.id}/retry').status_code == 302
+    assert AuditEntry.query.filter_by(action='retry_job', target_id=job.id).count() == 1
+    assert run_jobs(app) == 1
+    db.session.expire_all()
+    assert db.session.get(StudentProfile, student_id) is None
+    assert 'Failed Background Jobs' not in client.get('/admin/dashboard').get_data(as_text=True)
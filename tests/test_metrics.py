@@ -0,0 +1,85 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+from flask import g
+
+from application import metrics, routing
+from tests.conftest import add_company, log_in
+
+
+
+
+@pytest.fixture
+def config(config):
+    return dict(config, REPLICA_DATABASE_URI=config['SQLALCHEMY_DATABASE_URI'], METRICS_ENABLED=True,
+                METRICS_FLUSH_SECONDS=0, MAX_STATEMENTS_PER_REQUEST=100)
+
+
+
+
+@pytest.fixture(autouse=True)
+def fresh_totals():
+    metrics._counters.clear()
+    metrics._histograms.clear()
+    metrics._worker = None
+    yield
+
+
+
+
+def replica_page(app):
+    add_company('acme@example.com')
+    client = log_in(app.test_client(), 'acme@example.com')
+    with client.session_transaction() as session:
+        session.pop(routing.STICKY_KEY, None)
+    return client
+
+
+
+
+def test_statements_on_the_replica_are_counted(app):
+    client = replica_page(app)
+    response = client.get('/company/dashboard')
+    assert response.status_code == 200
+    # totals are recorded when the response is closed
+    response.close()
+
+    counters, histograms = metrics.collect(app.config['METRICS_DIR'])
+    labels = (('endpoint', 'company.dashboard'), ('method', 'GET'))
+    assert counters[('portal_request_db_statements_total', labels)] > 0
+
+
+
+
+def test_the_statement_limit_covers_the_replica(app):
+    client = replica_page(app)
+    with client:
+        assert client.get('/company/dashboard').status_code == 200
+        assert g.statement_count > 0
+
+
+
+
+def test_an_exited_workers_totals_are_taken_over(app):
+    directory = app.config['METRICS_DIR']
+    os.makedirs(directory)
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    pid = int(exited.stdout)
+    path = os.path.join(directory, f'worker-{socket.gethostname()}-{pid}-1.json')
+    elsewhere = os.path.join(directory, f'worker-other-host-{pid}-1.json')
+    for name in (path, elsewhere):
+        with open(name, 'w') as f:
+            json.dump({'counters': [['portal_slow_queries_total', [], 3]], 'histograms': []}, f)
+
+    counters, histograms = metrics.collect(directory)
+    assert counters[('portal_slow_queries_total', ())] == 6
+    assert not os.path.exists(path)
+    assert os.path.exists(elsewhere)
+
+    # a second scrape counts the adopted totals once, from this worker's own file
+    assert metrics.collect(directory)[0][('portal_slow_queries_total', ())] == 6
+    assert os.path.exists(metrics.worker_file(directory))
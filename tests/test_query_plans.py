@@ -0,0 +1,23 @@
+from application.query_plans import unindexed_steps
+
+
+
+
+def test_a_primary_key_page_may_scan_its_table():
+    statement = ('SELECT applications.id, applications.status \nFROM applications ORDER BY applications.id\n'
+                 ' LIMIT ? OFFSET ?')
+    assert unindexed_steps(statement, ['SCAN applications']) == []
+
+
+
+
+def test_a_limit_does_not_excuse_other_scans():
+    filtered = ('SELECT applications.id \nFROM applications \nWHERE applications.status = ? '
+                'ORDER BY applications.id\n LIMIT ? OFFSET ?')
+    other_order = 'SELECT applications.id \nFROM applications ORDER BY applications.status\n LIMIT ? OFFSET ?'
+    joined = ('SELECT applications.id \nFROM applications JOIN placement_drives ON placement_drives.id = '
+              'applications.drive_id ORDER BY applications.id\n LIMIT ? OFFSET ?')
+
+    assert unindexed_steps(filtered, ['SCAN applications']) == ['SCAN applications']
+    assert unindexed_steps(other_order, ['SCAN applications']) == ['SCAN applications']
+    assert unindexed_steps(joined, ['SCAN applications', 'SCAN placement_drives']) == ['SCAN placement_drives']
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+from sqlalchemy import event, select, update
+
+from application import db, routing
+from application.models import Counter, User
+from tests.conftest import add_company, add_drive, add_student, log_in
+
+
+
+
+@pytest.fixture
+def config(config):
+    # the replica is the primary behind a second engine, so the engine a statement ran on shows where it was routed
+    return dict(config, REPLICA_DATABASE_URI=config['SQLALCHEMY_DATABASE_URI'])
+
+
+
+
+@pytest.fixture
+def selects(app):
+    # the engine name of every SELECT, in order
+    seen = []
+    listeners = []
+    for name, engine in (('primary', db.engine), ('replica', db.engines['replica'])):
+        def listener(conn, cursor, statement, parameters, context, executemany, name=name):
+            if statement.lstrip().upper().startswith('SELECT'):
+                seen.append(name)
+        event.listen(engine, 'before_cursor_execute', listener)
+        listeners.append((engine, listener))
+    yield seen
+    for engine, listener in listeners:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+
+
+
+def fresh_browser(app, email):
+    client = log_in(app.test_client(), email)
+    with client.session_transaction() as session:
+        session.pop(routing.STICKY_KEY, None)
+    return client
+
+
+
+
+def test_marked_pages_read_from_the_replica(app, selects):
+    drive = add_drive(add_company('acme@example.com'))
+    client = fresh_browser(app, 'acme@example.com')
+
+    selects.clear()
+    assert client.get('/company/dashboard').status_code == 200
+    assert selects and set(selects) == {'replica'}
+
+    # requests share the test's session, which already holds the drive
+    db.session.expunge_all()
+    selects.clear()
+    assert client.get(f'/company/drive/edit/{drive.id}').status_code == 200
+    assert selects and set(selects) == {'primary'}
+
+
+
+
+def test_a_browser_reads_its_own_writes_from_the_primary(app, selects):
+    add_student('asha@example.com')
+    client = fresh_browser(app, 'asha@example.com')
+
+    response = client.post('/student/profile', data={'name': 'Asha', 'contact': '555', 'resume_bio': ''})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session[routing.STICKY_KEY] > time.time()
+
+    selects.clear()
+    assert client.get('/student/dashboard').status_code == 200
+    assert selects and set(selects) == {'primary'}
+
+    with client.session_transaction() as session:
+        session[routing.STICKY_KEY] = time.time() - 1
+    selects.clear()
+    assert client.get('/student/dashboard').status_code == 200
+    assert selects and set(selects) == {'replica'}
+
+
+
+
+def test_reads_after_a_write_in_the_same_request_go_to_the_primary(app):
+    with app.test_request_context('/'):
+        db.session.info['replica'] = True
+        try:
+            assert db.session.get_bind(clause=select(User.id)) is db.engines['replica']
+            db.session.execute(update(Counter).where(Counter.name == 'students').values(value=Counter.value))
+            assert db.session.get_bind(clause=select(User.id)) is db.engine
+        finally:
+            db.session.rollback()
+            db.session.info.pop('replica')
+            db.session.info.pop('wrote')
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from application import create_app, db
+from application.migrations import upgrade
+from application.models import Counter
+from tests.conftest import POSTGRESQL
+
+pytestmark = pytest.mark.skipif(POSTGRESQL, reason='SQLite locking')
+
+
+
+def read_during_exclusive_write():
+    # holds the write lock the way a committing writer does, then reads on another pooled connection
+    writer = db.engine.raw_connection()
+    try:
+        cursor = writer.cursor()
+        cursor.execute('BEGIN EXCLUSIVE')
+        cursor.execute("UPDATE counters SET value = value + 1 WHERE name = 'students'")
+        started = time.perf_counter()
+        with db.engine.connect() as conn:
+            value = conn.scalar(select(Counter.value).where(Counter.name == 'students'))
+        return value, time.perf_counter() - started
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+
+
+def test_readers_do_not_wait_for_a_writer(app):
+    with db.engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+
+    value, elapsed = read_during_exclusive_write()
+
+    assert value == 0
+    assert elapsed < 0.5
+
+
+
+
+def test_rollback_journal_readers_do_wait(config):
+    # the check above would catch a change that gives up WAL
+    app = create_app(dict(config, SQLITE_JOURNAL_MODE='DELETE', SQLITE_BUSY_TIMEOUT_MS=200))
+    with app.app_context():
+        upgrade()
+        with pytest.raises(OperationalError, match='locked'):
+            read_during_exclusive_write()
+        db.engine.dispose()
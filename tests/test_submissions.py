@@ -0,0 +1,56 @@
+import threading
+
+from sqlalchemy import event, func, select
+
+from application import db, submissions
+from application.models import Application, StudentProfile
+from tests.conftest import add_company, add_drive, add_student
+
+
+
+
+def test_a_capped_drive_locks_its_row_and_stops_at_the_cap(app):
+    drive = add_drive(add_company('acme@example.com'), max_applicants=2)
+    students = [add_student(f's{i}@example.com') for i in range(3)]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        results = [submissions.submit(student, drive.id) for student in students]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert results == ['applied', 'applied', 'full']
+    # SQLite serialises writers on its own; PostgreSQL needs the drive row locked
+    locked = any('FOR UPDATE' in statement for statement in statements)
+    assert locked == (db.engine.dialect.name == 'postgresql')
+
+
+
+
+def test_concurrent_submissions_respect_the_cap(app):
+    # fewer threads than the pool has connections
+    drive = add_drive(add_company('acme@example.com'), max_applicants=3)
+    student_ids = [add_student(f's{i}@example.com').id for i in range(8)]
+    results = []
+    start = threading.Barrier(len(student_ids), timeout=10)
+
+    def apply(student_id):
+        with app.app_context():
+            student = db.session.get(StudentProfile, student_id)
+            start.wait()
+            results.append(submissions.submit(student, drive.id))
+            db.session.remove()
+
+    threads = [threading.Thread(target=apply, args=(student_id,)) for student_id in student_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(set(results)) == ['applied', 'full']
+    assert results.count('applied') == 3
+    assert db.session.scalar(select(func.count(Application.id)).where(Application.drive_id == drive.id)) == 3